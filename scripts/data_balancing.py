@@ -2,35 +2,348 @@
 Data Balancing & Class Imbalance Handling
 ==========================================
 Handles imbalanced data using SMOTE and other techniques
+
+For large datasets the 'scalable_smote' strategy uses ScalableSMOTE:
+tree-based neighbor search over all cores and chunked generation into a
+preallocated float32 array, with an optional memory budget.
+
+StreamingBalancer balances CSV/Parquet files larger than memory in two
+passes over chunks and writes the balanced rows back to disk.
+
+The 'weights' strategy keeps the data as is and returns per-row sample
+weights instead; BalancingBenchmark compares all strategies on time, peak
+memory, output size and downstream macro F1.
 """
 
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
+from sklearn.neighbors import NearestNeighbors
 from imblearn.over_sampling import SMOTE, ADASYN
 from imblearn.under_sampling import RandomUnderSampler
 from imblearn.pipeline import Pipeline as ImbPipeline
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+import time
 from datetime import datetime
 
+from memory_sampling import RSSSampler
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Rows generated per chunk when no memory budget is given
+DEFAULT_CHUNK_ROWS = 65536
+# Rows read per chunk by StreamingBalancer
+DEFAULT_STREAM_CHUNKSIZE = 100000
+# Rows per class kept in memory to build the neighbor index for synthetic rows
+DEFAULT_NEIGHBOR_SAMPLE_SIZE = 50000
+# Strategies DataBalancer.balance_indices supports (synthetic rows come from
+# ScalableSMOTE, so imblearn's 'smote' and 'adasyn' have no index mode)
+INDEX_STRATEGIES = ['undersample', 'combined', 'scalable_smote', 'weights']
+# Strategies compared by BalancingBenchmark
+BENCHMARK_STRATEGIES = ['smote', 'adasyn', 'combined', 'undersample', 'weights']
+
+
+# Non-negative integer labels up to this value are counted with a direct bincount
+MAX_DIRECT_BINCOUNT_LABEL = 1 << 20
+
+
+def encode_labels(y):
+    """
+    Integer-encode labels in one pass
+    
+    Non-negative integer labels are used as their own codes; anything else is
+    hash-encoded with pd.factorize (sorted, NaN kept as a class like np.unique).
+    
+    Returns:
+        tuple: (codes, labels) with labels[codes] == y; labels may include
+            values that do not occur (direct integer path)
+    """
+    values = y.to_numpy() if hasattr(y, 'to_numpy') else np.asarray(y)
+    values = values.ravel()
+    if values.dtype.kind in 'iub' and len(values):
+        low, high = values.min(), values.max()
+        if low >= 0 and high <= MAX_DIRECT_BINCOUNT_LABEL:
+            return values.astype(np.intp, copy=False), np.arange(int(high) + 1, dtype=values.dtype)
+    codes, labels = pd.factorize(values, sort=True, use_na_sentinel=False)
+    return codes, np.asarray(labels)
+
+
+class ClassDistribution:
+    """
+    Class counts of a label array from a single np.bincount pass
+    
+    Every analysis of a label array is one bincount pass over integer codes
+    (no sort); update() adds label batches incrementally for streaming data.
+    """
+    
+    def __init__(self):
+        self.labels = np.array([])
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.index = {}
+    
+    @classmethod
+    def from_labels(cls, y):
+        """
+        Distribution of a label array
+        
+        Args:
+            y: Labels (array or Series)
+        
+        Returns:
+            ClassDistribution: A new object the caller may update
+        """
+        return cls().update(y)
+    
+    def update(self, y):
+        """
+        Add a batch of labels (new classes are added as they appear)
+        
+        Returns:
+            ClassDistribution: self
+        """
+        codes, labels = encode_labels(y)
+        batch_counts = np.bincount(codes, minlength=len(labels))
+        present = batch_counts > 0
+        self._add(labels[present], batch_counts[present])
+        return self
+    
+    def merge(self, other):
+        """Add the counts of another distribution (e.g. from another worker)"""
+        self._add(other.labels, other.counts)
+        return self
+    
+    def _add(self, labels, counts):
+        positions = np.array([self.index.get(label, -1) for label in labels.tolist()], dtype=np.intp)
+        known = positions >= 0
+        np.add.at(self.counts, positions[known], counts[known])
+        if not known.all():
+            labels_all = np.concatenate([self.labels.astype(object), labels[~known].astype(object)])
+            counts_all = np.concatenate([self.counts, counts[~known]])
+            try:
+                order = np.argsort(labels_all, kind='stable')
+            except TypeError:
+                order = np.arange(len(labels_all))
+            self.labels = labels_all[order]
+            self.counts = counts_all[order].astype(np.int64)
+            self.index = {label: i for i, label in enumerate(self.labels.tolist())}
+    
+    def count(self, label):
+        position = self.index.get(label)
+        return 0 if position is None else int(self.counts[position])
+    
+    @property
+    def total(self):
+        return int(self.counts.sum())
+    
+    @property
+    def n_classes(self):
+        return len(self.counts)
+    
+    @property
+    def majority_class(self):
+        return self.labels.tolist()[np.argmax(self.counts)]
+    
+    @property
+    def minority_class(self):
+        return self.labels.tolist()[np.argmin(self.counts)]
+    
+    @property
+    def imbalance_ratio(self):
+        return self.counts.max() / self.counts.min()
+    
+    @property
+    def proportions(self):
+        return self.counts / self.total
+    
+    @property
+    def class_weights(self):
+        """total / (n_classes * count) per class, aligned with labels"""
+        return self.total / (self.n_classes * self.counts)
+    
+    def as_dict(self):
+        """class label -> count"""
+        return dict(zip(self.labels.tolist(), self.counts.tolist()))
+
+
+def compute_sample_weights(y):
+    """
+    Per-row weights that give every class the same total weight
+    
+    Uses the class weights of ImbalanceMetrics: total / (n_classes * class_count).
+    
+    Returns:
+        ndarray: float32 weight per row of y
+    """
+    codes, _ = encode_labels(y)
+    counts = np.bincount(codes)
+    present = counts > 0
+    class_weights = np.zeros(len(counts))
+    class_weights[present] = len(codes) / (present.sum() * counts[present])
+    return class_weights[codes].astype(np.float32)
+
+
+class ScalableSMOTE:
+    """
+    SMOTE for large datasets
+    
+    Every class is oversampled to the size of the majority class, as with
+    imblearn's SMOTE(sampling_strategy='auto'). Differences:
+    - neighbors come from a KD/ball tree (NearestNeighbors, algorithm='auto')
+      queried in parallel with n_jobs, instead of brute force
+    - the output is one preallocated float32 array; synthetic rows are
+      written into it chunk by chunk, so temporaries stay bounded
+    - memory_budget_mb bounds the per-chunk working memory
+    """
+    
+    def __init__(self, k_neighbors=5, n_jobs=-1, memory_budget_mb=None, random_state=42):
+        """
+        Args:
+            k_neighbors: Nearest neighbors used to build synthetic samples
+            n_jobs: Cores used for the neighbor search (-1 = all)
+            memory_budget_mb: Working memory allowed per chunk (None = DEFAULT_CHUNK_ROWS rows)
+            random_state: Random seed for reproducibility
+        """
+        self.k_neighbors = k_neighbors
+        self.n_jobs = n_jobs
+        self.memory_budget_mb = memory_budget_mb
+        self.random_state = random_state
+    
+    def _chunk_rows(self, n_features):
+        if not self.memory_budget_mb:
+            return DEFAULT_CHUNK_ROWS
+        # base rows, neighbor rows and the interpolated result, float32 each
+        bytes_per_row = 3 * n_features * np.dtype(np.float32).itemsize
+        return max(1, int(self.memory_budget_mb * 1024 * 1024 // bytes_per_row))
+    
+    def _generate(self, X_class, count, out, rng, chunk_rows):
+        """Write count synthetic rows interpolated within X_class into out (float32)"""
+        if len(X_class) < 2:
+            raise ValueError(f"Class has {len(X_class)} sample(s); SMOTE needs at least 2")
+        k = min(self.k_neighbors, len(X_class) - 1)
+        
+        # Neighbor table of the class (first neighbor of each row is itself)
+        nn = NearestNeighbors(n_neighbors=k + 1, algorithm='auto', n_jobs=self.n_jobs).fit(X_class)
+        neighbors = np.empty((len(X_class), k), dtype=np.int64)
+        for start in range(0, len(X_class), chunk_rows):
+            stop = min(start + chunk_rows, len(X_class))
+            neighbors[start:stop] = nn.kneighbors(X_class[start:stop], return_distance=False)[:, 1:]
+        
+        for start in range(0, count, chunk_rows):
+            size = min(chunk_rows, count - start)
+            base = rng.integers(len(X_class), size=size)
+            partner = neighbors[base, rng.integers(k, size=size)]
+            gap = rng.random(size, dtype=np.float32)[:, None]
+            chunk = out[start:start + size]
+            np.subtract(X_class[partner], X_class[base], out=chunk)
+            chunk *= gap
+            chunk += X_class[base]
+    
+    def _plan(self, y_values, n_features):
+        """Synthetic rows needed per class to reach the majority size"""
+        dist = ClassDistribution.from_labels(y_values)
+        target = int(dist.counts.max())
+        n_new = {label: target - count for label, count in zip(dist.labels.tolist(), dist.counts.tolist())
+                 if target > count}
+        output_mb = (len(y_values) + sum(n_new.values())) * n_features * np.dtype(np.float32).itemsize / (1024 * 1024)
+        if self.memory_budget_mb and output_mb > self.memory_budget_mb:
+            logger.warning(f"⚠️ Output array ({output_mb:.0f} MB) exceeds the memory budget "
+                           f"({self.memory_budget_mb} MB); only the working chunks are bounded")
+        return n_new
+    
+    def fit_resample(self, X, y):
+        """
+        Returns:
+            tuple: (X_resampled, y_resampled); original rows first, then the
+                synthetic rows of each class. DataFrame/Series inputs keep
+                their columns and name.
+        """
+        columns = X.columns if isinstance(X, pd.DataFrame) else None
+        y_name = y.name if isinstance(y, pd.Series) else None
+        X_values = np.asarray(X, dtype=np.float32)
+        y_values = np.asarray(y)
+        n_samples, n_features = X_values.shape
+        n_new = self._plan(y_values, n_features)
+        total = n_samples + sum(n_new.values())
+        
+        X_out = np.empty((total, n_features), dtype=np.float32)
+        y_out = np.empty(total, dtype=y_values.dtype)
+        X_out[:n_samples] = X_values
+        y_out[:n_samples] = y_values
+        
+        rng = np.random.default_rng(self.random_state)
+        chunk_rows = self._chunk_rows(n_features)
+        position = n_samples
+        for label, count in n_new.items():
+            self._generate(X_values[y_values == label], count, X_out[position:position + count], rng, chunk_rows)
+            y_out[position:position + count] = label
+            position += count
+        
+        if columns is not None:
+            return pd.DataFrame(X_out, columns=columns, copy=False), pd.Series(y_out, name=y_name)
+        return X_out, y_out
+    
+    def sample_synthetic(self, X, y, rows=None):
+        """
+        Generate only the synthetic rows, leaving X untouched
+        
+        Only the rows of the classes being oversampled are gathered (as float32)
+        to build their neighbor index; X itself is never copied or converted.
+        
+        Args:
+            X: Features (array or DataFrame)
+            y: Target
+            rows: Positions of the rows of X/y to balance (default: all)
+        
+        Returns:
+            tuple: (X_synthetic float32 array, y_synthetic array), the same
+                synthetic rows fit_resample would append
+        """
+        y_values = np.asarray(y)
+        rows = np.arange(len(y_values)) if rows is None else np.asarray(rows)
+        y_rows = y_values[rows]
+        n_features = X.shape[1]
+        n_new = self._plan(y_rows, n_features)
+        
+        X_synthetic = np.empty((sum(n_new.values()), n_features), dtype=np.float32)
+        y_synthetic = np.empty(len(X_synthetic), dtype=y_values.dtype)
+        rng = np.random.default_rng(self.random_state)
+        chunk_rows = self._chunk_rows(n_features)
+        position = 0
+        for label, count in n_new.items():
+            class_rows = rows[y_rows == label]
+            X_class = (X.iloc[class_rows] if isinstance(X, pd.DataFrame) else X[class_rows])
+            X_class = np.asarray(X_class, dtype=np.float32)
+            self._generate(X_class, count, X_synthetic[position:position + count], rng, chunk_rows)
+            y_synthetic[position:position + count] = label
+            position += count
+        return X_synthetic, y_synthetic
+
 
 class DataBalancer:
     """Handle imbalanced datasets using various techniques"""
     
-    def __init__(self, strategy='smote', random_state=42):
+    def __init__(self, strategy='smote', random_state=42, k_neighbors=5, n_jobs=-1, memory_budget_mb=None):
         """
         Initialize data balancer
         
         Args:
-            strategy: 'smote', 'adasyn', 'combined', 'undersample', or None
+            strategy: 'smote', 'scalable_smote', 'adasyn', 'combined', 'undersample',
+                'weights' (no resampling; see sample_weight), or None
             random_state: Random seed for reproducibility
+            k_neighbors: Neighbors used by 'scalable_smote'
+            n_jobs: Cores used by the 'scalable_smote' neighbor search (-1 = all)
+            memory_budget_mb: Per-chunk working memory for 'scalable_smote'
         """
         self.strategy = strategy
         self.random_state = random_state
+        self.k_neighbors = k_neighbors
+        self.n_jobs = n_jobs
+        self.memory_budget_mb = memory_budget_mb
         self.balancer = None
+        self.sample_weight = None
         self.original_distribution = None
         self.balanced_distribution = None
         
@@ -48,30 +361,21 @@ class DataBalancer:
             dict: Imbalance statistics
         """
         try:
-            # Get class distribution
-            unique, counts = np.unique(y, return_counts=True)
-            distribution = dict(zip(unique, counts))
-            
-            # Calculate imbalance ratio
-            max_count = max(counts)
-            min_count = min(counts)
-            imbalance_ratio = max_count / min_count
-            
-            # Calculate percentages
-            total = sum(counts)
-            percentages = {k: (v / total) * 100 for k, v in distribution.items()}
+            # One bincount pass
+            dist = ClassDistribution.from_labels(y)
+            imbalance_ratio = float(dist.imbalance_ratio)
             
             analysis = {
                 'feature': feature_name,
-                'class_distribution': distribution,
-                'class_percentages': percentages,
-                'total_samples': total,
+                'class_distribution': dist.as_dict(),
+                'class_percentages': dict(zip(dist.labels.tolist(), (dist.proportions * 100).tolist())),
+                'total_samples': dist.total,
                 'imbalance_ratio': imbalance_ratio,
                 'is_imbalanced': imbalance_ratio > 1.5,  # Threshold for imbalance
-                'majority_class': max(distribution, key=distribution.get),
-                'minority_class': min(distribution, key=distribution.get),
-                'majority_count': max_count,
-                'minority_count': min_count,
+                'majority_class': dist.majority_class,
+                'minority_class': dist.minority_class,
+                'majority_count': int(dist.counts.max()),
+                'minority_count': int(dist.counts.min()),
                 'timestamp': datetime.now().isoformat()
             }
             
@@ -110,6 +414,18 @@ class DataBalancer:
                 
                 logger.info(f"✅ SMOTE applied: Generated synthetic samples for minority class")
                 
+            elif self.strategy == 'scalable_smote':
+                # SMOTE with tree-based parallel neighbor search and chunked float32 output
+                self.balancer = ScalableSMOTE(
+                    k_neighbors=self.k_neighbors,
+                    n_jobs=self.n_jobs,
+                    memory_budget_mb=self.memory_budget_mb,
+                    random_state=self.random_state
+                )
+                X_balanced, y_balanced = self.balancer.fit_resample(X, y)
+                
+                logger.info(f"✅ Scalable SMOTE applied: Generated synthetic samples in chunks")
+                
             elif self.strategy == 'adasyn':
                 # ADASYN: Adaptive Synthetic Sampling
                 self.balancer = ADASYN(random_state=self.random_state)
@@ -134,15 +450,25 @@ class DataBalancer:
                 
                 logger.info(f"✅ Random undersampling applied")
                 
+            elif self.strategy == 'weights':
+                # Class weights: no new rows, every class gets the same total weight
+                self.sample_weight = compute_sample_weights(y)
+                X_balanced, y_balanced = X, y
+                
+                logger.info(f"✅ Sample weights computed (balancer.sample_weight); data unchanged")
+                
             else:
                 logger.warning(f"⚠️ Unknown strategy: {self.strategy}, returning original data")
                 return X, y
             
             # Store balanced distribution
-            self.balanced_distribution = self.analyze_imbalance(y_balanced)
-            
-            # Print balancing report
-            self._print_balancing_report()
+            if self.strategy == 'weights':
+                # Rows are unchanged; report what the weights do instead
+                self.balanced_distribution = self.original_distribution
+                self._print_weights_report()
+            else:
+                self.balanced_distribution = self.analyze_imbalance(y_balanced)
+                self._print_balancing_report()
             
             return X_balanced, y_balanced
             
@@ -150,6 +476,86 @@ class DataBalancer:
             logger.error(f"❌ Error balancing data: {e}")
             return X, y
     
+    def balance_indices(self, X, y, rows=None):
+        """
+        Balance without copying X: row positions into X plus a separate synthetic buffer
+        
+        Supported strategies (INDEX_STRATEGIES): 'undersample', 'combined'
+        (undersampling, then ScalableSMOTE), 'scalable_smote' and 'weights'
+        (all rows, class-balancing sample_weight). 'smote' and 'adasyn' use
+        imblearn and need balance_data.
+        
+        Args:
+            X: Features (array or DataFrame), only read for synthetic rows
+            y: Target
+            rows: Positions of the rows to balance (default: all), e.g. a training split
+        
+        Returns:
+            dict: indices (sorted int64 positions into X), X_synthetic (float32),
+                y_synthetic, and sample_weight (float32, one per row of
+                X[indices] followed by X_synthetic)
+        
+        Raises:
+            ValueError: If the strategy has no index mode
+        """
+        self._check_index_strategy(self.strategy)
+        y_values = np.asarray(y)
+        rows = np.arange(len(y_values)) if rows is None else np.asarray(rows)
+        self.original_distribution = self.analyze_imbalance(y_values[rows])
+        logger.info(f"🔄 Balancing data with {self.strategy} strategy (index mode)...")
+        
+        if self.strategy in ('undersample', 'combined'):
+            indices = self._undersample_indices(y_values, rows)
+        else:
+            indices = np.sort(rows)
+        
+        if self.strategy in ('scalable_smote', 'combined'):
+            self.balancer = ScalableSMOTE(
+                k_neighbors=self.k_neighbors,
+                n_jobs=self.n_jobs,
+                memory_budget_mb=self.memory_budget_mb,
+                random_state=self.random_state
+            )
+            X_synthetic, y_synthetic = self.balancer.sample_synthetic(X, y_values, rows=indices)
+        else:
+            X_synthetic = np.empty((0, X.shape[1]), dtype=np.float32)
+            y_synthetic = np.empty(0, dtype=y_values.dtype)
+        
+        if self.strategy == 'weights':
+            self.sample_weight = compute_sample_weights(y_values[indices])
+            self.balanced_distribution = self.original_distribution
+            self._print_weights_report()
+        else:
+            self.sample_weight = np.ones(len(indices) + len(y_synthetic), dtype=np.float32)
+            self.balanced_distribution = self.analyze_imbalance(np.concatenate([y_values[indices], y_synthetic]))
+            self._print_balancing_report()
+        
+        return {
+            'indices': indices,
+            'X_synthetic': X_synthetic,
+            'y_synthetic': y_synthetic,
+            'sample_weight': self.sample_weight
+        }
+    
+    @staticmethod
+    def _check_index_strategy(strategy):
+        if strategy not in INDEX_STRATEGIES:
+            hint = " (use 'scalable_smote')" if strategy == 'smote' else ""
+            raise ValueError(f"Strategy {strategy} has no index mode{hint}; "
+                             f"supported: {', '.join(INDEX_STRATEGIES)}")
+    
+    def _undersample_indices(self, y_values, rows):
+        """Positions of a random subset of every class, down to the minority class size"""
+        rng = np.random.default_rng(self.random_state)
+        y_rows = y_values[rows]
+        dist = ClassDistribution.from_labels(y_rows)
+        target = int(dist.counts.min())
+        selected = [
+            rng.choice(rows[y_rows == label], size=target, replace=False)
+            for label in dist.labels.tolist()
+        ]
+        return np.sort(np.concatenate(selected))
+    
     def _print_balancing_report(self):
         """Print a report comparing original vs balanced distribution"""
         if not self.original_distribution or not self.balanced_distribution:
@@ -159,19 +565,10 @@ class DataBalancer:
         logger.info("📊 DATA BALANCING REPORT")
         logger.info("="*60)
         
-        logger.info("\n🔴 BEFORE BALANCING:")
         orig = self.original_distribution
-        for class_label, count in orig['class_distribution'].items():
-            percentage = orig['class_percentages'].get(class_label, 0)
-            logger.info(f"   Class {class_label}: {count:>6} samples ({percentage:>5.1f}%)")
-        logger.info(f"   Imbalance ratio: {orig['imbalance_ratio']:.2f}:1")
-        
-        logger.info("\n🟢 AFTER BALANCING:")
         balanced = self.balanced_distribution
-        for class_label, count in balanced['class_distribution'].items():
-            percentage = balanced['class_percentages'].get(class_label, 0)
-            logger.info(f"   Class {class_label}: {count:>6} samples ({percentage:>5.1f}%)")
-        logger.info(f"   Imbalance ratio: {balanced['imbalance_ratio']:.2f}:1")
+        logger.info("\n🔴 BEFORE BALANCING:\n" + self._format_distribution(orig))
+        logger.info("\n🟢 AFTER BALANCING:\n" + self._format_distribution(balanced))
         
         logger.info("\n📈 IMPROVEMENT:")
         improvement = orig['imbalance_ratio'] - balanced['imbalance_ratio']
@@ -180,17 +577,55 @@ class DataBalancer:
         
         logger.info("="*60 + "\n")
     
+    def _print_weights_report(self):
+        """Print the class weights and the weighted class totals of the 'weights' strategy"""
+        if not self.original_distribution:
+            return
+        
+        counts = self.original_distribution['class_distribution']
+        total, n_classes = sum(counts.values()), len(counts)
+        logger.info("\n" + "="*60)
+        logger.info("📊 DATA BALANCING REPORT (sample weights, rows unchanged)")
+        logger.info("="*60)
+        logger.info("\n🔴 ROWS PER CLASS:\n" + self._format_distribution(self.original_distribution))
+        # Every class gets total / n_classes weight: count * total / (n_classes * count)
+        lines = [
+            f"   Class {label}: weight {total / (n_classes * count):>8.3f} -> "
+            f"weighted total {total / n_classes:>10.1f}"
+            for label, count in counts.items()
+        ]
+        logger.info("\n⚖️ CLASS WEIGHTS:\n" + "\n".join(lines))
+        logger.info("   Effective imbalance ratio: 1.00:1")
+        logger.info("="*60 + "\n")
+    
+    @staticmethod
+    def _format_distribution(analysis):
+        lines = [
+            f"   Class {label}: {count:>6} samples ({percentage:>5.1f}%)"
+            for (label, count), percentage in zip(analysis['class_distribution'].items(),
+                                                  analysis['class_percentages'].values())
+        ]
+        lines.append(f"   Imbalance ratio: {analysis['imbalance_ratio']:.2f}:1")
+        return "\n".join(lines)
+    
     def get_balancing_report(self):
         """Return balancing report as dictionary"""
+        if not (self.original_distribution and self.balanced_distribution):
+            improvement = None
+        else:
+            before = self.original_distribution['imbalance_ratio']
+            # 'weights' keeps every row; its weighted class totals are equal
+            after = 1.0 if self.strategy == 'weights' else self.balanced_distribution['imbalance_ratio']
+            improvement = {
+                'imbalance_ratio_before': before,
+                'imbalance_ratio_after': after,
+                'ratio_improvement': before - after
+            }
         return {
             'original_distribution': self.original_distribution,
             'balanced_distribution': self.balanced_distribution,
             'strategy_used': self.strategy,
-            'improvement': {
-                'imbalance_ratio_before': self.original_distribution['imbalance_ratio'],
-                'imbalance_ratio_after': self.balanced_distribution['imbalance_ratio'],
-                'ratio_improvement': self.original_distribution['imbalance_ratio'] - self.balanced_distribution['imbalance_ratio']
-            } if self.original_distribution and self.balanced_distribution else None
+            'improvement': improvement
         }
 
 
@@ -198,7 +633,8 @@ class StratifiedBalancer:
     """Balance data while preserving training/test split stratification"""
     
     @staticmethod
-    def split_and_balance(X, y, test_size=0.2, balance_strategy='smote', random_state=42):
+    def split_and_balance(X, y, test_size=0.2, balance_strategy='smote', random_state=42,
+                          return_indices=False):
         """
         Split data into train/test while maintaining class distribution and balancing
         
@@ -208,10 +644,15 @@ class StratifiedBalancer:
             test_size: Test set size (0-1)
             balance_strategy: Strategy for balancing training data
             random_state: Random seed
+            return_indices: Return row positions into X instead of copies
+                (see _split_and_balance_indices; balance_strategy must be
+                one of INDEX_STRATEGIES)
         
         Returns:
             dict: Train/test split with balancing info
         """
+        if return_indices:
+            return StratifiedBalancer._split_and_balance_indices(X, y, test_size, balance_strategy, random_state)
         try:
             # First, split with stratification to preserve class distribution
             X_train, X_test, y_train, y_test = train_test_split(
@@ -234,6 +675,7 @@ class StratifiedBalancer:
                 'X_test': X_test,
                 'y_train': y_train_balanced,
                 'y_test': y_test,
+                'sample_weight': balancer.sample_weight,
                 'train_size': len(X_train_balanced),
                 'test_size': len(X_test),
                 'balancing_report': report,
@@ -249,6 +691,407 @@ class StratifiedBalancer:
         except Exception as e:
             logger.error(f"❌ Error in stratified split and balance: {e}")
             return None
+    
+    @staticmethod
+    def _split_and_balance_indices(X, y, test_size, balance_strategy, random_state):
+        """
+        Index-mode split and balance: nothing in X is copied
+        
+        Returns:
+            dict: train_indices / test_indices (sorted positions into X and y),
+                X_synthetic / y_synthetic (extra training rows), sample_weight
+                (X[train_indices] rows, then X_synthetic rows), sizes and report
+        
+        Raises:
+            ValueError: If balance_strategy has no index mode (INDEX_STRATEGIES)
+        """
+        DataBalancer._check_index_strategy(balance_strategy)
+        try:
+            y_values = np.asarray(y)
+            train_rows, test_rows = train_test_split(
+                np.arange(len(y_values)),
+                test_size=test_size,
+                random_state=random_state,
+                stratify=y_values
+            )
+            
+            logger.info("✅ Data split with stratification preserved (index mode)")
+            
+            balancer = DataBalancer(strategy=balance_strategy, random_state=random_state)
+            balanced = balancer.balance_indices(X, y_values, rows=train_rows)
+            
+            result = {
+                'train_indices': balanced['indices'],
+                'test_indices': np.sort(test_rows),
+                'X_synthetic': balanced['X_synthetic'],
+                'y_synthetic': balanced['y_synthetic'],
+                'sample_weight': balanced['sample_weight'],
+                'train_size': len(balanced['indices']) + len(balanced['y_synthetic']),
+                'test_size': len(test_rows),
+                'balancing_report': balancer.get_balancing_report(),
+                'note': 'Test set NOT balanced (use for fair evaluation)'
+            }
+            
+            logger.info(f"✅ Train/test split complete")
+            logger.info(f"   Training set size: {result['train_size']} (balanced, "
+                        f"{len(balanced['y_synthetic'])} synthetic)")
+            logger.info(f"   Test set size: {result['test_size']} (original distribution)")
+            
+            return result
+            
+        except Exception as e:
+            logger.error(f"❌ Error in stratified split and balance: {e}")
+            return None
+
+
+class StreamingBalancer:
+    """
+    Balance a CSV/Parquet file that does not fit in memory
+    
+    Pass 1 reads the file in chunks to count the rows of every class and keep
+    a bounded reservoir sample of each class. Pass 2 reads it again and
+    writes a balanced stream:
+    - classes above the target are undersampled by selection sampling: with
+      the class size known, every chunk takes a hypergeometric share of the
+      rows still needed, which gives an exact-size uniform sample in one pass
+    - classes below the target keep every row, plus SMOTE rows generated on
+      the fly from a neighbor index over the class reservoir. Numeric columns
+      are interpolated; other columns are copied from the base row.
+    Synthetic rows are spread over the output in proportion to each class's
+    rows in every chunk. Memory use is bounded by the chunk size and the
+    reservoir size, not by the file size.
+    """
+    
+    def __init__(self, target_column, strategy='undersample', chunksize=DEFAULT_STREAM_CHUNKSIZE,
+                 k_neighbors=5, neighbor_sample_size=DEFAULT_NEIGHBOR_SAMPLE_SIZE, n_jobs=-1, random_state=42):
+        """
+        Args:
+            target_column: Class label column
+            strategy: 'undersample' (every class down to the minority size),
+                'smote' (every class up to the majority size) or 'combined'
+                (every class to the mean class size)
+            chunksize: Rows read per chunk
+            k_neighbors: Neighbors used for synthetic rows
+            neighbor_sample_size: Rows per class kept for the neighbor index
+            n_jobs: Cores used by the neighbor search (-1 = all)
+            random_state: Random seed for reproducibility
+        """
+        if strategy not in ('undersample', 'smote', 'combined'):
+            raise ValueError(f"Unknown streaming strategy: {strategy}")
+        self.target_column = target_column
+        self.strategy = strategy
+        self.chunksize = chunksize
+        self.k_neighbors = k_neighbors
+        self.neighbor_sample_size = neighbor_sample_size
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.class_counts = None
+        self.reservoirs = None
+    
+    def iter_chunks(self, path):
+        """Yield DataFrame chunks of a CSV or Parquet file"""
+        if path.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=self.chunksize):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(path, chunksize=self.chunksize)
+    
+    def count_classes(self, path):
+        """
+        Pass 1: class counts and a reservoir sample of every class
+        
+        Returns:
+            dict: class label -> row count
+        """
+        rng = np.random.default_rng(self.random_state)
+        distribution = ClassDistribution()
+        reservoirs = {}
+        for chunk in self.iter_chunks(path):
+            for label, rows in chunk.groupby(self.target_column, sort=False):
+                seen = distribution.count(label)
+                reservoir = reservoirs.get(label)
+                if reservoir is None or len(reservoir) < self.neighbor_sample_size:
+                    free = self.neighbor_sample_size - (0 if reservoir is None else len(reservoir))
+                    head = rows.iloc[:free]
+                    reservoir = head if reservoir is None else pd.concat([reservoir, head], ignore_index=True)
+                    reservoirs[label] = reservoir.reset_index(drop=True)
+                    rows = rows.iloc[free:]
+                    seen += len(head)
+                if len(rows):
+                    # Algorithm R, vectorized: row i (1-based) replaces a random slot with probability size/i
+                    slots = rng.integers(0, np.arange(seen + 1, seen + len(rows) + 1))
+                    keep = slots < self.neighbor_sample_size
+                    reservoirs[label].iloc[slots[keep]] = rows.iloc[keep].to_numpy()
+            # groupby skips missing targets, so the counts do too
+            distribution.update(chunk[self.target_column].dropna())
+        counts = distribution.as_dict()
+        self.class_counts = counts
+        self.reservoirs = reservoirs
+        return counts
+    
+    def _targets(self):
+        counts = np.array(list(self.class_counts.values()))
+        if self.strategy == 'undersample':
+            target = counts.min()
+        elif self.strategy == 'smote':
+            target = counts.max()
+        else:
+            target = int(round(counts.mean()))
+        return {label: int(target) for label in self.class_counts}
+    
+    def _build_generators(self, targets):
+        """Neighbor index per class that needs synthetic rows"""
+        generators = {}
+        for label, count in self.class_counts.items():
+            if targets[label] <= count:
+                continue
+            reservoir = self.reservoirs[label]
+            numeric = [c for c in reservoir.select_dtypes(include='number').columns if c != self.target_column]
+            values = reservoir[numeric].to_numpy(dtype=np.float32)
+            k = min(self.k_neighbors, len(reservoir) - 1)
+            neighbors = None
+            if numeric and k > 0:
+                nn = NearestNeighbors(n_neighbors=k + 1, n_jobs=self.n_jobs).fit(values)
+                neighbors = nn.kneighbors(values, return_distance=False)[:, 1:]
+            generators[label] = (reservoir, numeric, values, neighbors)
+        return generators
+    
+    def _synthesize(self, label, generator, size, rng):
+        reservoir, numeric, values, neighbors = generator
+        base = rng.integers(len(reservoir), size=size)
+        rows = reservoir.iloc[base].reset_index(drop=True)
+        if neighbors is not None:
+            partner = neighbors[base, rng.integers(neighbors.shape[1], size=size)]
+            gap = rng.random(size, dtype=np.float32)[:, None]
+            synthetic = values[base] + gap * (values[partner] - values[base])
+            for i, col in enumerate(numeric):
+                column = synthetic[:, i]
+                if pd.api.types.is_integer_dtype(rows[col].dtype):
+                    column = np.rint(column)
+                rows[col] = column.astype(rows[col].dtype)
+        rows[self.target_column] = label
+        return rows
+    
+    def balance_file(self, input_path, output_path):
+        """
+        Balance input_path into output_path (.csv or .parquet)
+        
+        Returns:
+            dict: Class counts before and after, synthetic rows and output path
+        """
+        self.count_classes(input_path)
+        targets = self._targets()
+        generators = self._build_generators(targets)
+        rng = np.random.default_rng(self.random_state + 1)
+        
+        remaining = dict(self.class_counts)              # rows of the class not yet read
+        needed = {label: min(targets[label], count) for label, count in self.class_counts.items()}
+        synthetic_total = {label: max(targets[label] - count, 0) for label, count in self.class_counts.items()}
+        synthetic_done = dict.fromkeys(self.class_counts, 0)
+        written = dict.fromkeys(self.class_counts, 0)
+        
+        writer = _ChunkWriter(output_path)
+        try:
+            for chunk in self.iter_chunks(input_path):
+                parts = []
+                for label, rows in chunk.groupby(self.target_column, sort=False):
+                    m = len(rows)
+                    # Selection sampling: exact hypergeometric share of the rows still needed
+                    take = rng.hypergeometric(needed[label], remaining[label] - needed[label], m) \
+                        if needed[label] < remaining[label] else m
+                    if take < m:
+                        rows = rows.iloc[np.sort(rng.choice(m, size=take, replace=False))]
+                    remaining[label] -= m
+                    needed[label] -= take
+                    parts.append(rows)
+                    written[label] += take
+                    
+                    if label in generators:
+                        # Synthetic rows in proportion to the class rows read so far
+                        read = self.class_counts[label] - remaining[label]
+                        due = synthetic_total[label] * read // self.class_counts[label] - synthetic_done[label]
+                        if due > 0:
+                            parts.append(self._synthesize(label, generators[label], due, rng))
+                            synthetic_done[label] += due
+                            written[label] += due
+                if parts:
+                    writer.write(pd.concat(parts, ignore_index=True))
+        finally:
+            writer.close()
+        
+        report = {
+            'input_path': input_path,
+            'output_path': output_path,
+            'strategy': self.strategy,
+            'class_counts_before': dict(self.class_counts),
+            'class_counts_after': written,
+            'synthetic_rows': sum(synthetic_done.values()),
+            'output_rows': sum(written.values())
+        }
+        logger.info(f"✅ Streaming balance complete: {sum(self.class_counts.values())} → "
+                    f"{report['output_rows']} rows ({report['synthetic_rows']} synthetic) in {output_path}")
+        return report
+
+
+class _ChunkWriter:
+    """Append DataFrame chunks to a CSV or Parquet file"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+        self.header = True
+        if os.path.exists(path):
+            os.remove(path)
+    
+    def write(self, df):
+        if self.path.endswith('.parquet'):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self.writer is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                table = pa.Table.from_pandas(df, schema=self.writer.schema, preserve_index=False)
+            self.writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode='a', header=self.header, index=False)
+            self.header = False
+    
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class ConfusionAccumulator:
+    """
+    Confusion matrix accumulated over label batches in one bincount pass each
+    
+    Rows are true labels, columns predicted labels, over the union of labels
+    seen so far (sorted). Partial matrices from other batches or processes
+    are combined with merge(); to_dict()/from_dict() make them serializable.
+    Recall, precision and F1 (weighted and macro) match sklearn's
+    zero_division=0 results.
+    """
+    
+    def __init__(self):
+        self.labels = np.array([], dtype=object)
+        self.index = {}
+        self.matrix = np.zeros((0, 0), dtype=np.int64)
+    
+    def _positions(self, labels):
+        """Matrix positions of labels, growing (and re-sorting) the matrix for new ones"""
+        labels = labels.tolist()
+        new = [label for label in labels if label not in self.index]
+        if new:
+            labels_all = np.concatenate([self.labels, np.array(new, dtype=object)])
+            try:
+                order = np.argsort(labels_all, kind='stable')
+            except TypeError:
+                order = np.arange(len(labels_all))
+            grown = np.zeros((len(labels_all), len(labels_all)), dtype=np.int64)
+            old = len(self.labels)
+            grown[:old, :old] = self.matrix
+            self.matrix = grown[np.ix_(order, order)]
+            self.labels = labels_all[order]
+            self.index = {label: i for i, label in enumerate(self.labels.tolist())}
+        return np.array([self.index[label] for label in labels], dtype=np.intp)
+    
+    def update(self, y_true, y_pred):
+        """
+        Add a batch of true/predicted labels
+        
+        Returns:
+            ConfusionAccumulator: self
+        """
+        y_true = y_true.to_numpy() if hasattr(y_true, 'to_numpy') else np.asarray(y_true)
+        y_pred = y_pred.to_numpy() if hasattr(y_pred, 'to_numpy') else np.asarray(y_pred)
+        if len(y_true) != len(y_pred):
+            raise ValueError(f"y_true and y_pred lengths differ: {len(y_true)} vs {len(y_pred)}")
+        
+        # Encode both arrays together so they share codes
+        codes, labels = encode_labels(np.concatenate([y_true.ravel(), y_pred.ravel()]))
+        present = np.bincount(codes, minlength=len(labels)) > 0
+        remap = np.zeros(len(labels), dtype=np.intp)
+        remap[present] = self._positions(labels[present])
+        codes = remap[codes]
+        
+        n = len(self.labels)
+        flat = codes[:len(y_true)] * n + codes[len(y_true):]
+        self.matrix += np.bincount(flat, minlength=n * n).reshape(n, n)
+        return self
+    
+    def merge(self, other):
+        """Add another accumulator's counts (labels are aligned by value)"""
+        if len(other.labels):
+            positions = self._positions(other.labels)
+            self.matrix[np.ix_(positions, positions)] += other.matrix
+        return self
+    
+    def to_dict(self):
+        return {'labels': self.labels.tolist(), 'matrix': self.matrix.tolist()}
+    
+    @classmethod
+    def from_dict(cls, data):
+        accumulator = cls()
+        positions = accumulator._positions(np.array(data['labels'], dtype=object))
+        accumulator.matrix[np.ix_(positions, positions)] = np.asarray(data['matrix'], dtype=np.int64)
+        return accumulator
+    
+    @classmethod
+    def from_chunks(cls, chunks, n_jobs=1):
+        """
+        Accumulate (y_true, y_pred) chunks, optionally across processes
+        
+        Args:
+            chunks: Iterable of (y_true, y_pred) pairs
+            n_jobs: Worker processes (1 = in this process)
+        
+        Returns:
+            ConfusionAccumulator
+        """
+        accumulator = cls()
+        if n_jobs == 1:
+            for y_true, y_pred in chunks:
+                accumulator.update(y_true, y_pred)
+            return accumulator
+        
+        with ProcessPoolExecutor(max_workers=None if n_jobs == -1 else n_jobs) as executor:
+            for partial in executor.map(_confusion_chunk, chunks):
+                accumulator.merge(cls.from_dict(partial))
+        return accumulator
+    
+    def metrics(self):
+        """
+        Returns:
+            dict: weighted_/macro_ recall, precision and f1 (zero_division=0)
+        """
+        tp = np.diag(self.matrix).astype(np.float64)
+        support = self.matrix.sum(axis=1)
+        predicted = self.matrix.sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            recall = np.where(support > 0, tp / support, 0.0)
+            precision = np.where(predicted > 0, tp / predicted, 0.0)
+            denominator = precision + recall
+            f1 = np.where(denominator > 0, 2 * precision * recall / denominator, 0.0)
+        
+        total = support.sum()
+        weights = support / total if total else np.zeros(len(support))
+        n = max(len(tp), 1)
+        return {
+            'weighted_recall': float(recall @ weights),
+            'weighted_precision': float(precision @ weights),
+            'weighted_f1': float(f1 @ weights),
+            'macro_recall': float(recall.sum() / n),
+            'macro_precision': float(precision.sum() / n),
+            'macro_f1': float(f1.sum() / n)
+        }
+
+
+def _confusion_chunk(chunk):
+    """Worker: serialized confusion matrix of one (y_true, y_pred) chunk"""
+    y_true, y_pred = chunk
+    return ConfusionAccumulator().update(y_true, y_pred).to_dict()
 
 
 class ImbalanceMetrics:
@@ -268,37 +1111,103 @@ class ImbalanceMetrics:
         """
         metrics = {}
         
-        # Class distribution
-        unique, counts = np.unique(y_true, return_counts=True)
-        metrics['class_distribution'] = dict(zip(unique, counts))
+        # Class distribution (shared with DataBalancer.analyze_imbalance)
+        dist = ClassDistribution.from_labels(y_true)
+        metrics['class_distribution'] = dist.as_dict()
         
         # Imbalance ratio
-        metrics['imbalance_ratio'] = max(counts) / min(counts)
+        metrics['imbalance_ratio'] = float(dist.imbalance_ratio)
         
         # Class weights (for weighted loss functions)
-        total = sum(counts)
-        metrics['class_weights'] = {
-            label: total / (len(unique) * count)
-            for label, count in zip(unique, counts)
-        }
+        metrics['class_weights'] = dict(zip(dist.labels.tolist(), dist.class_weights.tolist()))
         
         # Minority class frequency
-        metrics['minority_class_frequency'] = min(counts) / total
+        metrics['minority_class_frequency'] = float(dist.proportions.min())
         
         if y_pred is not None:
-            # Per-class recall (important for imbalanced data)
-            from sklearn.metrics import recall_score, precision_score, f1_score
+            # Weighted and macro recall/precision/F1 from one confusion matrix pass
+            metrics.update(ConfusionAccumulator().update(y_true, y_pred).metrics())
+        
+        return metrics
+
+
+class BalancingBenchmark:
+    """Compare balancing strategies on cost and downstream quality"""
+    
+    @staticmethod
+    def run(X, y, strategies=None, model_factory=None, test_size=0.2, random_state=42):
+        """
+        Balance the same stratified training split with every strategy, train
+        a classifier on each result and score it on the untouched test split
+        
+        Args:
+            X: Features
+            y: Target
+            strategies: Strategies to compare (default: BENCHMARK_STRATEGIES)
+            model_factory: Callable returning an unfitted classifier that accepts
+                sample_weight (default: HistGradientBoostingClassifier)
+            test_size: Test set size (0-1)
+            random_state: Random seed
+        
+        Returns:
+            list: One dict per strategy: seconds and peak_rss_mb (peak RSS
+                added over the RSS at the start, sampled on a thread so the
+                timing is not skewed the way tracemalloc skews it) of the
+                balancing step, output_rows, macro_f1, macro_recall, weighted_f1
+                (or error if the strategy failed)
+        """
+        if model_factory is None:
+            from sklearn.ensemble import HistGradientBoostingClassifier
+            model_factory = lambda: HistGradientBoostingClassifier(random_state=random_state)
+        
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=test_size, random_state=random_state, stratify=y
+        )
+        
+        results = []
+        for strategy in strategies or BENCHMARK_STRATEGIES:
+            balancer = DataBalancer(strategy=strategy, random_state=random_state)
+            with RSSSampler() as memory:
+                start = time.perf_counter()
+                X_balanced, y_balanced = balancer.balance_data(X_train, y_train)
+                seconds = time.perf_counter() - start
             
-            metrics['weighted_recall'] = recall_score(y_true, y_pred, average='weighted', zero_division=0)
-            metrics['weighted_precision'] = precision_score(y_true, y_pred, average='weighted', zero_division=0)
-            metrics['weighted_f1'] = f1_score(y_true, y_pred, average='weighted', zero_division=0)
+            result = {
+                'strategy': strategy,
+                'seconds': seconds,
+                'peak_rss_mb': memory.added_mb,
+                'output_rows': len(y_balanced)
+            }
+            # balance_data returns the input unchanged when a strategy fails
+            if strategy != 'weights' and X_balanced is X_train:
+                result['error'] = 'balancing failed (see log)'
+                results.append(result)
+                continue
             
-            # Macro averages (equal weight per class)
-            metrics['macro_recall'] = recall_score(y_true, y_pred, average='macro', zero_division=0)
-            metrics['macro_precision'] = precision_score(y_true, y_pred, average='macro', zero_division=0)
-            metrics['macro_f1'] = f1_score(y_true, y_pred, average='macro', zero_division=0)
+            model = model_factory()
+            model.fit(X_balanced, y_balanced, sample_weight=balancer.sample_weight)
+            metrics = ImbalanceMetrics.calculate_imbalance_metrics(y_test, model.predict(X_test))
+            result.update({
+                'macro_f1': metrics['macro_f1'],
+                'macro_recall': metrics['macro_recall'],
+                'weighted_f1': metrics['weighted_f1']
+            })
+            results.append(result)
         
-        return metrics
+        BalancingBenchmark.print_report(results)
+        return results
+    
+    @staticmethod
+    def print_report(results):
+        logger.info("\n" + "="*60)
+        logger.info("⏱️ BALANCING STRATEGY BENCHMARK")
+        logger.info("="*60)
+        logger.info(f"   {'Strategy':<12} {'Time (s)':>9} {'+RSS MB':>9} {'Rows':>9} {'Macro F1':>9}")
+        for r in results:
+            f1 = f"{r['macro_f1']:.4f}" if 'macro_f1' in r else r.get('error', 'n/a')
+            logger.info(f"   {r['strategy']:<12} {r['seconds']:>9.2f} {r['peak_rss_mb']:>9.1f} "
+                        f"{r['output_rows']:>9} {f1:>9}")
+        logger.info("="*60 + "\n")
 
 
 if __name__ == '__main__':
@@ -344,5 +1253,22 @@ if __name__ == '__main__':
         print(f"   Train set: {result['train_size']} samples")
         print(f"   Test set: {result['test_size']} samples")
     
+    # Compare strategies (time, memory, output size, macro F1)
+    print("\n⏱️ STRATEGY BENCHMARK:")
+    for r in BalancingBenchmark.run(X, y):
+        print(f"   {r['strategy']:<12} {r['seconds']:.2f}s  +{r['peak_rss_mb']:.1f} MB RSS  "
+              f"{r['output_rows']} rows  macro F1={r.get('macro_f1', float('nan')):.4f}")
+    
+    # Test out-of-core balancing
+    print("\n💾 STREAMING BALANCE (CSV, 2 passes):")
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_csv = os.path.join(tmp_dir, 'data.csv')
+        pd.DataFrame(X, columns=[f'f{i}' for i in range(X.shape[1])]).assign(target=y).to_csv(input_csv, index=False)
+        stream_report = StreamingBalancer('target', strategy='smote', chunksize=250).balance_file(
+            input_csv, os.path.join(tmp_dir, 'balanced.csv'))
+        print(f"   Before: {stream_report['class_counts_before']}")
+        print(f"   After:  {stream_report['class_counts_after']} ({stream_report['synthetic_rows']} synthetic)")
+    
     print("\n✅ Data balancing test complete!")
     print("=" * 80)
@@ -0,0 +1,182 @@
+"""
+Compact loading of cleaned_data/social_media_cleaned.csv
+
+One loader for every consumer of the cleaned dataset (training, dataset
+preparation, batch predictions, the notebook), with an explicit schema
+instead of pandas' defaults:
+- categorical columns (platform, location, brand_name, ...) use the
+  category dtype; when LabelEncoders are given their classes come first,
+  so category codes equal the encoder's codes for every known value
+- numeric feature columns are float32 by default (the target stays
+  float64); callers whose model compares inputs in float64, such as
+  HistGradientBoosting's binning, ask for numeric_dtype='float64'
+- only the requested columns are parsed (column pruning)
+- the CSV is parsed with the multithreaded pyarrow engine
+
+The first load writes a typed, lossless (float64) Parquet sidecar next to
+the CSV (cleaned_data/.parquet_cache/), keyed by the CSV's size and
+modification time; later loads read only the requested columns from it.
+
+Usage:
+    from data_loading import load_cleaned_data
+    df = load_cleaned_data(columns=feature_columns, label_encoders=label_encoders)
+
+    python data_loading.py      # compare with a default pd.read_csv
+"""
+import os
+import glob
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq  # CSV engine and Parquet sidecar
+    PYARROW_AVAILABLE = True
+except Exception:
+    pq = None  # type: ignore
+    PYARROW_AVAILABLE = False
+
+DATA_PATH = "cleaned_data/social_media_cleaned.csv"
+CACHE_DIR_NAME = ".parquet_cache"
+TARGET_COLUMN = "engagement_rate"
+
+# Model inputs in the order the app builds them
+FEATURE_COLUMNS = [
+    'day_of_week', 'platform', 'location', 'language', 'topic_category',
+    'sentiment_score', 'sentiment_label', 'emotion_type', 'toxicity_score',
+    'brand_name', 'product_name', 'campaign_name', 'campaign_phase',
+    'user_past_sentiment_avg', 'user_engagement_growth', 'buzz_change_rate'
+]
+CATEGORICAL_COLUMNS = [
+    'day_of_week', 'platform', 'location', 'language', 'topic_category',
+    'sentiment_label', 'emotion_type', 'brand_name', 'product_name',
+    'campaign_name', 'campaign_phase'
+]
+NUMERIC_COLUMNS = [col for col in FEATURE_COLUMNS if col not in CATEGORICAL_COLUMNS]
+NUMERIC_DTYPE = 'float32'
+
+
+def schema(numeric_dtype=NUMERIC_DTYPE):
+    """Column -> dtype for every column with a known type"""
+    return {
+        **{col: 'category' for col in CATEGORICAL_COLUMNS},
+        **{col: numeric_dtype for col in NUMERIC_COLUMNS},
+        TARGET_COLUMN: 'float64',
+    }
+
+
+def _sidecar_path(path):
+    """Parquet cache file for the current version of the CSV"""
+    stat = os.stat(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    cache_dir = os.path.join(os.path.dirname(path), CACHE_DIR_NAME)
+    return os.path.join(cache_dir, f"{stem}.{stat.st_size}-{stat.st_mtime_ns}.parquet")
+
+
+def _read_csv(path, columns=None, numeric_dtype=NUMERIC_DTYPE):
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = [col for col in header if columns is None or col in columns]
+    dtype = {col: kind for col, kind in schema(numeric_dtype).items() if col in usecols}
+    engine = "pyarrow" if PYARROW_AVAILABLE else "c"
+    return pd.read_csv(path, usecols=usecols, dtype=dtype, engine=engine)
+
+
+def _write_sidecar(df, sidecar):
+    os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+    # Older sidecars belong to previous versions of the CSV
+    stem = os.path.basename(sidecar).split('.')[0]
+    for stale in glob.glob(os.path.join(os.path.dirname(sidecar), f"{stem}.*.parquet")):
+        if stale != sidecar:
+            os.remove(stale)
+    tmp_path = f"{sidecar}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, sidecar)
+
+
+def apply_vocabularies(df, label_encoders):
+    """
+    Order each categorical column's categories as the encoder's classes
+    (values the encoder has not seen are kept, after the known ones)
+
+    A NaN class (encoders fitted on astype(str) under pandas >= 3) becomes the
+    "nan" placeholder category, so positions stay aligned; missing values
+    themselves keep code -1 (see generate_predictions.encode_rows).
+    """
+    for col, encoder in (label_encoders or {}).items():
+        if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+            known = [str(label) for label in encoder.classes_]
+            known_set = set(known)
+            extra = [label for label in df[col].cat.categories if label not in known_set]
+            df[col] = df[col].cat.set_categories(known + extra)
+    return df
+
+
+def load_cleaned_data(path=DATA_PATH, columns=None, label_encoders=None, numeric_dtype=NUMERIC_DTYPE,
+                      use_cache=True):
+    """
+    Load the cleaned dataset with the compact schema
+
+    Args:
+        path: CSV file
+        columns: Columns to load (missing ones are ignored; default: all)
+        label_encoders: Fitted encoders whose classes define the category order
+        numeric_dtype: dtype of the numeric feature columns
+        use_cache: Read from / write the Parquet sidecar
+
+    Returns:
+        DataFrame: Categorical columns as category, numeric features numeric_dtype
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Dataset not found: {path}")
+
+    sidecar = _sidecar_path(path) if use_cache and PYARROW_AVAILABLE else None
+    if sidecar and os.path.exists(sidecar):
+        if columns is not None:
+            available = set(pq.read_schema(sidecar).names)
+            columns = [col for col in columns if col in available]
+        df = pd.read_parquet(sidecar, columns=columns)
+    elif sidecar:
+        # Cache every column once, at full precision, so later loads can select any of them
+        df = _read_csv(path, numeric_dtype='float64')
+        _write_sidecar(df, sidecar)
+        if columns is not None:
+            df = df[[col for col in columns if col in df.columns]]
+    else:
+        df = _read_csv(path, columns, numeric_dtype)
+        if columns is not None:
+            df = df[[col for col in columns if col in df.columns]]
+
+    numeric = [col for col in NUMERIC_COLUMNS if col in df.columns and df[col].dtype != numeric_dtype]
+    if numeric:
+        df[numeric] = df[numeric].astype(numeric_dtype)
+    return apply_vocabularies(df, label_encoders)
+
+
+def main():
+    if not os.path.exists(DATA_PATH):
+        raise FileNotFoundError(f"Dataset not found: {DATA_PATH}")
+
+    print("=" * 70)
+    print("CLEANED DATA LOADING")
+    print("=" * 70)
+
+    def measure(label, load):
+        start = time.perf_counter()
+        df = load()
+        seconds = time.perf_counter() - start
+        memory_mb = df.memory_usage(deep=True).sum() / (1024 * 1024)
+        print(f"   {label:<32} {seconds * 1000:>8.0f} ms  {memory_mb:>8.1f} MB  {df.shape}")
+        return seconds, memory_mb
+
+    baseline = measure("pd.read_csv (defaults)", lambda: pd.read_csv(DATA_PATH))
+    measure("load_cleaned_data (CSV)", lambda: load_cleaned_data(use_cache=False))
+    load_cleaned_data()  # make sure the sidecar exists
+    cached = measure("load_cleaned_data (Parquet)", load_cleaned_data)
+    pruned = measure("load_cleaned_data (features)", lambda: load_cleaned_data(columns=FEATURE_COLUMNS))
+    print(f"\n📉 Memory: {baseline[1] / max(cached[1], 1e-9):.1f}x smaller; "
+          f"load time: {baseline[0] / max(cached[0], 1e-9):.1f}x faster (cached), "
+          f"{baseline[0] / max(pruned[0], 1e-9):.1f}x (features only)")
+
+
+if __name__ == "__main__":
+    main()
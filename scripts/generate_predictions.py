@@ -1,27 +1,57 @@
 """
 Generate ~100 synthetic predictions and optionally push them to Azure Storage Queue
-for Power BI ingestion. Outputs a local CSV: predictions_powerbi.csv
+for Power BI ingestion. Outputs a local CSV (predictions_powerbi.csv) or a
+partitioned Parquet dataset (predictions_powerbi_parquet/).
 
 Behavior:
 - Loads local model artifacts from models/
-- Samples up to 100 rows from cleaned_data/social_media_cleaned.csv
-- Encodes using saved label_encoders, predicts, writes CSV
-- If Azure Monitoring is configured (connection string + queue), also logs each
-  prediction via AzureMonitoring.log_prediction (App Insights + Queue)
+- Samples up to 100 rows from cleaned_data/social_media_cleaned.csv (loaded
+  with data_loading.load_cleaned_data: model input columns only, compact dtypes)
+- Encodes using saved label_encoders, predicts, writes CSV or Parquet
+- Parquet output is hive-partitioned by prediction_date and platform, with
+  dictionary-encoded categorical columns and snappy/zstd compression
+- With --incremental, scores the full dataset but only rows that are new,
+  changed (feature fingerprint differs) or were scored by an older model,
+  tracked in a scoring manifest (scoring_manifest.parquet). Each run appends
+  its delta to the Parquet dataset (--incremental implies --format parquet
+  --append; CSV is rejected), so a row scored twice appears twice: readers
+  keep the latest prediction_time per row_key
+- Every record carries row_key and fingerprint (hash of the model inputs)
+- Each prediction carries a prediction interval and confidence score
+  (prediction_lower, prediction_upper, confidence) computed in the same batch
+  from the model's tree spread or from models/quantile_models.pkl, if present
+- With --explain, adds a contrib_<feature> column per model input holding its
+  TreeSHAP contribution to the prediction (one batched call, requires shap)
+- If Azure Monitoring is configured (connection string + queue), also logs
+  predictions via AzureMonitoring.log_prediction (App Insights + Queue): every
+  prediction for runs of up to 100, otherwise a 100-row sample plus one
+  batch_predictions_scored metric with the run's totals
 
 Usage:
     $env:AZURE_STORAGE_CONNECTION_STRING="<conn>"  # optional, for queue
     python generate_predictions.py
+    python generate_predictions.py --format parquet --compression zstd
+    python generate_predictions.py --format parquet --append   # add new partitions only
+    python generate_predictions.py --incremental   # Parquet, appended delta
+    python generate_predictions.py --explain
 
-The CSV is safe to import directly into Power BI.
+Both outputs are safe to import directly into Power BI (Parquet via the
+"Parquet" / "Folder" connectors).
 """
 import os
 import json
 import uuid
+import random
+import glob
+import hashlib
+import argparse
 from datetime import datetime
+import numpy as np
 import pandas as pd
 import joblib
 
+from data_loading import load_cleaned_data
+
 # Optional Azure monitoring import
 try:
     from azure_monitoring import AzureMonitoring
@@ -30,13 +60,53 @@ except Exception:
     AzureMonitoring = None  # type: ignore
     MONITORING_AVAILABLE = False
 
+# Optional prediction intervals (src/prediction_confidence.py)
+try:
+    from prediction_confidence import ConfidenceEstimator, load_quantile_models
+    CONFIDENCE_AVAILABLE = True
+except Exception:
+    ConfidenceEstimator = None  # type: ignore
+    CONFIDENCE_AVAILABLE = False
+
+# Optional feature attribution (src/feature_attribution.py, shap imported on first use)
+try:
+    from feature_attribution import AttributionEngine
+    ATTRIBUTION_AVAILABLE = True
+except Exception:
+    AttributionEngine = None  # type: ignore
+    ATTRIBUTION_AVAILABLE = False
+
 PREDICTION_COUNT = 100
+# Per-prediction monitoring events sent per run (each one flushes App
+# Insights); larger runs send a sample plus one aggregate metric
+MONITORING_SAMPLE_SIZE = 100
 DATA_PATH = "cleaned_data/social_media_cleaned.csv"
 OUTPUT_CSV = "predictions_powerbi.csv"
+OUTPUT_PARQUET_DIR = "predictions_powerbi_parquet"
+
+# Parquet layout: one directory level per partition column (hive style)
+PARTITION_COLUMNS = ["prediction_date", "platform"]
+# Low-cardinality string columns stored as Arrow dictionaries
+DICTIONARY_COLUMNS = ["topic_category", "language", "location"]
+PARQUET_COMPRESSIONS = ["snappy", "zstd"]
+# Files written by this script; the only ones a non-append run replaces
+EXPORT_FILE_PATTERN = "part-*.parquet"
+
+# Models that compare inputs as float32 anyway (sklearn trees), so numeric
+# columns can be loaded as float32; others (HistGradientBoosting bins in
+# float64) get full precision
+FLOAT32_MODELS = ("RandomForestRegressor", "ExtraTreesRegressor", "DecisionTreeRegressor")
+
+MODEL_PATH = "models/engagement_model.pkl"
+QUANTILE_MODELS_PATH = "models/quantile_models.pkl"
+MANIFEST_PATH = "scoring_manifest.parquet"
+# Stable row identifier; the CSV row index is used when the column is absent
+ROW_KEY_COLUMN = "post_id"
+MANIFEST_COLUMNS = ["row_key", "fingerprint", "model_version", "prediction", "scored_at"]
 
 
 def load_artifacts():
-    model = joblib.load("models/engagement_model.pkl")
+    model = joblib.load(MODEL_PATH)
     feature_columns = joblib.load("models/feature_columns.pkl")
     label_encoders = joblib.load("models/label_encoders.pkl")
     with open("models/experiment_results.json", "r", encoding="utf-8") as f:
@@ -44,67 +114,353 @@ def load_artifacts():
     return model, feature_columns, label_encoders, exp
 
 
-def prepare_sample(df, label_encoders, feature_columns):
-    sample_df = df.sample(min(PREDICTION_COUNT, len(df)), random_state=42).copy()
+def missing_value_code(encoder):
+    """
+    Code the encoder gives a missing value: its NaN class (pandas >= 3 keeps
+    NaN through astype(str)) or its "nan" class (older pandas), else 0
+    """
+    for code, label in enumerate(encoder.classes_):
+        if pd.isna(label) or label == "nan":
+            return code
+    return 0
+
+
+def encode_rows(rows, label_encoders, feature_columns):
+    encoded = rows.copy()
     # Encode categoricals with saved encoders
     for col, encoder in label_encoders.items():
-        if col in sample_df.columns:
+        if col in encoded.columns and isinstance(encoded[col].dtype, pd.CategoricalDtype):
+            # Categories were ordered as the encoder's classes (data_loading):
+            # known codes are already the encoded values, missing values (code
+            # -1) get the encoder's missing-value class, unseen values classes_[0]
+            n_classes = len(encoder.classes_)
+            codes = encoded[col].cat.codes.to_numpy()
+            codes = np.where(codes < 0, missing_value_code(encoder), codes)
+            encoded[col] = np.where(codes < n_classes, codes, 0)
+        elif col in encoded.columns:
             try:
-                sample_df[col] = encoder.transform(sample_df[col].astype(str))
+                encoded[col] = encoder.transform(encoded[col].astype(str))
             except Exception:
                 fallback = encoder.classes_[0]
-                sample_df[col] = (
-                    sample_df[col]
+                encoded[col] = (
+                    encoded[col]
                     .astype(str)
-                    .where(sample_df[col].astype(str).isin(encoder.classes_), fallback)
+                    .where(encoded[col].astype(str).isin(encoder.classes_), fallback)
                 )
-                sample_df[col] = encoder.transform(sample_df[col])
-    return sample_df[feature_columns]
+                encoded[col] = encoder.transform(encoded[col])
+    return encoded[feature_columns]
+
+
+def check_encoding(rows, encoded, label_encoders, max_rows=1000):
+    """
+    Compare encode_rows' category-code path with encoder.transform (the
+    training encoding) on up to max_rows rows, rows with missing values first;
+    values the encoder has never seen are skipped (transform rejects them)
+
+    Raises:
+        RuntimeError: If a categorical column encodes differently
+    """
+    columns = [col for col in label_encoders if col in rows.columns]
+    order = np.argsort(~rows[columns].isna().any(axis=1).to_numpy(), kind="stable")[:max_rows]
+    sample, sample_encoded = rows.iloc[order], encoded.iloc[order]
+    for col in columns:
+        encoder = label_encoders[col]
+        as_str = sample[col].astype(str)
+        known = (as_str.isin(encoder.classes_) | sample[col].isna()).to_numpy()
+        if not known.any():
+            continue
+        expected = encoder.transform(as_str[known])
+        actual = sample_encoded[col].to_numpy()[known]
+        mismatched = int((expected != actual).sum())
+        if mismatched:
+            raise RuntimeError(f"Encoding of '{col}' differs from its LabelEncoder on {mismatched} of "
+                               f"{int(known.sum())} checked rows")
+
+
+def get_model_version(model_path=MODEL_PATH):
+    """Content hash of the model artifact, used to detect re-trained models"""
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def fingerprint_rows(df, feature_columns):
+    """
+    Hash the raw feature columns of every row
+
+    Returns:
+        DataFrame: row_key (str) and fingerprint (uint64), aligned with df
+    """
+    columns = [col for col in feature_columns if col in df.columns]
+    fingerprints = pd.util.hash_pandas_object(df[columns], index=False)
+    row_keys = df[ROW_KEY_COLUMN] if ROW_KEY_COLUMN in df.columns else df.index.to_series()
+    return pd.DataFrame(
+        {"row_key": row_keys.astype(str).to_numpy(), "fingerprint": fingerprints.to_numpy()},
+        index=df.index,
+    )
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=MANIFEST_COLUMNS)
+    return pd.read_parquet(path)
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    tmp_path = f"{path}.tmp"
+    manifest[MANIFEST_COLUMNS].to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def select_rows_to_score(fingerprints, manifest, model_version):
+    """
+    Return a boolean mask of rows that are new, changed, or were scored with
+    a different model version
+    """
+    if manifest.empty:
+        return pd.Series(True, index=fingerprints.index)
 
+    previous = manifest.drop_duplicates("row_key", keep="last").set_index("row_key")
+    positions = previous.index.get_indexer(fingerprints["row_key"])
+    is_new = positions < 0
+    # Positional lookups keep the uint64 hashes exact (no float/NaN round trip)
+    prev_fp = previous["fingerprint"].to_numpy(dtype="uint64")[positions]
+    prev_version = previous["model_version"].to_numpy(dtype=object)[positions]
+    changed = prev_fp != fingerprints["fingerprint"].to_numpy(dtype="uint64")
+    stale_model = prev_version != model_version
+    return pd.Series(is_new | changed | stale_model, index=fingerprints.index)
+
+
+def update_manifest(manifest, scored, model_version, predictions, scored_at):
+    """Upsert the scored rows into the manifest"""
+    updates = pd.DataFrame({
+        "row_key": scored["row_key"].to_numpy(),
+        "fingerprint": scored["fingerprint"].to_numpy(),
+        "model_version": model_version,
+        "prediction": predictions.astype(float),
+        "scored_at": scored_at,
+    })
+    kept = manifest[~manifest["row_key"].isin(updates["row_key"])]
+    if kept.empty:
+        return updates
+    return pd.concat([kept, updates], ignore_index=True)
+
+
+def remove_previous_export(output_dir):
+    """
+    Delete the Parquet files of an earlier export (part-*.parquet) and the
+    partition directories they leave empty; other files are never touched
+
+    Returns:
+        int: Number of files removed
+    """
+    if not os.path.isdir(output_dir):
+        return 0
+    removed = glob.glob(os.path.join(output_dir, "**", EXPORT_FILE_PATTERN), recursive=True)
+    for path in removed:
+        os.remove(path)
+    # Walk up from each emptied partition directory, stopping at output_dir
+    root = os.path.abspath(output_dir)
+    for directory in sorted({os.path.dirname(os.path.abspath(path)) for path in removed}, key=len, reverse=True):
+        while directory != root and os.path.isdir(directory) and not os.listdir(directory):
+            os.rmdir(directory)
+            directory = os.path.dirname(directory)
+    return len(removed)
+
+
+def write_parquet(out_df, output_dir=OUTPUT_PARQUET_DIR, compression="snappy", append=False):
+    """
+    Write predictions as a hive-partitioned Parquet dataset
+
+    Args:
+        out_df: Prediction records (must contain prediction_time and platform)
+        output_dir: Root directory of the dataset
+        compression: Parquet codec ('snappy' or 'zstd')
+        append: Add new files/partitions next to the existing ones instead of
+            replacing the previous export. Existing files are never rewritten.
+            Without append, only files this script wrote (part-*.parquet) are
+            removed; anything else in output_dir is left alone.
+
+    Returns:
+        int: Number of rows written
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    if compression not in PARQUET_COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: {compression}")
+
+    df = out_df.copy()
+    df["prediction_date"] = pd.to_datetime(df["prediction_time"]).dt.strftime("%Y-%m-%d")
+    df["platform"] = df["platform"].fillna("unknown").astype(str)
+    for col in DICTIONARY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    partitioning = ds.partitioning(
+        pa.schema([(col, pa.string()) for col in PARTITION_COLUMNS]),
+        flavor="hive",
+    )
+    file_format = ds.ParquetFileFormat()
+    file_options = file_format.make_write_options(compression=compression, use_dictionary=True)
+
+    if not append:
+        remove_previous_export(output_dir)
+
+    # A per-run file prefix keeps appended files from colliding with earlier runs
+    run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8]
+    ds.write_dataset(
+        table,
+        output_dir,
+        format=file_format,
+        partitioning=partitioning,
+        file_options=file_options,
+        basename_template=EXPORT_FILE_PATTERN.replace("*", f"{run_id}-{{i}}"),
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return table.num_rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate predictions for Power BI")
+    parser.add_argument("--format", choices=["csv", "parquet"], default=None,
+                        help="Output format (default: csv; parquet with --incremental)")
+    parser.add_argument("--output", default=None,
+                        help=f"Output path (default: {OUTPUT_CSV} or {OUTPUT_PARQUET_DIR}/)")
+    parser.add_argument("--compression", choices=PARQUET_COMPRESSIONS, default="snappy",
+                        help="Parquet compression codec (default: snappy)")
+    parser.add_argument("--append", action="store_true",
+                        help="Parquet only: add new partitions without rewriting existing ones")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Score only new/changed rows or rows scored by an older model "
+                             "(implies --format parquet --append)")
+    parser.add_argument("--manifest", default=MANIFEST_PATH,
+                        help=f"Scoring manifest used by --incremental (default: {MANIFEST_PATH})")
+    parser.add_argument("--explain", action="store_true",
+                        help="Add per-feature TreeSHAP contribution columns (contrib_<feature>)")
+    args = parser.parse_args(argv)
+    if args.incremental:
+        # A delta only makes sense added to the previous export, never replacing it
+        if args.format == "csv":
+            parser.error("--incremental writes a Parquet delta; --format csv is not supported")
+        args.format, args.append = "parquet", True
+    args.format = args.format or "csv"
+    if args.append and args.format == "csv":
+        parser.error("--append is only supported with --format parquet")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
 
-def main():
     if not os.path.exists(DATA_PATH):
         raise FileNotFoundError(f"Dataset not found: {DATA_PATH}")
 
-    df = pd.read_csv(DATA_PATH)
     model, feature_columns, label_encoders, _ = load_artifacts()
+    # Only the model inputs and the row key, with compact dtypes
+    numeric_dtype = "float32" if type(model).__name__ in FLOAT32_MODELS else "float64"
+    df = load_cleaned_data(DATA_PATH, columns=list(feature_columns) + [ROW_KEY_COLUMN],
+                           label_encoders=label_encoders, numeric_dtype=numeric_dtype)
+    now_iso = datetime.utcnow().isoformat()
 
-    X = prepare_sample(df, label_encoders, feature_columns)
-    preds = model.predict(X)
+    if args.incremental:
+        model_version = get_model_version()
+        manifest = load_manifest(args.manifest)
+        fingerprints = fingerprint_rows(df, feature_columns)
+        mask = select_rows_to_score(fingerprints, manifest, model_version).to_numpy()
+        rows = df[mask]
+        print(f"🔎 Incremental scoring: {len(rows)} of {len(df)} rows need scoring (model {model_version})")
+        if rows.empty:
+            print("✅ Nothing to score; outputs and manifest left unchanged")
+            return
+    else:
+        rows = df.sample(min(PREDICTION_COUNT, len(df)), random_state=42)
+        fingerprints = fingerprint_rows(rows, feature_columns)
+        mask = None
+    row_ids = fingerprints if mask is None else fingerprints[mask]
+
+    X = encode_rows(rows, label_encoders, feature_columns)
+    check_encoding(rows, X, label_encoders)
+    if CONFIDENCE_AVAILABLE:
+        estimator = ConfidenceEstimator(model, load_quantile_models(QUANTILE_MODELS_PATH), cache_size=0)
+        estimate = estimator.estimate(X)
+        preds = estimate["prediction"]
+        print(f"📏 Prediction intervals: {estimator.method}")
+    else:
+        preds = model.predict(X)
+        estimate = {key: [float("nan")] * len(preds) for key in ("lower", "upper", "confidence")}
+
+    contributions = None
+    if args.explain:
+        if not ATTRIBUTION_AVAILABLE:
+            raise RuntimeError("--explain requires src/feature_attribution.py on the Python path")
+        contributions = AttributionEngine(model, feature_columns, cache_size=0).explain(X)
+        print(f"🔑 Computed feature contributions for {len(X)} predictions")
 
     records = []
-    now_iso = datetime.utcnow().isoformat()
-    for idx, (pred, raw_row) in enumerate(zip(preds, df.sample(len(X), random_state=42).to_dict(orient="records"))):
+    for idx, (pred, raw_row, row_key, fingerprint) in enumerate(
+            zip(preds, rows.to_dict(orient="records"), row_ids["row_key"], row_ids["fingerprint"])):
         record = {
             "prediction_id": str(uuid.uuid4()),
+            "row_key": row_key,
+            "fingerprint": int(fingerprint),
             "prediction": float(pred),
+            "prediction_lower": float(estimate["lower"][idx]),
+            "prediction_upper": float(estimate["upper"][idx]),
+            "confidence": float(estimate["confidence"][idx]),
             "prediction_time": now_iso,
             "platform": raw_row.get("platform"),
             "topic_category": raw_row.get("topic_category"),
             "language": raw_row.get("language"),
             "location": raw_row.get("location"),
         }
+        if contributions is not None:
+            record.update({f"contrib_{col}": float(value) for col, value in zip(feature_columns, contributions[idx])})
         records.append(record)
 
-    # Write CSV for Power BI
+    # Write output for Power BI
     out_df = pd.DataFrame(records)
-    out_df.to_csv(OUTPUT_CSV, index=False)
-    print(f"✅ Wrote {len(out_df)} predictions to {OUTPUT_CSV}")
+    if args.format == "parquet":
+        output_dir = args.output or OUTPUT_PARQUET_DIR
+        written = write_parquet(out_df, output_dir, compression=args.compression, append=args.append)
+        mode = "appended to" if args.append else "written to"
+        print(f"✅ {written} predictions {mode} {output_dir} ({args.compression})")
+    else:
+        output_csv = args.output or OUTPUT_CSV
+        out_df.to_csv(output_csv, index=False)
+        print(f"✅ Wrote {len(out_df)} predictions to {output_csv}")
+
+    # Record scored rows only once their predictions have been written
+    if args.incremental:
+        manifest = update_manifest(manifest, row_ids, model_version, preds, now_iso)
+        save_manifest(manifest, args.manifest)
+        print(f"🗂️ Manifest updated: {args.manifest} ({len(manifest)} rows tracked)")
 
     # Optional: push to Azure Queue via AzureMonitoring
     if MONITORING_AVAILABLE and AzureMonitoring:
         try:
             monitor = AzureMonitoring()
+            monitored = records
+            if len(records) > MONITORING_SAMPLE_SIZE:
+                monitored = random.Random(42).sample(records, MONITORING_SAMPLE_SIZE)
+                monitor.log_metric("batch_predictions_scored", len(records), tags={
+                    "incremental": str(args.incremental),
+                    "mean_prediction": f"{float(np.mean(preds)):.6f}",
+                    "prediction_time": now_iso,
+                })
             sent = 0
-            for rec in records:
+            for rec in monitored:
                 ok = monitor.log_prediction(
                     input_data={"platform": rec["platform"], "topic_category": rec["topic_category"], "language": rec["language"], "location": rec["location"]},
                     prediction=rec["prediction"],
-                    confidence=None,
+                    confidence=None if pd.isna(rec["confidence"]) else rec["confidence"],
                 )
                 if ok:
                     sent += 1
-            print(f"📡 Sent {sent} prediction events to queue/App Insights (if configured)")
+            print(f"📡 Sent {sent} of {len(records)} prediction events to queue/App Insights (if configured)")
         except Exception as e:
             print(f"⚠️ Queue/App Insights not sent: {e}")
     else:
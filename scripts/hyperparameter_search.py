@@ -0,0 +1,485 @@
+"""
+Hyperparameter search for the engagement model (successive halving)
+
+Random configurations of HistGradientBoosting, RandomForest and ExtraTrees
+are scored on a validation split with a small number of training rows; the
+best 1/factor of them move on to the next rung with factor times more rows,
+until one configuration is trained on all rows. Trials of a rung run in
+parallel on a process pool.
+
+Data preparation is shared with training: the encoded matrix comes from the
+cached artifact of prepare_dataset.py. The search splits it, bins the
+features once with edges fitted on the fit rows only (<= 255 quantile bins
+per feature, uint8), so no validation or test row shapes the bins, and every
+worker receives the matrices once through the pool initializer.
+HistGradientBoosting trials train on the binned matrix, which skips its
+per-trial binning; its own binning of the codes is then lossless, so a trial
+matches a model trained on raw features up to where the bin edges fall.
+Forest trials use the raw features.
+
+Each trial stops early: HistGradientBoosting with its built-in early
+stopping, forests by adding trees in steps until the validation score
+stops improving. A wall-clock budget stops the search between trials;
+trials still queued when it runs out are cancelled and the best finished
+configuration wins.
+
+The winner is refitted on the full training split (raw features, so the app
+can use it) and scored on the held-out test split. With --write-bundle it
+replaces models/engagement_model.pkl when it beats the current best model.
+
+Usage:
+    python hyperparameter_search.py
+    python hyperparameter_search.py --candidates 30 --factor 3 --budget 600 --workers 4
+    python hyperparameter_search.py --families HistGradientBoosting --write-bundle
+"""
+import os
+import json
+import math
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import numpy as np
+import joblib
+from sklearn.ensemble import ExtraTreesRegressor, HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.metrics import r2_score
+from sklearn.model_selection import ParameterSampler, train_test_split
+
+from prepare_dataset import DATA_PATH, FEATURE_COLUMNS, bin_features, load_training_data
+from train_model import (MODEL_DIR, QUANTILE_ALPHA, RANDOM_STATE, TEST_SIZE, as_frame, quantile_candidates,
+                         regression_metrics)
+
+# Family -> (estimator class, parameter distributions)
+SEARCH_SPACE = {
+    'HistGradientBoosting': (HistGradientBoostingRegressor, {
+        'learning_rate': [0.02, 0.05, 0.1, 0.2],
+        'max_leaf_nodes': [7, 15, 31, 63],
+        'min_samples_leaf': [10, 20, 50, 100, 200],
+        'l2_regularization': [0.0, 0.1, 1.0, 10.0],
+        'max_features': [0.5, 0.8, 1.0],
+    }),
+    'RandomForest': (RandomForestRegressor, {
+        'max_depth': [None, 6, 10, 16],
+        'min_samples_leaf': [1, 5, 10, 20, 50],
+        'max_features': [1.0, 0.5, 0.33, 'sqrt'],
+    }),
+    'ExtraTrees': (ExtraTreesRegressor, {
+        'max_depth': [None, 6, 10, 16],
+        'min_samples_leaf': [1, 5, 10, 20, 50],
+        'max_features': [1.0, 0.5, 0.33, 'sqrt'],
+    }),
+}
+
+DEFAULT_CANDIDATES = 27          # configurations sampled across all families
+HALVING_FACTOR = 3               # keep 1/factor per rung, factor x more rows
+MIN_RESOURCE_ROWS = 500          # training rows in the first rung (at least)
+DEFAULT_BUDGET_SECONDS = 900     # wall clock for the whole search
+VALIDATION_SIZE = 0.2            # of the training split
+
+# Early stopping
+MAX_HGB_ITERATIONS = 1000
+HGB_PATIENCE = 20
+MAX_FOREST_TREES = 400
+FOREST_TREE_STEP = 25
+FOREST_PATIENCE = 2              # steps without improvement
+MIN_IMPROVEMENT = 1e-4
+
+# Search data held by each worker process (set once by the pool initializer)
+_SEARCH_DATA = None
+
+
+def prepare_search_data(X_train, y_train, random_state=RANDOM_STATE):
+    """
+    Fit/validation split of the training rows, binned with edges fitted on
+    the fit rows, and a fixed row order for the rungs
+
+    Returns:
+        dict: X_fit, X_val (float32), X_fit_binned, X_val_binned (uint8),
+            y_fit, y_val, order (rung r trains on the first rows of order)
+    """
+    X_fit, X_val, y_fit, y_val = train_test_split(
+        np.asarray(X_train, dtype=np.float32), np.asarray(y_train, dtype=np.float64),
+        test_size=VALIDATION_SIZE, random_state=random_state
+    )
+    _, X_fit_binned, X_val_binned = bin_features(X_fit, X_val)
+    return {
+        'X_fit': X_fit,
+        'X_val': X_val,
+        'X_fit_binned': X_fit_binned,
+        'X_val_binned': X_val_binned,
+        'y_fit': y_fit,
+        'y_val': y_val,
+        'order': np.random.default_rng(random_state).permutation(len(y_fit))
+    }
+
+
+def sample_candidates(n_candidates, families=None, random_state=RANDOM_STATE):
+    """
+    Random configurations, split evenly across families
+
+    Returns:
+        list: dicts (id, family, params)
+    """
+    families = list(families or SEARCH_SPACE)
+    candidates = []
+    for i, family in enumerate(families):
+        count = n_candidates // len(families) + (1 if i < n_candidates % len(families) else 0)
+        for params in ParameterSampler(SEARCH_SPACE[family][1], count, random_state=random_state + i):
+            candidates.append({'id': len(candidates), 'family': family, 'params': params})
+    return candidates
+
+
+def halving_schedule(n_candidates, n_rows, factor=HALVING_FACTOR, min_rows=MIN_RESOURCE_ROWS):
+    """
+    Training rows per rung: the last rung uses every row
+
+    Returns:
+        list: Row counts, one per rung (increasing by factor)
+    """
+    n_rungs = max(1, math.ceil(math.log(max(n_candidates, 1), factor)) + 1)
+    while n_rungs > 1 and n_rows // factor ** (n_rungs - 1) < min_rows:
+        n_rungs -= 1
+    return [n_rows // factor ** (n_rungs - 1 - rung) for rung in range(n_rungs)]
+
+
+def fit_forest_early_stopping(model, X, y, X_val, y_val):
+    """
+    Grow a forest FOREST_TREE_STEP trees at a time until the validation R²
+    stops improving, then keep the best number of trees
+
+    Only the new trees predict the validation set at each step.
+
+    Returns:
+        tuple: (validation R², number of trees kept)
+    """
+    model.set_params(warm_start=True)
+    prediction_sum = np.zeros(len(y_val))
+    best_score, best_trees, stale = -np.inf, 0, 0
+    for n_trees in range(FOREST_TREE_STEP, MAX_FOREST_TREES + 1, FOREST_TREE_STEP):
+        model.set_params(n_estimators=n_trees)
+        model.fit(X, y)
+        for tree in model.estimators_[n_trees - FOREST_TREE_STEP:]:
+            prediction_sum += tree.predict(X_val)
+        score = r2_score(y_val, prediction_sum / n_trees)
+        if score > best_score + MIN_IMPROVEMENT:
+            best_score, best_trees, stale = score, n_trees, 0
+        else:
+            stale += 1
+            if stale >= FOREST_PATIENCE:
+                break
+    model.estimators_ = model.estimators_[:best_trees]
+    model.set_params(n_estimators=best_trees, warm_start=False)
+    return best_score, best_trees
+
+
+def build_model(family, params, n_estimators=None):
+    estimator_class = SEARCH_SPACE[family][0]
+    if family == 'HistGradientBoosting':
+        if n_estimators is None:
+            return estimator_class(max_iter=MAX_HGB_ITERATIONS, early_stopping=True,
+                                   n_iter_no_change=HGB_PATIENCE, random_state=RANDOM_STATE, **params)
+        return estimator_class(max_iter=n_estimators, early_stopping=False, random_state=RANDOM_STATE, **params)
+    return estimator_class(n_estimators=n_estimators or FOREST_TREE_STEP, n_jobs=1,
+                           random_state=RANDOM_STATE, **params)
+
+
+def _init_worker(data):
+    global _SEARCH_DATA
+    _SEARCH_DATA = data
+
+
+def _run_trial(candidate, rows):
+    """
+    Worker: train one configuration on the first rows of the fixed order
+
+    Returns:
+        dict: The candidate plus rows, score (validation R²), n_estimators
+            (iterations/trees kept by early stopping) and fit_seconds
+    """
+    data = _SEARCH_DATA
+    subset = data['order'][:rows]
+    family = candidate['family']
+    model = build_model(family, candidate['params'])
+    start = time.perf_counter()
+    if family == 'HistGradientBoosting':
+        model.fit(data['X_fit_binned'][subset], data['y_fit'][subset])
+        score = r2_score(data['y_val'], model.predict(data['X_val_binned']))
+        n_estimators = int(model.n_iter_)
+    else:
+        score, n_estimators = fit_forest_early_stopping(
+            model, data['X_fit'][subset], data['y_fit'][subset], data['X_val'], data['y_val']
+        )
+    return {
+        **candidate,
+        'rows': rows,
+        'score': float(score),
+        'n_estimators': n_estimators,
+        'fit_seconds': time.perf_counter() - start
+    }
+
+
+def _run_isolated(data, candidates, rows, deadline, max_workers=None):
+    """
+    Run trials in single-worker pools, so a worker that dies only fails its own trial
+
+    Returns:
+        tuple: (finished trial dicts, [(candidate, exception)] of failed or
+            unfinished trials)
+    """
+    finished, errors = [], []
+    batch_size = max_workers or os.cpu_count() or 1
+    for first in range(0, len(candidates), batch_size):
+        batch = candidates[first:first + batch_size]
+        pools = [ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(data,)) for _ in batch]
+        try:
+            futures = {pool.submit(_run_trial, candidate, rows): candidate for pool, candidate in zip(pools, batch)}
+            done, not_done = wait(futures, timeout=max(deadline - time.perf_counter(), 0))
+            for future in done:
+                try:
+                    finished.append(future.result())
+                except Exception as e:
+                    errors.append((futures[future], e))
+            for future in not_done:
+                future.cancel()
+                errors.append((futures[future], TimeoutError("wall-clock budget exhausted")))
+        finally:
+            for pool in pools:
+                pool.shutdown(wait=False, cancel_futures=True)
+    return finished, errors
+
+
+def successive_halving(data, candidates, factor=HALVING_FACTOR, min_rows=MIN_RESOURCE_ROWS,
+                       max_workers=None, budget_seconds=DEFAULT_BUDGET_SECONDS):
+    """
+    Run the halving rungs on a process pool within a wall-clock budget
+
+    Trials still queued when the budget runs out are cancelled; trials that
+    are already running finish but are not used. A trial that raises is
+    recorded as failed and the search continues with the others. A worker
+    that dies (e.g. killed for memory) breaks the whole pool: its trials are
+    rerun one per process (see _run_isolated) so only the culprit fails, and
+    a new pool serves the next rung.
+
+    Returns:
+        dict: best (trial dict of the highest rung reached), trials (every
+            finished trial), failed (candidate, rows and error of every
+            failed trial), rungs (rows and candidate count per rung),
+            budget_exhausted, seconds
+    """
+    schedule = halving_schedule(len(candidates), len(data['y_fit']), factor, min_rows)
+    start = time.perf_counter()
+    deadline = start + budget_seconds
+    survivors = list(candidates)
+    trials, failed, rungs, best = [], [], [], None
+    budget_exhausted = False
+
+    def new_pool():
+        return ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                                   initializer=_init_worker, initargs=(data,))
+
+    executor = new_pool()
+    try:
+        for rung, rows in enumerate(schedule):
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                budget_exhausted = True
+                break
+
+            print(f"🔁 Rung {rung + 1}/{len(schedule)}: {len(survivors)} configurations on {rows} rows")
+            futures = {executor.submit(_run_trial, candidate, rows): candidate for candidate in survivors}
+            done, not_done = wait(futures, timeout=remaining)
+            for future in not_done:
+                future.cancel()
+            finished, broken, errors = [], [], []
+            for future in done:
+                try:
+                    finished.append(future.result())
+                except BrokenProcessPool:
+                    broken.append(futures[future])
+                except Exception as e:
+                    errors.append((futures[future], e))
+            if broken:
+                executor.shutdown(wait=False, cancel_futures=True)
+                print(f"   ⚠️ A worker died; rerunning {len(broken)} trials one per process")
+                isolated, isolated_errors = _run_isolated(data, broken, rows, deadline, max_workers)
+                finished.extend(isolated)
+                errors.extend(isolated_errors)
+                executor = new_pool()
+            for candidate, e in errors:
+                failed.append({**candidate, 'rows': rows, 'error': f"{type(e).__name__}: {e}"})
+                print(f"   ⚠️ Trial {candidate['id']} ({candidate['family']}) failed: {e}")
+            finished.sort(key=lambda t: t['score'], reverse=True)
+            rungs.append({'rows': rows, 'candidates': len(survivors), 'finished': len(finished),
+                          'failed': len(errors)})
+            trials.extend(finished)
+            if not finished:
+                budget_exhausted = bool(not_done) or not failed
+                break
+
+            best = finished[0]
+            print(f"   best so far: {best['family']} R²={best['score']:.4f} {best['params']}")
+            if not_done:
+                budget_exhausted = True
+                break
+            survivors = [
+                {key: trial[key] for key in ('id', 'family', 'params')}
+                for trial in finished[:max(1, len(finished) // factor)]
+            ]
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+    if budget_exhausted:
+        print("⏱️ Wall-clock budget exhausted; using the best finished configuration")
+    return {
+        'best': best,
+        'trials': trials,
+        'failed': failed,
+        'rungs': rungs,
+        'budget_exhausted': budget_exhausted,
+        'seconds': time.perf_counter() - start
+    }
+
+
+def search(data_path=DATA_PATH, n_candidates=DEFAULT_CANDIDATES, families=None, factor=HALVING_FACTOR,
+           max_workers=None, budget_seconds=DEFAULT_BUDGET_SECONDS, write_bundle=False, output_dir=MODEL_DIR):
+    """
+    Search, refit the winner on the full training split and score it on the test split
+
+    Returns:
+        dict: family, params, n_estimators, validation_r2, test metrics,
+            search summary (rungs, trials, budget_exhausted, seconds) and
+            whether the bundle was updated
+    """
+    print("=" * 70)
+    print("HYPERPARAMETER SEARCH (successive halving)")
+    print("=" * 70)
+
+    start = time.perf_counter()
+    prepared = load_training_data(data_path)
+    label_encoders = prepared['label_encoders']
+    X, y = prepared['features'], prepared['target']
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE)
+    data = prepare_search_data(X_train, y_train)
+    print(f"📊 Loaded {len(y)} prepared rows ({time.perf_counter() - start:.2f}s)")
+
+    candidates = sample_candidates(n_candidates, families)
+    result = successive_halving(data, candidates, factor, max_workers=max_workers, budget_seconds=budget_seconds)
+    best = result['best']
+    if best is None:
+        if result['failed']:
+            raise RuntimeError(f"No trial finished; {len(result['failed'])} failed "
+                               f"(first error: {result['failed'][0]['error']})")
+        raise RuntimeError("No trial finished within the budget; increase --budget")
+
+    # Refit on raw features with the iteration/tree count early stopping chose
+    model = build_model(best['family'], best['params'], n_estimators=best['n_estimators'])
+    model.fit(as_frame(X_train), y_train)
+    metrics = regression_metrics(y_test, model.predict(as_frame(X_test)))
+    print(f"🏆 {best['family']} {best['params']} ({best['n_estimators']} iterations/trees)")
+    print(f"   Test R²={metrics['r2']:.4f}  MAE={metrics['mae']:.4f}  RMSE={metrics['rmse']:.4f}")
+
+    summary = {
+        'family': best['family'],
+        'params': best['params'],
+        'n_estimators': best['n_estimators'],
+        'validation_r2': best['score'],
+        'metrics': metrics,
+        'search': {key: result[key] for key in ('rungs', 'budget_exhausted', 'seconds')},
+        'trials': len(result['trials']),
+        'failed_trials': result['failed'],
+        'bundle_updated': False
+    }
+    if write_bundle:
+        summary['bundle_updated'] = update_bundle(model, label_encoders, summary, output_dir,
+                                                  training_data=(as_frame(X_train), y_train))
+    return summary
+
+
+def fit_quantile_models(X_train, y_train, alpha=QUANTILE_ALPHA):
+    """Lower/upper quantile models for the prediction intervals, as train_model.py saves them"""
+    models = {
+        bound: estimator_class(random_state=RANDOM_STATE, **params).fit(X_train, y_train)
+        for bound, (estimator_class, params) in quantile_candidates(alpha).items()
+    }
+    return {**models, 'alpha': alpha}
+
+
+def update_bundle(model, label_encoders, summary, output_dir=MODEL_DIR, training_data=None):
+    """
+    Add the tuned model to experiment_results.json and make it the app's
+    model if its test R² beats the current best
+
+    When the model is replaced, the interval models in quantile_models.pkl
+    are refitted on training_data (X_train, y_train), the split the tuned
+    model was refitted on; without training_data they are removed, so the app
+    never pairs the new model with intervals from an older run.
+
+    Returns:
+        bool: True if engagement_model.pkl was replaced
+    """
+    results_path = os.path.join(output_dir, 'experiment_results.json')
+    results = {'metrics': {}, 'models_compared': []}
+    if os.path.exists(results_path):
+        with open(results_path, 'r', encoding='utf-8') as f:
+            results = json.load(f)
+
+    name = f"{summary['family']}Tuned"
+    current_best = results.get('metrics', {}).get(results.get('best_model'), {}).get('r2', -np.inf)
+    results['metrics'][name] = summary['metrics']
+    if name not in results['models_compared']:
+        results['models_compared'].append(name)
+    results['hyperparameter_search'] = {key: value for key, value in summary.items() if key != 'bundle_updated'}
+    results['hyperparameter_search']['timestamp'] = datetime.now().isoformat()
+
+    replaced = summary['metrics']['r2'] > current_best
+    if replaced:
+        os.makedirs(output_dir, exist_ok=True)
+        joblib.dump(model, os.path.join(output_dir, 'engagement_model.pkl'))
+        joblib.dump(FEATURE_COLUMNS, os.path.join(output_dir, 'feature_columns.pkl'))
+        joblib.dump(label_encoders, os.path.join(output_dir, 'label_encoders.pkl'))
+        quantile_path = os.path.join(output_dir, 'quantile_models.pkl')
+        if training_data is not None:
+            joblib.dump(fit_quantile_models(*training_data), quantile_path)
+            print(f"📏 Quantile models refitted ({int((1 - QUANTILE_ALPHA) * 100)}% interval)")
+        elif os.path.exists(quantile_path):
+            os.remove(quantile_path)
+            print("🗑️ Removed quantile_models.pkl from the previous training run")
+        results['best_model'] = name
+        print(f"✅ {name} is the new best model; engagement_model.pkl updated")
+    else:
+        print(f"ℹ️ {name} (R²={summary['metrics']['r2']:.4f}) does not beat "
+              f"{results.get('best_model')} (R²={current_best:.4f}); model left unchanged")
+
+    with open(results_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, default=str)
+    return replaced
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Successive-halving hyperparameter search for the engagement model")
+    parser.add_argument("--data", default=DATA_PATH, help=f"Cleaned dataset (default: {DATA_PATH})")
+    parser.add_argument("--candidates", type=int, default=DEFAULT_CANDIDATES,
+                        help=f"Configurations sampled (default: {DEFAULT_CANDIDATES})")
+    parser.add_argument("--families", nargs="+", choices=list(SEARCH_SPACE), default=None,
+                        help="Model families to search (default: all)")
+    parser.add_argument("--factor", type=int, default=HALVING_FACTOR,
+                        help=f"Halving factor (default: {HALVING_FACTOR})")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_SECONDS,
+                        help=f"Wall-clock budget in seconds (default: {DEFAULT_BUDGET_SECONDS})")
+    parser.add_argument("--write-bundle", action="store_true",
+                        help="Record the result in experiment_results.json and replace the model if it is better")
+    parser.add_argument("--output-dir", default=MODEL_DIR, help=f"Artifact directory (default: {MODEL_DIR})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    search(args.data, args.candidates, args.families, args.factor, args.workers, args.budget,
+           args.write_bundle, args.output_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,11 @@ Stores and retrieves secrets securely using Azure Key Vault
 
 from azure.identity import DefaultAzureCredential
 from azure.keyvault.secrets import SecretClient
+from azure.core.exceptions import ResourceNotFoundError
+from concurrent.futures import ThreadPoolExecutor
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,33 +18,129 @@ load_dotenv()
 KEY_VAULT_NAME = "kv-social-ml-7487"
 KEY_VAULT_URL = f"https://{KEY_VAULT_NAME}.vault.azure.net/"
 
+STORAGE_CONNECTION_SECRET = "AZURE-STORAGE-CONNECTION-STRING"
+# Secrets the app needs at startup (fetched together by prefetch_secrets)
+REQUIRED_SECRETS = [STORAGE_CONNECTION_SECRET]
+
+# Secret cache: values are served locally for SECRET_CACHE_TTL seconds and
+# refreshed in the background during the last REFRESH_AHEAD_FRACTION of it;
+# missing secrets are remembered for NEGATIVE_CACHE_TTL seconds
+SECRET_CACHE_TTL = 3600
+NEGATIVE_CACHE_TTL = 300
+REFRESH_AHEAD_FRACTION = 0.2
+
 class KeyVaultManager:
     """Manages secrets in Azure Key Vault"""
     
-    def __init__(self):
-        """Initialize Key Vault client with Azure credentials"""
+    def __init__(self, timeout=None, cache_ttl=SECRET_CACHE_TTL, negative_cache_ttl=NEGATIVE_CACHE_TTL):
+        """
+        Initialize Key Vault client with Azure credentials
+        
+        Args:
+            timeout: Seconds allowed for developer credential probes (Azure CLI etc.)
+                and for connecting to the vault (None keeps the SDK defaults)
+            cache_ttl: Seconds a retrieved secret is served from memory
+            negative_cache_ttl: Seconds a missing secret is remembered as missing
+        """
+        self.cache_ttl = cache_ttl
+        self.negative_cache_ttl = negative_cache_ttl
+        self._cache = {}  # name -> (value or None, expires_at)
+        self._refreshing = set()
+        self._cache_lock = threading.Lock()
         try:
             # Use DefaultAzureCredential (works with Azure CLI, Managed Identity, etc.)
-            credential = DefaultAzureCredential()
-            self.client = SecretClient(vault_url=KEY_VAULT_URL, credential=credential)
+            credential_kwargs = {'process_timeout': timeout} if timeout else {}
+            client_kwargs = {'connection_timeout': timeout} if timeout else {}
+            credential = DefaultAzureCredential(**credential_kwargs)
+            self.client = SecretClient(vault_url=KEY_VAULT_URL, credential=credential, **client_kwargs)
             print(f"✅ Connected to Key Vault: {KEY_VAULT_NAME}")
         except Exception as e:
             print(f"⚠️ Could not connect to Key Vault: {e}")
             print("💡 Make sure you're logged in with: az login")
             self.client = None
     
-    def get_secret(self, secret_name):
-        """Retrieve a secret from Key Vault"""
+    def get_secret(self, secret_name, use_cache=True):
+        """
+        Retrieve a secret from Key Vault
+        
+        Cached values are returned without a remote call; shortly before they
+        expire a background refresh is started. Missing secrets are cached as
+        None for negative_cache_ttl seconds.
+        """
         if not self.client:
             return None
         
+        if use_cache:
+            with self._cache_lock:
+                entry = self._cache.get(secret_name)
+            if entry is not None:
+                value, expires_at = entry
+                now = time.monotonic()
+                if now < expires_at:
+                    if value is not None and now >= expires_at - self.cache_ttl * REFRESH_AHEAD_FRACTION:
+                        self._refresh_in_background(secret_name)
+                    return value
+        
+        return self._fetch_secret(secret_name)
+    
+    def _fetch_secret(self, secret_name):
+        """Remote read that updates the cache"""
         try:
-            secret = self.client.get_secret(secret_name)
+            value = self.client.get_secret(secret_name).value
+            self._cache_secret(secret_name, value, self.cache_ttl)
             print(f"✅ Retrieved secret: {secret_name}")
-            return secret.value
+            return value
+        except ResourceNotFoundError:
+            self._cache_secret(secret_name, None, self.negative_cache_ttl)
+            print(f"⚠️ Secret '{secret_name}' not found in Key Vault")
+            return None
         except Exception as e:
             print(f"⚠️ Could not retrieve secret '{secret_name}': {e}")
-            return None
+            # Serve the last known value on transient errors
+            with self._cache_lock:
+                entry = self._cache.get(secret_name)
+            return entry[0] if entry else None
+    
+    def _cache_secret(self, secret_name, value, ttl):
+        with self._cache_lock:
+            self._cache[secret_name] = (value, time.monotonic() + ttl)
+    
+    def _refresh_in_background(self, secret_name):
+        with self._cache_lock:
+            if secret_name in self._refreshing:
+                return
+            self._refreshing.add(secret_name)
+        
+        def refresh():
+            try:
+                self._fetch_secret(secret_name)
+            finally:
+                with self._cache_lock:
+                    self._refreshing.discard(secret_name)
+        
+        threading.Thread(target=refresh, name=f"secret-refresh-{secret_name}", daemon=True).start()
+    
+    def prefetch_secrets(self, secret_names=None, max_workers=4):
+        """
+        Fetch several secrets concurrently into the cache (e.g. once at startup)
+        
+        Returns:
+            dict: secret name -> value (None if missing or unavailable)
+        """
+        if not self.client:
+            return {}
+        secret_names = list(secret_names or REQUIRED_SECRETS)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(secret_names)))) as executor:
+            values = list(executor.map(self._fetch_secret, secret_names))
+        return dict(zip(secret_names, values))
+    
+    def invalidate_secret(self, secret_name=None):
+        """Drop one cached secret, or all of them"""
+        with self._cache_lock:
+            if secret_name is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(secret_name, None)
     
     def set_secret(self, secret_name, secret_value):
         """Store a secret in Key Vault"""
@@ -49,6 +149,7 @@ class KeyVaultManager:
         
         try:
             self.client.set_secret(secret_name, secret_value)
+            self._cache_secret(secret_name, secret_value, self.cache_ttl)
             print(f"✅ Stored secret: {secret_name}")
             return True
         except Exception as e:
@@ -58,7 +159,7 @@ class KeyVaultManager:
     def get_storage_connection_string(self):
         """Get Azure Storage connection string from Key Vault"""
         # Try Key Vault first
-        connection_string = self.get_secret("AZURE-STORAGE-CONNECTION-STRING")
+        connection_string = self.get_secret(STORAGE_CONNECTION_SECRET)
         
         # Fallback to environment variable
         if not connection_string:
@@ -99,7 +200,7 @@ def setup_key_vault_secrets():
     print(f"\n📤 Uploading secrets to Key Vault: {KEY_VAULT_NAME}")
     
     # Store in Key Vault (note: Key Vault secret names use hyphens, not underscores)
-    success = manager.set_secret("AZURE-STORAGE-CONNECTION-STRING", connection_string)
+    success = manager.set_secret(STORAGE_CONNECTION_SECRET, connection_string)
     
     if success:
         print("\n✅ Secrets successfully stored in Key Vault!")
@@ -0,0 +1,57 @@
+"""
+Memory sampling for the training and balancing benchmarks
+
+RSSSampler measures the resident set size of the current process, so it
+covers native buffers (tree arrays, NumPy temporaries) that tracemalloc
+does not see, and it costs the measured code almost nothing: the sampling
+runs on its own thread instead of hooking every allocation.
+
+Usage:
+    with RSSSampler() as memory:
+        model.fit(X, y)
+    print(memory.peak_mb, memory.added_mb)
+"""
+import threading
+
+import psutil
+
+
+class RSSSampler:
+    """
+    Peak resident set size of this process while a block runs
+
+    A background thread samples the RSS every `interval` seconds; peak_mb is
+    the highest sample and added_mb the peak over the RSS at entry. Short
+    spikes between two samples can be missed.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.baseline_mb = 0.0
+        self.peak_mb = 0.0
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        self.peak_mb = max(self.peak_mb, self._process.memory_info().rss / (1024 * 1024))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self.baseline_mb = self.peak_mb
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return False
+
+    @property
+    def added_mb(self):
+        return self.peak_mb - self.baseline_mb
@@ -0,0 +1,234 @@
+"""
+Prepare the training dataset once and reuse it while the source is unchanged
+
+Reads cleaned_data/social_media_cleaned.csv (with the compact schema of
+data_loading.py), fits the LabelEncoders, and writes a versioned artifact
+whose directory name is a hash of the source file's content and of the
+preparation settings:
+
+    cleaned_data/prepared/<hash>/
+        features.npy        encoded model input, float32 (rows x features)
+        target.npy          engagement_rate, float64
+        label_encoders.pkl  column -> fitted LabelEncoder
+        manifest.json       source hash, schema, dtypes, shapes, timing
+
+The .npy files are opened memory-mapped, so loading an artifact costs
+milliseconds and several processes share the same pages. train_model.py
+and hyperparameter_search.py call prepare_dataset(), which returns the
+existing artifact when the hash matches and builds it otherwise.
+
+Binned features are not stored: the artifact is not split, so bin edges
+fitted on it would see held-out rows. Callers bin their own training rows
+with bin_features() (hyperparameter_search.py does, once per search).
+
+Usage:
+    python prepare_dataset.py
+    python prepare_dataset.py --data cleaned_data/social_media_cleaned.csv --force
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import joblib
+from sklearn.preprocessing import LabelEncoder
+
+from data_loading import CATEGORICAL_COLUMNS, DATA_PATH, FEATURE_COLUMNS, TARGET_COLUMN, load_cleaned_data
+
+PREPARED_ROOT = "cleaned_data/prepared"
+
+MAX_BINS = 255
+# Bump when the preparation logic changes so old artifacts are not reused
+PREPARE_VERSION = 2
+
+
+def load_dataset(path=DATA_PATH):
+    df = load_cleaned_data(path, columns=FEATURE_COLUMNS + [TARGET_COLUMN])
+    missing = [col for col in FEATURE_COLUMNS + [TARGET_COLUMN] if col not in df.columns]
+    if missing:
+        raise ValueError(f"Dataset is missing columns: {missing}")
+    return df.dropna(subset=[TARGET_COLUMN])
+
+
+def fit_encoders(df):
+    """One LabelEncoder per categorical column, fitted on its string values"""
+    return {col: LabelEncoder().fit(df[col].astype(str)) for col in CATEGORICAL_COLUMNS}
+
+
+def encode_features(df, label_encoders):
+    """
+    Model input: categoricals label-encoded, numerics as-is
+
+    Returns:
+        DataFrame: Columns in FEATURE_COLUMNS order
+    """
+    encoded = df[FEATURE_COLUMNS].copy()
+    for col, encoder in label_encoders.items():
+        encoded[col] = encoder.transform(encoded[col].astype(str))
+    return encoded
+
+
+def bin_features(X_fit, *others, max_bins=MAX_BINS):
+    """
+    Quantile-bin every column into integer codes, edges taken from X_fit
+
+    Columns with at most max_bins distinct values get one bin per value
+    (thresholds halfway between them), like HistGradientBoosting's binning.
+
+    Returns:
+        tuple: (bin_edges list, binned X_fit, binned others...); codes are
+            uint8 when every column fits in 256 codes, uint16 otherwise
+    """
+    X_fit = np.asarray(X_fit, dtype=np.float64)
+    edges = []
+    for j in range(X_fit.shape[1]):
+        uniques = np.unique(X_fit[:, j])
+        if len(uniques) <= max_bins:
+            edges.append((uniques[:-1] + uniques[1:]) / 2)
+        else:
+            quantiles = np.quantile(X_fit[:, j], np.linspace(0, 1, max_bins + 1)[1:-1])
+            edges.append(np.unique(quantiles))
+    dtype = np.uint8 if max(len(e) for e in edges) < 256 else np.uint16
+
+    def apply(X):
+        X = np.asarray(X, dtype=np.float64)
+        binned = np.empty(X.shape, dtype=dtype)
+        for j, column_edges in enumerate(edges):
+            binned[:, j] = np.searchsorted(column_edges, X[:, j], side='right')
+        return binned
+
+    return (edges, apply(X_fit)) + tuple(apply(X) for X in others)
+
+
+def dataset_hash(path=DATA_PATH):
+    """Content hash of the source file and the preparation settings"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps({
+        'version': PREPARE_VERSION,
+        'features': FEATURE_COLUMNS,
+        'categorical': CATEGORICAL_COLUMNS,
+        'target': TARGET_COLUMN
+    }, sort_keys=True).encode('utf-8'))
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def _write_artifact(df, artifact_dir, source_path, source_hash):
+    start = time.perf_counter()
+    label_encoders = fit_encoders(df)
+    features = encode_features(df, label_encoders).to_numpy(dtype=np.float32)
+    target = df[TARGET_COLUMN].to_numpy(dtype=np.float64)
+
+    np.save(os.path.join(artifact_dir, 'features.npy'), features)
+    np.save(os.path.join(artifact_dir, 'target.npy'), target)
+    joblib.dump(label_encoders, os.path.join(artifact_dir, 'label_encoders.pkl'))
+
+    manifest = {
+        'source_path': source_path,
+        'source_hash': source_hash,
+        'version': PREPARE_VERSION,
+        'created': datetime.now().isoformat(),
+        'rows': len(target),
+        'feature_columns': FEATURE_COLUMNS,
+        'categorical_columns': CATEGORICAL_COLUMNS,
+        'target_column': TARGET_COLUMN,
+        'dtypes': {'features': str(features.dtype), 'target': str(target.dtype)},
+        'prepare_seconds': time.perf_counter() - start
+    }
+    with open(os.path.join(artifact_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def prepare_dataset(data_path=DATA_PATH, root=PREPARED_ROOT, force=False):
+    """
+    Return the prepared artifact for data_path, building it if needed
+
+    The artifact is written to a temporary directory and renamed into place,
+    so concurrent runs never see a half-written artifact.
+
+    Args:
+        data_path: Cleaned dataset (CSV)
+        root: Directory holding one subdirectory per artifact hash
+        force: Rebuild even if an artifact with the same hash exists
+
+    Returns:
+        str: Artifact directory (pass to load_prepared)
+    """
+    source_hash = dataset_hash(data_path)
+    artifact_dir = os.path.join(root, source_hash)
+    if os.path.exists(os.path.join(artifact_dir, 'manifest.json')) and not force:
+        print(f"♻️ Reusing prepared dataset {artifact_dir}")
+        return artifact_dir
+
+    os.makedirs(root, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f".{source_hash}-", dir=root)
+    try:
+        manifest = _write_artifact(load_dataset(data_path), tmp_dir, data_path, source_hash)
+        if os.path.exists(artifact_dir):
+            shutil.rmtree(artifact_dir)
+        os.replace(tmp_dir, artifact_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    print(f"✅ Prepared {manifest['rows']} rows in {manifest['prepare_seconds']:.2f}s → {artifact_dir}")
+    return artifact_dir
+
+
+def load_prepared(artifact_dir, mmap=True):
+    """
+    Open a prepared artifact
+
+    Args:
+        artifact_dir: Directory returned by prepare_dataset
+        mmap: Memory-map the arrays (read-only) instead of reading them
+
+    Returns:
+        dict: features, target (arrays), label_encoders, manifest
+    """
+    mmap_mode = 'r' if mmap else None
+    with open(os.path.join(artifact_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return {
+        'features': np.load(os.path.join(artifact_dir, 'features.npy'), mmap_mode=mmap_mode),
+        'target': np.load(os.path.join(artifact_dir, 'target.npy'), mmap_mode=mmap_mode),
+        'label_encoders': joblib.load(os.path.join(artifact_dir, 'label_encoders.pkl')),
+        'manifest': manifest
+    }
+
+
+def load_training_data(data_path=DATA_PATH, root=PREPARED_ROOT):
+    """
+    Prepared dataset for data_path (built on first use), memory-mapped
+
+    Returns:
+        dict: See load_prepared
+    """
+    return load_prepared(prepare_dataset(data_path, root))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the cached, encoded training dataset artifact")
+    parser.add_argument("--data", default=DATA_PATH, help=f"Cleaned dataset (default: {DATA_PATH})")
+    parser.add_argument("--root", default=PREPARED_ROOT, help=f"Artifact root (default: {PREPARED_ROOT})")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the source is unchanged")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    artifact_dir = prepare_dataset(args.data, args.root, args.force)
+    manifest = load_prepared(artifact_dir)['manifest']
+    print(f"   {manifest['rows']} rows x {len(manifest['feature_columns'])} features "
+          f"(source {manifest['source_hash']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Train the engagement model locally (no Azure ML workspace needed)
+
+Loads the prepared dataset for cleaned_data/social_media_cleaned.csv
+(encoded once and cached by prepare_dataset.py, memory-mapped) and trains the candidate regressors (RandomForest,
+HistGradientBoosting, ExtraTrees) in parallel, one per worker process. The
+best model by test R² is saved with the exact artifact bundle the app loads:
+
+    models/engagement_model.pkl       best fitted regressor
+    models/feature_columns.pkl        model input columns, in order
+    models/label_encoders.pkl         column -> fitted LabelEncoder
+    models/experiment_results.json    metrics, fit/predict time and peak
+                                      resident memory of every candidate
+    models/quantile_models.pkl        lower/upper quantile models (intervals)
+    models/attribution_background.json  typical feature values (Key Factors)
+
+The quantile models are trained in the same process pool as the candidates.
+Memory is the worker's resident set size, sampled while each model fits and
+predicts, so it includes the native buffers the estimators allocate outside
+the Python heap (tree arrays, histograms); every model gets a fresh worker.
+
+Usage:
+    python train_model.py
+    python train_model.py --data cleaned_data/social_media_cleaned.csv --workers 3
+    python train_model.py --no-quantiles --no-background
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.ensemble import ExtraTreesRegressor, HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+
+from memory_sampling import RSSSampler
+from prepare_dataset import DATA_PATH, FEATURE_COLUMNS, load_training_data
+
+# The attribution background is computed with the app's own module in src/
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+from feature_attribution import save_background, summarize_background  # noqa: E402
+
+MODEL_DIR = "models"
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+QUANTILE_ALPHA = 0.1  # 90% prediction interval (see prediction_confidence.py)
+
+# Candidate name -> (estimator class, parameters). Forests use one core
+# each because the candidates already run in parallel processes.
+CANDIDATE_MODELS = {
+    'RandomForest': (RandomForestRegressor, {'n_estimators': 100, 'n_jobs': 1}),
+    'HistGradientBoosting': (HistGradientBoostingRegressor, {'max_iter': 100}),
+    'ExtraTrees': (ExtraTreesRegressor, {'n_estimators': 100, 'n_jobs': 1}),
+}
+
+
+def as_frame(features):
+    """Prepared feature matrix as a DataFrame, so models record the feature names the app passes"""
+    return pd.DataFrame(features, columns=FEATURE_COLUMNS)
+
+
+def regression_metrics(y_true, y_pred):
+    return {
+        'r2': float(r2_score(y_true, y_pred)),
+        'mae': float(mean_absolute_error(y_true, y_pred)),
+        'rmse': float(np.sqrt(mean_squared_error(y_true, y_pred)))
+    }
+
+
+def _fit_candidate(name, estimator_class, params, X_train, y_train, X_test, y_test):
+    """
+    Worker: fit one model and measure it
+
+    Runs in a fresh worker process (max_tasks_per_child=1), so memory freed
+    by an earlier model cannot hide this one's allocations.
+
+    Returns:
+        dict: name, model, metrics, fit_seconds, predict_seconds,
+            peak_rss_mb (worker RSS peak while fitting and predicting) and
+            fit_rss_mb (that peak minus the RSS before fitting)
+    """
+    model = estimator_class(random_state=RANDOM_STATE, **params)
+    with RSSSampler() as memory:
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        y_pred = model.predict(X_test)
+        predict_seconds = time.perf_counter() - start
+    return {
+        'name': name,
+        'model': model,
+        'metrics': regression_metrics(y_test, y_pred),
+        'fit_seconds': fit_seconds,
+        'predict_seconds': predict_seconds,
+        'peak_rss_mb': memory.peak_mb,
+        'fit_rss_mb': memory.added_mb
+    }
+
+
+def quantile_candidates(alpha=QUANTILE_ALPHA):
+    """Lower/upper quantile HistGradientBoosting specs for a (1 - alpha) interval"""
+    return {
+        'lower': (HistGradientBoostingRegressor, {'loss': 'quantile', 'quantile': alpha / 2, 'max_iter': 100}),
+        'upper': (HistGradientBoostingRegressor, {'loss': 'quantile', 'quantile': 1 - alpha / 2, 'max_iter': 100}),
+    }
+
+
+def train(data_path=DATA_PATH, output_dir=MODEL_DIR, test_size=TEST_SIZE, max_workers=None,
+          quantiles=True, background=True):
+    """
+    Train, compare and save the model bundle
+
+    Args:
+        data_path: Cleaned dataset (CSV)
+        output_dir: Where the artifacts are written
+        test_size: Held-out fraction used to compare candidates
+        max_workers: Worker processes (default: one per model, capped at the CPU count)
+        quantiles: Also train the quantile models used for prediction intervals
+        background: Also save the attribution background summary
+
+    Returns:
+        dict: The experiment results written to experiment_results.json
+    """
+    print("=" * 70)
+    print("MODEL TRAINING")
+    print("=" * 70)
+
+    start = time.perf_counter()
+    prepared = load_training_data(data_path)
+    label_encoders = prepared['label_encoders']
+    X, y = as_frame(prepared['features']), prepared['target']
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=RANDOM_STATE)
+    prep_seconds = time.perf_counter() - start
+    print(f"📊 Loaded {len(y)} rows, {len(FEATURE_COLUMNS)} features ({prep_seconds:.2f}s)")
+
+    tasks = dict(CANDIDATE_MODELS)
+    if quantiles:
+        tasks.update({f"quantile_{bound}": spec for bound, spec in quantile_candidates(QUANTILE_ALPHA).items()})
+    max_workers = max_workers or min(len(tasks), os.cpu_count() or 1)
+
+    print(f"🚀 Training {len(tasks)} models on {max_workers} worker processes...")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers, max_tasks_per_child=1) as executor:
+        futures = {
+            name: executor.submit(_fit_candidate, name, estimator_class, params, X_train, y_train, X_test, y_test)
+            for name, (estimator_class, params) in tasks.items()
+        }
+        fitted = {name: future.result() for name, future in futures.items()}
+    train_seconds = time.perf_counter() - start
+
+    candidates = {name: fitted[name] for name in CANDIDATE_MODELS}
+    for name, result in candidates.items():
+        m = result['metrics']
+        print(f"   {name:<22} R²={m['r2']:.4f}  MAE={m['mae']:.4f}  RMSE={m['rmse']:.4f}  "
+              f"fit {result['fit_seconds']:.2f}s  peak RSS {result['peak_rss_mb']:.1f} MB "
+              f"(+{result['fit_rss_mb']:.1f} MB)")
+    best_model = max(candidates, key=lambda name: candidates[name]['metrics']['r2'])
+    print(f"🏆 Best model: {best_model}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    joblib.dump(candidates[best_model]['model'], os.path.join(output_dir, 'engagement_model.pkl'))
+    joblib.dump(FEATURE_COLUMNS, os.path.join(output_dir, 'feature_columns.pkl'))
+    joblib.dump(label_encoders, os.path.join(output_dir, 'label_encoders.pkl'))
+
+    if quantiles:
+        joblib.dump({
+            'lower': fitted['quantile_lower']['model'],
+            'upper': fitted['quantile_upper']['model'],
+            'alpha': QUANTILE_ALPHA
+        }, os.path.join(output_dir, 'quantile_models.pkl'))
+        print(f"📏 Quantile models saved ({int((1 - QUANTILE_ALPHA) * 100)}% interval)")
+
+    if background:
+        save_background(summarize_background(X_train, label_encoders),
+                        os.path.join(output_dir, 'attribution_background.json'))
+        print("🔑 Attribution background saved")
+
+    results = {
+        'timestamp': datetime.now().isoformat(),
+        'best_model': best_model,
+        'models_compared': list(candidates),
+        'metrics': {name: result['metrics'] for name, result in candidates.items()},
+        'timings': {
+            name: {'fit_seconds': result['fit_seconds'], 'predict_seconds': result['predict_seconds']}
+            for name, result in fitted.items()
+        },
+        'memory': {
+            name: {'peak_rss_mb': result['peak_rss_mb'], 'fit_rss_mb': result['fit_rss_mb']}
+            for name, result in fitted.items()
+        },
+        'data_prep_seconds': prep_seconds,
+        'parallel_train_seconds': train_seconds,
+        'feature_count': len(FEATURE_COLUMNS),
+        'training_samples': len(X_train),
+        'test_samples': len(X_test)
+    }
+    with open(os.path.join(output_dir, 'experiment_results.json'), 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"✅ Artifacts written to {output_dir}/ (training {train_seconds:.2f}s wall)")
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the engagement model and write the app's model bundle")
+    parser.add_argument("--data", default=DATA_PATH, help=f"Cleaned dataset (default: {DATA_PATH})")
+    parser.add_argument("--output-dir", default=MODEL_DIR, help=f"Artifact directory (default: {MODEL_DIR})")
+    parser.add_argument("--test-size", type=float, default=TEST_SIZE, help="Held-out fraction (default: 0.2)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per model)")
+    parser.add_argument("--no-quantiles", action="store_true", help="Skip the prediction-interval quantile models")
+    parser.add_argument("--no-background", action="store_true", help="Skip the attribution background summary")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    train(args.data, args.output_dir, args.test_size, args.workers,
+          quantiles=not args.no_quantiles, background=not args.no_background)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Process-wide services for the Streamlit app
+The model bundle and the optional integrations (Azure Monitoring, Key Vault)
+are created lazily, at most once per process, in a background thread with a
+bounded wait. An integration that failed is retried after a backoff. The predictions database helpers live here as well.
+
+Streamlit re-executes streamlit_app.py on every interaction, but imported
+modules are executed once per process, so the state kept here survives
+reruns. Nothing connects to Azure until an integration is first needed, and
+heavy libraries (joblib, the Azure SDKs, shap) are imported inside
+the functions that use them so they never delay the app's first paint.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from startup_profiler import get_startup_report, record_timing
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for an integration when it is actually needed
+INTEGRATION_TIMEOUT = float(os.getenv('INTEGRATION_TIMEOUT_SECONDS', '5'))
+# A failed integration is retried on use after this delay, doubling per
+# consecutive failure up to the maximum
+INTEGRATION_RETRY_SECONDS = float(os.getenv('INTEGRATION_RETRY_SECONDS', '60'))
+MAX_INTEGRATION_RETRY_SECONDS = 900
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='integration-init')
+
+
+class LazyIntegration:
+    """
+    An optional integration initialized in the background on first use
+
+    A failure (exception or None from the factory) is not permanent: the next
+    use after the retry delay starts a new attempt in the background, with
+    the delay doubling per consecutive failure.
+    """
+
+    def __init__(self, name, factory, timeout=INTEGRATION_TIMEOUT, retry_seconds=INTEGRATION_RETRY_SECONDS):
+        self.name = name
+        self.factory = factory
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+        self._future = None
+        self._failures = 0
+        self._failed_at = None
+        self._lock = threading.Lock()
+
+    def _build(self):
+        start = time.perf_counter()
+        try:
+            instance = self.factory()
+            record_timing(self.name, time.perf_counter() - start)
+        except Exception as e:
+            record_timing(self.name, time.perf_counter() - start, f'failed: {e}')
+            logger.warning(f"{self.name} not available: {e}")
+            instance = None
+        if instance is None:
+            self._failures += 1
+            self._failed_at = time.monotonic()
+        else:
+            self._failures = 0
+            self._failed_at = None
+        return instance
+
+    def _retry_due(self):
+        if not self._future.done() or self._failed_at is None:
+            return False
+        delay = min(self.retry_seconds * 2 ** (self._failures - 1), MAX_INTEGRATION_RETRY_SECONDS)
+        return time.monotonic() - self._failed_at >= delay
+
+    def start(self):
+        """Begin initialization in the background (no-op if started, unless a failed attempt is due a retry)"""
+        with self._lock:
+            if self._future is None or self._retry_due():
+                if self._future is not None:
+                    logger.info(f"🔄 Retrying {self.name} (attempt {self._failures + 1})")
+                self._future = _executor.submit(self._build)
+        return self
+
+    @property
+    def ready(self):
+        return self._future is not None and self._future.done()
+
+    def get(self, wait=True):
+        """
+        Return the integration instance, or None if unavailable
+
+        Args:
+            wait: Block up to the timeout for initialization to finish;
+                with wait=False, None is returned while it is still pending
+        """
+        self.start()
+        if not wait and not self._future.done():
+            return None
+        try:
+            return self._future.result(timeout=self.timeout if wait else 0)
+        except FutureTimeoutError:
+            logger.warning(f"{self.name} still initializing after {self.timeout:.0f}s; continuing without it")
+            return None
+
+    @property
+    def status(self):
+        """Recorded startup status ('ok', 'failed: ...') or None while pending"""
+        for timing in get_startup_report():
+            if timing['phase'] == self.name:
+                return timing['status']
+        return None
+
+
+def _create_monitoring():
+    from azure_monitoring import AzureMonitoring
+    return AzureMonitoring(connection_timeout=INTEGRATION_TIMEOUT)
+
+
+def _create_key_vault():
+    from key_vault_setup import KeyVaultManager, REQUIRED_SECRETS
+    manager = KeyVaultManager(timeout=INTEGRATION_TIMEOUT)
+    if not manager.client:
+        return None
+    # One concurrent fetch of every startup secret; later reads hit the cache
+    manager.prefetch_secrets(REQUIRED_SECRETS)
+    return manager
+
+
+azure_monitoring = LazyIntegration("Azure Monitoring", _create_monitoring)
+key_vault = LazyIntegration("Azure Key Vault", _create_key_vault)
+
+
+# Model bundle
+LOCAL_MODEL_DIR = 'models'
+MODEL_CONTAINER = 'models'
+MODEL_FILES = [
+    'engagement_model.pkl',
+    'feature_columns.pkl',
+    'label_encoders.pkl',
+    'experiment_results.json'
+]
+# Downloaded when present (quantile models for prediction intervals, feature
+# attribution background summary)
+OPTIONAL_MODEL_FILES = ['quantile_models.pkl', 'attribution_background.json']
+
+
+def _read_model_dir(model_dir):
+    import joblib
+    from feature_attribution import AttributionEngine, load_background
+    from prediction_confidence import ConfidenceEstimator, load_quantile_models
+
+    experiment_results = None
+    exp_path = os.path.join(model_dir, 'experiment_results.json')
+    if os.path.exists(exp_path):
+        with open(exp_path, 'r') as f:
+            experiment_results = json.load(f)
+
+    model = joblib.load(os.path.join(model_dir, 'engagement_model.pkl'))
+    feature_columns = joblib.load(os.path.join(model_dir, 'feature_columns.pkl'))
+    quantile_models = load_quantile_models(os.path.join(model_dir, 'quantile_models.pkl'))
+    background = load_background(os.path.join(model_dir, 'attribution_background.json'))
+    return {
+        'model': model,
+        'feature_columns': feature_columns,
+        'label_encoders': joblib.load(os.path.join(model_dir, 'label_encoders.pkl')),
+        'experiment_results': experiment_results,
+        'confidence': ConfidenceEstimator(model, quantile_models),
+        'attribution': AttributionEngine(model, feature_columns, background)
+    }
+
+
+def _download_models(connection_string):
+    from storage_backend import get_blob_service_client
+
+    container_client = get_blob_service_client(connection_string).get_container_client(MODEL_CONTAINER)
+    temp_dir = tempfile.mkdtemp()
+    for file_name in MODEL_FILES:
+        blob_client = container_client.get_blob_client(file_name)
+        with open(os.path.join(temp_dir, file_name), "wb") as f:
+            f.write(blob_client.download_blob().readall())
+    for file_name in OPTIONAL_MODEL_FILES:
+        try:
+            data = container_client.get_blob_client(file_name).download_blob().readall()
+        except Exception:
+            continue
+        with open(os.path.join(temp_dir, file_name), "wb") as f:
+            f.write(data)
+    return temp_dir
+
+
+def _load_model_bundle():
+    """
+    Load the model from Azure Blob Storage, falling back to local files
+
+    Returns:
+        dict: model, feature_columns, label_encoders, experiment_results,
+            confidence (ConfidenceEstimator), attribution (AttributionEngine), source ('azure' or 'local') and notices (list of (level, message)
+            for the app to display)
+    """
+    from storage_backend import is_local_backend
+
+    notices = []
+    # Get Azure connection string securely (Lab7 Security Criterion #13)
+    # Priority: Environment Variables → Key Vault
+    connection_string = os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
+    if connection_string:
+        logger.info("Connection string from environment variable")
+    else:
+        manager = get_key_vault()
+        connection_string = manager.get_storage_connection_string() if manager else None
+        if connection_string:
+            logger.info("Connection string retrieved from Azure Key Vault")
+
+    if connection_string or is_local_backend():
+        try:
+            logger.info("Starting model load from Azure Blob Storage")
+            bundle = _read_model_dir(_download_models(connection_string))
+            logger.info("Model successfully loaded from Azure Blob Storage")
+            bundle.update(source='azure', notices=[('success', "Model loaded from Azure Blob Storage!")])
+            return bundle
+        except Exception as e:
+            logger.error(f"Error loading from Azure: {e}", exc_info=True)
+            notices.append(('error', f"Error loading from Azure: {e}"))
+            notices.append(('warning', "Trying local files as fallback..."))
+    else:
+        logger.warning("No Azure connection found. Falling back to local files")
+        notices.append(('warning', "⚠️ No Azure connection found. Loading from local files..."))
+
+    bundle = _read_model_dir(LOCAL_MODEL_DIR)
+    notices.append(('info', "Model loaded from local files"))
+    bundle.update(source='local', notices=notices)
+    return bundle
+
+
+# Loading the model is required, so callers wait for it without a timeout
+model_loader = LazyIntegration("Model load", _load_model_bundle, timeout=None)
+
+
+def get_model_bundle(wait=True):
+    """Model bundle dict (see _load_model_bundle), or None if it could not be loaded"""
+    return model_loader.get(wait)
+
+
+# Database helper functions
+PREDICTIONS_DB_PATH = 'database/social_media.db'
+
+
+def get_db_connection():
+    """Get database connection"""
+    os.makedirs(os.path.dirname(PREDICTIONS_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(PREDICTIONS_DB_PATH, check_same_thread=False)
+    return conn
+
+
+def get_total_predictions():
+    """Get total number of predictions from database"""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM predictions")
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count
+    except Exception as e:
+        logger.warning(f"Could not get prediction count from database: {e}")
+        return 0
+
+
+def save_prediction_to_db(prediction_value, input_data):
+    """Save prediction to database"""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        # Create table if it doesn't exist
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS predictions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                predicted_engagement REAL NOT NULL,
+                model_version TEXT,
+                prediction_time TEXT DEFAULT CURRENT_TIMESTAMP,
+                processing_time_ms REAL
+            )
+        ''')
+
+        # Insert prediction
+        cursor.execute('''
+            INSERT INTO predictions (predicted_engagement, model_version, processing_time_ms)
+            VALUES (?, ?, ?)
+        ''', (float(prediction_value), 'HistGradientBoostingRegressor', 0))
+
+        conn.commit()
+        conn.close()
+        logger.info(f"Prediction saved to database: {prediction_value:.4f}")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to save prediction to database: {e}")
+        return False
+
+
+def get_azure_monitoring(wait=True):
+    """AzureMonitoring instance (None when not configured, failed or still pending with wait=False)"""
+    return azure_monitoring.get(wait)
+
+
+def get_key_vault(wait=True):
+    """KeyVaultManager with a connected client (None otherwise)"""
+    return key_vault.get(wait)
@@ -25,6 +25,11 @@ AZURE_CONFIG = {
     'storage_account': 'stsocialmediajkvqol',
     'storage_connection_string': os.getenv('AZURE_STORAGE_CONNECTION_STRING', 'YOUR_STORAGE_CONNECTION_STRING_HERE'),
 
+    # Storage backend: 'azure' (real services) or 'local' (in-process SQLite
+    # emulator of the table/queue/blob operations, for offline runs and benchmarks)
+    'storage_backend': os.getenv('STORAGE_BACKEND', 'azure'),
+    'local_storage_path': os.getenv('LOCAL_STORAGE_PATH', 'database/local_storage.db'),
+
     # Streaming (FREE - Storage Queue)
     'streaming': {
         'queue_name': 'predictions-queue',
@@ -3,8 +3,8 @@ Azure Monitoring & Logging Setup
 100% FREE - Application Insights + Log Analytics
 """
 
-from azure.storage.queue import QueueClient
 from azure_config import AZURE_CONFIG
+from storage_backend import get_queue_client
 import json
 from datetime import datetime
 import logging
@@ -25,7 +25,12 @@ except ImportError:
 class AzureMonitoring:
     """Azure Monitoring with Application Insights and Log Analytics"""
 
-    def __init__(self):
+    def __init__(self, connection_timeout=None):
+        """
+        Args:
+            connection_timeout: Seconds to wait when connecting to App Insights
+                and the Storage Queue (None keeps the SDK defaults)
+        """
         self.app_insights_key = AZURE_CONFIG['monitoring']['application_insights']['instrumentation_key']
         self.log_analytics_id = AZURE_CONFIG['monitoring']['log_analytics']['workspace_id']
         self.queue_name = AZURE_CONFIG['streaming']['queue_name']
@@ -36,6 +41,8 @@ class AzureMonitoring:
         if APP_INSIGHTS_AVAILABLE and self.app_insights_key:
             try:
                 self.telemetry_client = TelemetryClient(self.app_insights_key)
+                if connection_timeout:
+                    self.telemetry_client.channel.sender.send_timeout = connection_timeout
                 # Send a test event to verify connection
                 self.telemetry_client.track_event('MonitoringInitialized', {
                     'status': 'success',
@@ -49,10 +56,8 @@ class AzureMonitoring:
 
         # Initialize queue client for streaming
         try:
-            self.queue_client = QueueClient.from_connection_string(
-                conn_str=self.connection_string,
-                queue_name=self.queue_name
-            )
+            queue_kwargs = {'connection_timeout': connection_timeout} if connection_timeout else {}
+            self.queue_client = get_queue_client(self.queue_name, self.connection_string, **queue_kwargs)
             logger.info("✅ Storage Queue connected")
         except Exception as e:
             logger.error(f"Could not initialize queue client: {e}")
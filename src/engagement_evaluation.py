@@ -0,0 +1,267 @@
+"""
+Incremental Evaluation of Engagement Predictions
+Compares PredictedEngagement with ActualEngagement for posts in Table Storage
+
+Only posts whose actual engagement was updated since the last run are
+evaluated. UpdatedAt is not a key property, so Table Storage answers the
+"UpdatedAt ge <watermark>" filter with a full table scan: every run is billed
+for, and waits on, a scan of all posts, and only the matching rows (with the
+selected columns) are returned. Run it as a scheduled batch job, not per
+request.
+Accuracy (MAE, RMSE, R²) is kept per platform and model version in running
+accumulators, so each post costs O(1) to add, and re-updated posts first
+retract their previous contribution. Accumulator state is persisted as JSON.
+
+Usage:
+    python engagement_evaluation.py
+"""
+
+import json
+import math
+import os
+from datetime import datetime
+
+from table_storage_manager import MAX_PAGE_SIZE, TableStorageManager, iter_entity_pages
+
+STATE_PATH = "models/evaluation_state.json"
+UNKNOWN_MODEL_VERSION = "unknown"
+
+# Properties written back on each evaluated post: the values that are
+# currently counted in the accumulators (used to retract them on re-update)
+EVALUATED_ACTUAL = 'EvaluatedEngagement'
+EVALUATED_PREDICTION = 'EvaluatedPrediction'
+# Model version of the group the values were counted in (it can change later)
+EVALUATED_MODEL_VERSION = 'EvaluatedModelVersion'
+
+EVALUATION_FIELDS = [
+    'PartitionKey', 'RowKey', 'PredictedEngagement', 'ActualEngagement', 'ModelVersion',
+    'UpdatedAt', EVALUATED_ACTUAL, EVALUATED_PREDICTION, EVALUATED_MODEL_VERSION
+]
+
+
+class RunningAccuracy:
+    """
+    Running regression metrics with O(1) add/remove
+
+    Errors are kept as sums; the variance of the actual values (needed for
+    R²) uses Welford's update, which is numerically stable and reversible.
+    """
+
+    def __init__(self, count=0, sum_abs_error=0.0, sum_sq_error=0.0, mean_actual=0.0, m2_actual=0.0):
+        self.count = count
+        self.sum_abs_error = sum_abs_error
+        self.sum_sq_error = sum_sq_error
+        self.mean_actual = mean_actual
+        self.m2_actual = m2_actual
+
+    def add(self, actual, predicted):
+        error = actual - predicted
+        self.count += 1
+        self.sum_abs_error += abs(error)
+        self.sum_sq_error += error * error
+        delta = actual - self.mean_actual
+        self.mean_actual += delta / self.count
+        self.m2_actual += delta * (actual - self.mean_actual)
+
+    def remove(self, actual, predicted):
+        if self.count <= 1:
+            self.__init__()
+            return
+        error = actual - predicted
+        self.sum_abs_error -= abs(error)
+        self.sum_sq_error -= error * error
+        previous_mean = (self.count * self.mean_actual - actual) / (self.count - 1)
+        self.m2_actual -= (actual - previous_mean) * (actual - self.mean_actual)
+        self.mean_actual = previous_mean
+        self.count -= 1
+
+    def metrics(self):
+        if self.count == 0:
+            return {'count': 0, 'mae': None, 'rmse': None, 'r2': None}
+        mse = max(self.sum_sq_error, 0.0) / self.count
+        r2 = 1 - self.sum_sq_error / self.m2_actual if self.m2_actual > 0 else None
+        return {
+            'count': self.count,
+            'mae': max(self.sum_abs_error, 0.0) / self.count,
+            'rmse': math.sqrt(mse),
+            'r2': r2
+        }
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum_abs_error': self.sum_abs_error,
+            'sum_sq_error': self.sum_sq_error,
+            'mean_actual': self.mean_actual,
+            'm2_actual': self.m2_actual
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class EngagementEvaluator:
+    """Maintain rolling accuracy per platform and model version from Table Storage"""
+
+    def __init__(self, manager=None, state_path=STATE_PATH):
+        """
+        Args:
+            manager: TableStorageManager to read posts from (created if omitted)
+            state_path: JSON file holding the accumulators and the watermark
+        """
+        self.manager = manager or TableStorageManager()
+        self.state_path = state_path
+        self.watermark = None
+        self.accumulators = {}
+        self.load_state()
+
+    def load_state(self):
+        if not os.path.exists(self.state_path):
+            return
+        with open(self.state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        self.watermark = state.get('watermark')
+        self.accumulators = {
+            (group['platform'], group['model_version']): RunningAccuracy.from_dict(group['accumulator'])
+            for group in state.get('groups', [])
+        }
+
+    def save_state(self):
+        state = {
+            'watermark': self.watermark,
+            'saved_at': datetime.utcnow().isoformat(),
+            'groups': [
+                {'platform': platform, 'model_version': version, 'accumulator': acc.to_dict()}
+                for (platform, version), acc in sorted(self.accumulators.items())
+            ]
+        }
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def _accumulator(self, group):
+        if group not in self.accumulators:
+            self.accumulators[group] = RunningAccuracy()
+        return self.accumulators[group]
+
+    def _apply(self, entity):
+        """
+        Fold one post into its group's accumulator
+
+        The previously counted pair is retracted from the group it was counted
+        in (EvaluatedModelVersion), which differs from the current group when
+        the post's ModelVersion changed. Marks written before that property
+        existed fall back to the current group.
+
+        Returns:
+            tuple: (group, previous group, previously counted pair or None,
+                newly counted pair)
+        """
+        group = (entity['PartitionKey'], entity.get('ModelVersion') or UNKNOWN_MODEL_VERSION)
+        previous_group = group
+        previous = None
+        if entity.get(EVALUATED_ACTUAL) is not None:
+            previous = (float(entity[EVALUATED_ACTUAL]), float(entity[EVALUATED_PREDICTION]))
+            if entity.get(EVALUATED_MODEL_VERSION) is not None:
+                previous_group = (entity['PartitionKey'], entity[EVALUATED_MODEL_VERSION])
+            self._accumulator(previous_group).remove(*previous)
+        current = (float(entity['ActualEngagement']), float(entity['PredictedEngagement']))
+        self._accumulator(group).add(*current)
+        return group, previous_group, previous, current
+
+    def _revert(self, group, previous_group, previous, current):
+        self._accumulator(group).remove(*current)
+        if previous is not None:
+            self._accumulator(previous_group).add(*previous)
+
+    def update(self, results_per_page=MAX_PAGE_SIZE):
+        """
+        Fold in every post updated since the last run and persist the state
+
+        Posts are marked with the values now counted for them, so processing a
+        post twice (e.g. after a partial failure) is idempotent. Marks are
+        merge-only updates: a post deleted since the scan is not recreated;
+        its batch fails and is retried on the next run.
+        
+        The UpdatedAt filter is on a non-key property, so the service scans
+        the whole posts table (see the module docstring).
+
+        Returns:
+            dict: Number of posts evaluated and failed
+        """
+        since = self.watermark or ''
+        pages = iter_entity_pages(
+            self.manager.posts_table,
+            "UpdatedAt ge @since",
+            {'since': since},
+            select=EVALUATION_FIELDS,
+            results_per_page=results_per_page
+        )
+
+        evaluated = 0
+        failed = 0
+        newest_ok = self.watermark
+        oldest_failed = None
+        for page, _ in pages:
+            applied = {}
+            marks = []
+            for entity in page:
+                if entity.get('ActualEngagement') is None or entity.get('PredictedEngagement') is None:
+                    continue
+                key = (entity['PartitionKey'], entity['RowKey'])
+                applied[key] = (self._apply(entity), entity['UpdatedAt'])
+                marks.append({
+                    'PartitionKey': entity['PartitionKey'],
+                    'RowKey': entity['RowKey'],
+                    EVALUATED_ACTUAL: entity['ActualEngagement'],
+                    EVALUATED_PREDICTION: entity['PredictedEngagement'],
+                    EVALUATED_MODEL_VERSION: entity.get('ModelVersion') or UNKNOWN_MODEL_VERSION
+                })
+
+            report = self.manager.merge_post_properties(marks)
+            for failure in report['failures']:
+                for row_key in failure['row_keys']:
+                    change, updated_at = applied.pop((failure['partition_key'], row_key))
+                    self._revert(*change)
+                    oldest_failed = min(oldest_failed or updated_at, updated_at)
+                    failed += 1
+
+            evaluated += len(applied)
+            for _, updated_at in applied.values():
+                if newest_ok is None or updated_at > newest_ok:
+                    newest_ok = updated_at
+
+        # After a failure, resume from the oldest failed post so it is retried
+        newest = oldest_failed if oldest_failed is not None else newest_ok
+        self.watermark = newest
+        self.save_state()
+        print(f"✅ Evaluated {evaluated} updated posts ({failed} failed, watermark: {self.watermark})")
+        return {'evaluated': evaluated, 'failed': failed}
+
+    def get_metrics(self):
+        """
+        Returns:
+            dict: platform -> model_version -> {count, mae, rmse, r2}
+        """
+        metrics = {}
+        for (platform, version), accumulator in sorted(self.accumulators.items()):
+            metrics.setdefault(platform, {})[version] = accumulator.metrics()
+        return metrics
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("ENGAGEMENT PREDICTION ACCURACY (PREDICTED vs ACTUAL)")
+    print("=" * 70)
+
+    evaluator = EngagementEvaluator()
+    evaluator.update()
+
+    for platform, versions in evaluator.get_metrics().items():
+        for version, m in versions.items():
+            r2 = f"{m['r2']:.4f}" if m['r2'] is not None else "n/a"
+            print(f"   {platform:<10} {version:<18} n={m['count']:<7} "
+                  f"MAE={m['mae']:.4f} RMSE={m['rmse']:.4f} R²={r2}")
@@ -0,0 +1,133 @@
+"""
+Feature Attribution
+Per-prediction feature contributions for the tree models (TreeSHAP)
+
+Contributions use SHAP's path-dependent TreeExplainer, which walks each tree
+once per row using the training cover stored in the nodes, so no background
+dataset is needed at prediction time. A small background summary (expected
+prediction and the typical value of every feature) is precomputed from the
+training data and saved next to the model, so explanations can say what a
+typical post looks like without loading the dataset.
+
+Explanations are computed for whole batches, and recent feature vectors are
+cached, so the app pays milliseconds per prediction and batch exports pay one
+vectorized call. shap is imported on first use.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from row_cache import RowCache
+
+BACKGROUND_PATH = "models/attribution_background.json"
+DEFAULT_BACKGROUND_SIZE = 1000
+DEFAULT_CACHE_SIZE = 4096
+
+
+def summarize_background(X, label_encoders=None, size=DEFAULT_BACKGROUND_SIZE, random_state=42):
+    """
+    Typical value of every feature from (a sample of) the encoded training data
+
+    Args:
+        X: Encoded training features (DataFrame)
+        label_encoders: Used to report categorical modes as labels
+        size: Rows sampled before summarizing
+
+    Returns:
+        dict: feature -> {'typical': median (numeric) or most frequent label
+            (categorical), 'categorical': bool}
+    """
+    sample = X.sample(min(size, len(X)), random_state=random_state) if len(X) > size else X
+    label_encoders = label_encoders or {}
+    summary = {}
+    for col in sample.columns:
+        if col in label_encoders:
+            code = int(sample[col].mode().iloc[0])
+            summary[col] = {'typical': str(label_encoders[col].classes_[code]), 'categorical': True}
+        else:
+            summary[col] = {'typical': float(sample[col].median()), 'categorical': False}
+    return summary
+
+
+def save_background(summary, path=BACKGROUND_PATH):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+
+
+def load_background(path=BACKGROUND_PATH):
+    """Background summary dict, or None if it was not precomputed"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class AttributionEngine:
+    """Batched, cached TreeSHAP contributions for one fitted tree model"""
+
+    def __init__(self, model, feature_columns, background=None, cache_size=DEFAULT_CACHE_SIZE):
+        """
+        Args:
+            model: Fitted tree model (HistGradientBoosting, RandomForest, ExtraTrees, ...)
+            feature_columns: Model input columns, in order
+            background: Background summary (see summarize_background)
+            cache_size: Number of feature vectors whose contributions are kept
+        """
+        self.model = model
+        self.feature_columns = list(feature_columns)
+        self.background = background or {}
+        self.cache_size = cache_size
+        self._explainer = None
+        self._cache = RowCache(cache_size)
+
+    @property
+    def explainer(self):
+        if self._explainer is None:
+            import shap
+            self._explainer = shap.TreeExplainer(self.model, feature_perturbation='tree_path_dependent')
+        return self._explainer
+
+    @property
+    def expected_value(self):
+        """Average model output the contributions are measured from"""
+        return float(np.ravel(self.explainer.expected_value)[0])
+
+    def _compute(self, X):
+        return np.asarray(self.explainer.shap_values(X, check_additivity=False), dtype=np.float64)
+
+    def explain(self, X):
+        """
+        Contributions of every feature for a batch
+
+        Args:
+            X: Encoded model input (DataFrame in feature_columns order)
+
+        Returns:
+            ndarray: (rows, features); each row sums to prediction - expected_value
+        """
+        return self._cache.get_or_compute(X, self._compute, len(self.feature_columns))
+
+    def top_factors(self, contributions, input_row, top=5):
+        """
+        Largest contributions of one prediction
+
+        Args:
+            contributions: One row returned by explain()
+            input_row: Raw (unencoded) input values, dict keyed by feature
+            top: Number of factors
+
+        Returns:
+            list: dicts (feature, value, contribution, typical), largest |contribution| first
+        """
+        order = np.argsort(-np.abs(contributions))[:top]
+        return [
+            {
+                'feature': self.feature_columns[i],
+                'value': input_row.get(self.feature_columns[i]),
+                'contribution': float(contributions[i]),
+                'typical': self.background.get(self.feature_columns[i], {}).get('typical')
+            }
+            for i in order
+        ]
@@ -0,0 +1,113 @@
+"""
+Prediction Confidence
+Prediction intervals and a 0-1 confidence score computed from the model itself
+
+Methods (picked from what the model bundle provides):
+- 'ensemble': RandomForest / ExtraTrees - spread of the per-tree predictions
+  (mean +/- z * std across trees)
+- 'quantile': paired quantile HistGradientBoosting models saved next to the
+  point model (models/quantile_models.pkl: {'lower', 'upper', 'alpha'})
+- 'none': neither available; intervals and confidence are NaN
+
+Intervals are computed for a whole batch at once, in the same pass as the
+point prediction, and recent feature vectors are cached so repeated
+predictions (reruns, sweeps) cost a dictionary lookup.
+
+Confidence = clip(1 - interval_width / scale, 0, 1), where scale is the
+interval width (in engagement-rate units) considered completely uncertain.
+"""
+
+import os
+
+import numpy as np
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+
+from row_cache import RowCache
+
+QUANTILE_MODELS_PATH = "models/quantile_models.pkl"
+DEFAULT_ALPHA = 0.1              # 90% prediction interval
+DEFAULT_CONFIDENCE_SCALE = 0.5   # interval width mapped to 0% confidence
+DEFAULT_CACHE_SIZE = 4096
+
+# Two-sided standard normal quantiles for the ensemble interval
+_Z_SCORES = {0.05: 1.96, 0.1: 1.645, 0.2: 1.2816}
+
+
+def load_quantile_models(path=QUANTILE_MODELS_PATH):
+    """Paired quantile models dict, or None if they were not trained"""
+    if not os.path.exists(path):
+        return None
+    import joblib
+    return joblib.load(path)
+
+
+class ConfidenceEstimator:
+    """Point predictions with intervals and confidence, batched and cached"""
+
+    def __init__(self, model, quantile_models=None, scale=DEFAULT_CONFIDENCE_SCALE,
+                 cache_size=DEFAULT_CACHE_SIZE):
+        """
+        Args:
+            model: Fitted point model (the one the app predicts with)
+            quantile_models: Optional dict with fitted 'lower' and 'upper'
+                quantile models and their 'alpha'
+            scale: Interval width that maps to 0 confidence
+            cache_size: Number of feature vectors whose results are kept
+        """
+        self.model = model
+        self.quantile_models = quantile_models
+        self.scale = scale
+        self.cache_size = cache_size
+        self._cache = RowCache(cache_size)
+
+        if isinstance(model, (RandomForestRegressor, ExtraTreesRegressor)) and len(model.estimators_) > 1:
+            self.method = 'ensemble'
+        elif quantile_models and 'lower' in quantile_models and 'upper' in quantile_models:
+            self.method = 'quantile'
+        else:
+            self.method = 'none'
+        self.alpha = (quantile_models or {}).get('alpha', DEFAULT_ALPHA)
+
+    def _compute(self, X):
+        if self.method == 'ensemble':
+            # Each tree predicts the whole batch; mean across trees is the forest's prediction
+            values = np.asarray(X, dtype=np.float32)
+            per_tree = np.stack([tree.predict(values) for tree in self.model.estimators_])
+            prediction = per_tree.mean(axis=0)
+            half_width = _Z_SCORES.get(self.alpha, 1.645) * per_tree.std(axis=0)
+            lower, upper = prediction - half_width, prediction + half_width
+        elif self.method == 'quantile':
+            prediction = self.model.predict(X)
+            lower = self.quantile_models['lower'].predict(X)
+            upper = self.quantile_models['upper'].predict(X)
+            # Independently fitted quantiles can cross; keep the interval ordered
+            lower, upper = np.minimum(lower, upper), np.maximum(lower, upper)
+        else:
+            prediction = self.model.predict(X)
+            nan = np.full(len(prediction), np.nan)
+            return np.column_stack([prediction, nan, nan, nan])
+
+        confidence = np.clip(1 - (upper - lower) / self.scale, 0.0, 1.0)
+        return np.column_stack([prediction, lower, upper, confidence])
+
+    def estimate(self, X):
+        """
+        Predict a batch with intervals
+
+        Args:
+            X: Encoded model input (DataFrame in feature_columns order)
+
+        Returns:
+            dict: prediction, lower, upper, confidence (numpy arrays aligned with
+                X; lower/upper/confidence are NaN when method is 'none') and method
+        """
+        return self._as_dict(self._cache.get_or_compute(X, self._compute, 4))
+
+    def _as_dict(self, results):
+        return {
+            'prediction': results[:, 0],
+            'lower': results[:, 1],
+            'upper': results[:, 2],
+            'confidence': results[:, 3],
+            'method': self.method
+        }
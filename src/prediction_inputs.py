@@ -0,0 +1,95 @@
+"""
+Prediction Inputs
+Form options and vectorized feature encoding shared by the Streamlit app's
+single predictions and what-if sweeps
+
+A sweep varies one or two categorical inputs of a base configuration over
+all their options (e.g. 5 platforms x 7 days) and scores every combination
+with a single model.predict call. pandas is imported inside the functions so
+importing FORM_OPTIONS stays cheap for the app's first paint.
+"""
+
+import itertools
+
+# Categorical choices offered by the input form (and swept in what-if mode)
+FORM_OPTIONS = {
+    'day_of_week': ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
+    'platform': ['Instagram', 'Twitter', 'Facebook', 'LinkedIn', 'TikTok'],
+    'location': ['USA', 'UK', 'Canada', 'Australia', 'India', 'France', 'Germany'],
+    'language': ['English', 'French', 'Spanish', 'German', 'Hindi'],
+    'topic_category': ['Technology', 'Fashion', 'Food', 'Travel', 'Sports', 'Entertainment', 'Business'],
+    'sentiment_label': ['Positive', 'Negative', 'Neutral'],
+    'emotion_type': ['Joy', 'Sadness', 'Anger', 'Fear', 'Surprise', 'Neutral'],
+    'brand_name': ['Apple', 'Google', 'Microsoft', 'Amazon', 'Nike', 'Adidas', 'Coca-Cola'],
+    'product_name': ['iPhone', 'Pixel', 'Surface', 'Echo', 'Air Max', 'Ultraboost', 'Coke'],
+    'campaign_name': ['LaunchWave', 'SummerSale', 'BlackFriday', 'NewYear', 'SpringCollection'],
+    'campaign_phase': ['Pre-Launch', 'Launch', 'Post-Launch', 'Sustain']
+}
+
+MAX_SWEEP_FIELDS = 2
+
+
+def encode_features(df, label_encoders, feature_columns):
+    """
+    Encode categorical columns with the saved LabelEncoders in one pass per column
+
+    Values not seen during training are encoded as 0 (the app's historical
+    fallback) instead of failing the whole column.
+
+    Returns:
+        DataFrame: Model input with columns in feature_columns order
+    """
+    encoded = df.copy()
+    for col, encoder in label_encoders.items():
+        if col in encoded.columns:
+            codes = {label: code for code, label in enumerate(encoder.classes_)}
+            encoded[col] = encoded[col].astype(str).map(codes).fillna(0).astype(int)
+    return encoded[feature_columns]
+
+
+def build_sweep_grid(base_input, sweep_fields, options=FORM_OPTIONS):
+    """
+    Every combination of the swept fields' options, other inputs held at base_input
+
+    Args:
+        base_input: dict of form values (one configuration)
+        sweep_fields: One or two keys of options to vary
+
+    Returns:
+        DataFrame: One row per combination
+    """
+    sweep_fields = list(sweep_fields)
+    if not 1 <= len(sweep_fields) <= MAX_SWEEP_FIELDS:
+        raise ValueError(f"Sweep 1 to {MAX_SWEEP_FIELDS} fields, got {len(sweep_fields)}")
+
+    import pandas as pd
+
+    combinations = list(itertools.product(*(options[field] for field in sweep_fields)))
+    grid = pd.DataFrame([base_input] * len(combinations))
+    for i, field in enumerate(sweep_fields):
+        grid[field] = [combination[i] for combination in combinations]
+    return grid
+
+
+def sweep_predictions(model, label_encoders, feature_columns, base_input, sweep_fields, estimator=None):
+    """
+    Predict engagement for every combination of the swept fields (one batch predict)
+
+    Args:
+        estimator: Optional ConfidenceEstimator; adds lower, upper and
+            confidence columns computed in the same batch
+
+    Returns:
+        DataFrame: The swept field columns plus 'prediction', one row per combination
+    """
+    sweep_fields = list(sweep_fields)
+    grid = build_sweep_grid(base_input, sweep_fields)
+    result = grid[sweep_fields].copy()
+    X = encode_features(grid, label_encoders, feature_columns)
+    if estimator is None:
+        result['prediction'] = model.predict(X)
+        return result
+    estimate = estimator.estimate(X)
+    for key in ('prediction', 'lower', 'upper', 'confidence'):
+        result[key] = estimate[key]
+    return result
@@ -0,0 +1,73 @@
+"""
+Row Cache
+LRU cache of per-row model results keyed by the row's feature values
+
+Shared by ConfidenceEstimator (prediction_confidence.py) and
+AttributionEngine (feature_attribution.py): a batch is split into cached
+rows and missing rows, only the missing rows are computed (in one call), and
+the least recently used rows are evicted beyond the size limit. Safe to use
+from several threads.
+"""
+
+from collections import OrderedDict
+import threading
+
+import numpy as np
+
+
+class RowCache:
+    """Per-row results of a batched computation, keyed by the row's float64 bytes"""
+
+    def __init__(self, size):
+        """
+        Args:
+            size: Number of rows whose results are kept (<= 0 disables the cache)
+        """
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_compute(self, X, compute, width):
+        """
+        Results for every row of X, computing only the rows not cached
+
+        Args:
+            X: Batch of rows (DataFrame or 2-D array)
+            compute: Callable mapping a batch of rows to a (rows, width) array
+            width: Number of result values per row
+
+        Returns:
+            ndarray: (rows, width) results aligned with X
+        """
+        if self.size <= 0:
+            # Batch exports: every row is new, skip the cache bookkeeping
+            return np.asarray(compute(X))
+
+        keys = [row.tobytes() for row in np.ascontiguousarray(np.asarray(X, dtype=np.float64))]
+        results = np.empty((len(keys), width))
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._entries.get(key)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._entries.move_to_end(key)
+                    results[i] = cached
+
+        if missing:
+            computed = compute(X.iloc[missing] if hasattr(X, 'iloc') else X[missing])
+            results[missing] = computed
+            with self._lock:
+                for i, row in zip(missing, computed):
+                    self._entries[keys[i]] = row
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        return results
@@ -0,0 +1,152 @@
+"""
+Startup Profiler for the Streamlit App
+Measures where cold-start time goes: per-module import cost (captured from
+`python -X importtime`) and per-phase timers recorded while the app starts.
+
+Phase timings are process-wide; the app shows them in its sidebar
+("Startup Timing") and they can be read with get_startup_report().
+
+Usage:
+    python startup_profiler.py                       # profile the app's top-level imports
+    python startup_profiler.py pandas joblib --top 15
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Modules imported at the top of streamlit_app.py (what every cold start pays for)
+APP_IMPORTS = ['streamlit', 'app_services']
+
+_startup_timings = {}
+_timings_lock = threading.Lock()
+
+
+def record_timing(name, seconds, status='ok'):
+    """Record how long a startup phase took (shown in the app's startup report)"""
+    with _timings_lock:
+        _startup_timings[name] = {'seconds': seconds, 'status': status}
+
+
+def get_startup_report():
+    """
+    Returns:
+        list: One dict per phase (phase, seconds, status), in recording order
+    """
+    with _timings_lock:
+        return [{'phase': name, **timing} for name, timing in _startup_timings.items()]
+
+
+@contextmanager
+def phase(name):
+    """
+    Time a block as a startup phase (recorded once per process)
+
+    Usage:
+        with phase('Model load'):
+            bundle = load_model()
+    """
+    with _timings_lock:
+        seen = name in _startup_timings
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        if not seen:
+            record_timing(name, time.perf_counter() - start, f'failed: {e}')
+        raise
+    if not seen:
+        record_timing(name, time.perf_counter() - start)
+
+
+def parse_importtime(output):
+    """
+    Parse the stderr of `python -X importtime`
+
+    Returns:
+        list: One dict per imported module (module, self_us, cumulative_us, depth),
+            in the order the imports finished
+    """
+    records = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            records.append({
+                'module': name.strip(),
+                'self_us': int(self_us),
+                'cumulative_us': int(cumulative_us),
+                # Nested imports are indented by two spaces per level
+                'depth': (len(name) - len(name.lstrip()) - 1) // 2
+            })
+        except ValueError:
+            continue
+    return records
+
+
+def profile_imports(modules, python=sys.executable, cwd=None):
+    """
+    Import modules in a fresh interpreter with -X importtime
+
+    Args:
+        modules: Module names to import (in order)
+        python: Interpreter to run
+        cwd: Working directory (defaults to this file's folder so project
+            modules such as app_services resolve)
+
+    Returns:
+        dict: records (see parse_importtime), wall_seconds of the whole
+            interpreter run, and top-level cumulative cost per requested module
+    """
+    cwd = cwd or os.path.dirname(os.path.abspath(__file__))
+    code = '; '.join(f'import {module}' for module in modules)
+    start = time.perf_counter()
+    result = subprocess.run([python, '-X', 'importtime', '-c', code], cwd=cwd,
+                            capture_output=True, text=True)
+    wall_seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"Import failed: {result.stderr.strip().splitlines()[-1]}")
+
+    records = parse_importtime(result.stderr)
+    top_level = {r['module']: r['cumulative_us'] for r in records if r['depth'] == 0}
+    return {
+        'records': records,
+        'wall_seconds': wall_seconds,
+        'modules': {module: top_level.get(module, 0) / 1e6 for module in modules}
+    }
+
+
+def slowest_imports(records, top=20):
+    """Modules with the highest self time (where the time is actually spent)"""
+    return sorted(records, key=lambda r: r['self_us'], reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile import-time cost of the app's startup")
+    parser.add_argument('modules', nargs='*', default=APP_IMPORTS,
+                        help=f"Modules to import (default: {' '.join(APP_IMPORTS)})")
+    parser.add_argument('--top', type=int, default=20, help="Number of slowest modules to list")
+    args = parser.parse_args(argv)
+
+    print("=" * 70)
+    print("STARTUP IMPORT PROFILE")
+    print("=" * 70)
+
+    profile = profile_imports(args.modules)
+    for module, seconds in profile['modules'].items():
+        print(f"   {module:<40} {seconds * 1000:>9.1f} ms (cumulative)")
+    print(f"   Interpreter run: {profile['wall_seconds'] * 1000:.0f} ms, "
+          f"{len(profile['records'])} modules imported")
+
+    print(f"\n📊 Slowest {args.top} modules by self time:")
+    for record in slowest_imports(profile['records'], args.top):
+        print(f"   {record['module']:<50} {record['self_us'] / 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,692 @@
+"""
+Storage Backend Selection
+Builds the Table / Queue / Blob clients used by TableStorageManager,
+AzureMonitoring and the Streamlit model loader
+
+Backends (AZURE_CONFIG['storage_backend'], env STORAGE_BACKEND):
+- 'azure' (default): real Azure SDK clients from the storage connection string
+- 'local': in-process emulator backed by a single SQLite file
+  (AZURE_CONFIG['local_storage_path'], env LOCAL_STORAGE_PATH). It implements
+  the subset of the SDK surface this project uses, so load tests and
+  benchmarks run on one machine with no network.
+
+Usage:
+    STORAGE_BACKEND=local python table_storage_manager.py
+    STORAGE_BACKEND=local python storage_backend.py --seed-models models/
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.data.tables import TableEntity, TableTransactionError
+
+from azure_config import AZURE_CONFIG
+
+AZURE_BACKEND = 'azure'
+LOCAL_BACKEND = 'local'
+
+
+def get_backend_name():
+    return AZURE_CONFIG.get('storage_backend', AZURE_BACKEND)
+
+
+def is_local_backend():
+    return get_backend_name() == LOCAL_BACKEND
+
+
+def get_table_service_client(connection_string=None):
+    """Table service client for the configured backend"""
+    if is_local_backend():
+        return LocalTableServiceClient(get_local_storage())
+    from azure.data.tables import TableServiceClient
+    return TableServiceClient.from_connection_string(
+        connection_string or AZURE_CONFIG['storage_connection_string']
+    )
+
+
+def get_async_table_service_client(connection_string=None, **client_kwargs):
+    """asyncio table service client for the configured backend"""
+    if is_local_backend():
+        return LocalAsyncTableServiceClient(get_local_storage())
+    from azure.data.tables.aio import TableServiceClient
+    return TableServiceClient.from_connection_string(
+        connection_string or AZURE_CONFIG['storage_connection_string'], **client_kwargs
+    )
+
+
+def get_queue_client(queue_name, connection_string=None, **client_kwargs):
+    """Queue client for the configured backend"""
+    if is_local_backend():
+        return LocalQueueClient(get_local_storage(), queue_name)
+    from azure.storage.queue import QueueClient
+    return QueueClient.from_connection_string(
+        conn_str=connection_string or AZURE_CONFIG['storage_connection_string'],
+        queue_name=queue_name,
+        **client_kwargs
+    )
+
+
+def get_blob_service_client(connection_string=None, **client_kwargs):
+    """Blob service client for the configured backend"""
+    if is_local_backend():
+        return LocalBlobServiceClient(get_local_storage())
+    from azure.storage.blob import BlobServiceClient
+    return BlobServiceClient.from_connection_string(
+        connection_string or AZURE_CONFIG['storage_connection_string'], **client_kwargs
+    )
+
+
+# ---------------------------------------------------------------------------
+# SQLite-backed emulator
+# ---------------------------------------------------------------------------
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tables (
+    name TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS entities (
+    table_name TEXT NOT NULL,
+    partition_key TEXT NOT NULL,
+    row_key TEXT NOT NULL,
+    properties TEXT NOT NULL,
+    etag INTEGER NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (table_name, partition_key, row_key)
+);
+CREATE TABLE IF NOT EXISTS queue_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    queue_name TEXT NOT NULL,
+    content TEXT NOT NULL,
+    inserted_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_queue_messages ON queue_messages (queue_name, id);
+CREATE TABLE IF NOT EXISTS blobs (
+    container TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data BLOB NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (container, name)
+);
+"""
+
+_storages = {}
+_storages_lock = threading.Lock()
+
+
+def get_local_storage(path=None):
+    """Process-wide LocalStorage for a database path (one connection per file)"""
+    path = path or AZURE_CONFIG.get('local_storage_path', 'database/local_storage.db')
+    with _storages_lock:
+        if path not in _storages:
+            _storages[path] = LocalStorage(path)
+        return _storages[path]
+
+
+class LocalStorage:
+    """SQLite database shared by the local table, queue and blob clients"""
+
+    def __init__(self, path):
+        self.path = path
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        # One connection, serialized: SQLite allows a single writer anyway
+        self.lock = threading.RLock()
+        self._etag_counter = self.conn.execute("SELECT COALESCE(MAX(etag), 0) FROM entities").fetchone()[0]
+
+    def next_etag(self):
+        self._etag_counter += 1
+        return self._etag_counter
+
+
+def _now():
+    return datetime.utcnow().isoformat()
+
+
+def _format_etag(version):
+    return f'W/"{version}"'
+
+
+def _to_entity(partition_key, row_key, properties, etag, updated_at, select=None):
+    data = {'PartitionKey': partition_key, 'RowKey': row_key, **json.loads(properties)}
+    if select:
+        data = {name: data[name] for name in select if name in data}
+    entity = TableEntity(data)
+    entity._metadata = {'etag': _format_etag(etag), 'timestamp': updated_at}
+    return entity
+
+
+# OData filter subset: "<property> <op> <value>" clauses joined by "and"
+_CLAUSE_RE = re.compile(
+    r"^\s*(\w+)\s+(eq|ne|gt|ge|lt|le)\s+(@\w+|'(?:[^']|'')*'|true|false|-?\d+(?:\.\d+)?)\s*$",
+    re.IGNORECASE
+)
+_OPERATORS = {
+    'eq': lambda a, b: a == b,
+    'ne': lambda a, b: a != b,
+    'gt': lambda a, b: a > b,
+    'ge': lambda a, b: a >= b,
+    'lt': lambda a, b: a < b,
+    'le': lambda a, b: a <= b,
+}
+
+
+def parse_filter(query_filter, parameters=None):
+    """
+    Parse the supported OData subset into (property, operator, value) clauses
+
+    Raises:
+        ValueError: For filters outside the supported subset (or, not, parentheses)
+    """
+    if not query_filter:
+        return []
+    parameters = parameters or {}
+    clauses = []
+    for part in re.split(r"\s+and\s+", query_filter.strip(), flags=re.IGNORECASE):
+        match = _CLAUSE_RE.match(part)
+        if not match:
+            raise ValueError(f"Unsupported filter for local storage backend: {query_filter!r}")
+        name, op, raw = match.group(1), match.group(2).lower(), match.group(3)
+        if raw.startswith('@'):
+            value = parameters[raw[1:]]
+        elif raw.startswith("'"):
+            value = raw[1:-1].replace("''", "'")
+        elif raw.lower() in ('true', 'false'):
+            value = raw.lower() == 'true'
+        else:
+            value = float(raw) if '.' in raw else int(raw)
+        clauses.append((name, op, value))
+    return clauses
+
+
+def _matches(data, clauses):
+    for name, op, value in clauses:
+        if name not in data or data[name] is None:
+            return False
+        try:
+            if not _OPERATORS[op](data[name], value):
+                return False
+        except TypeError:
+            return False
+    return True
+
+
+class LocalPageIterator:
+    """Page iterator mirroring ItemPaged.by_page(): exposes continuation_token"""
+
+    def __init__(self, fetch_page, continuation_token=None):
+        self._fetch_page = fetch_page
+        self.continuation_token = continuation_token
+        self._done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        page, self.continuation_token = self._fetch_page(self.continuation_token)
+        if self.continuation_token is None:
+            self._done = True
+        if not page and self._done:
+            raise StopIteration
+        return iter(page)
+
+
+class LocalItemPaged:
+    """Iterable of entities with by_page(), like azure.core.paging.ItemPaged"""
+
+    def __init__(self, fetch_page):
+        self._fetch_page = fetch_page
+
+    def by_page(self, continuation_token=None):
+        return LocalPageIterator(self._fetch_page, continuation_token)
+
+    def __iter__(self):
+        for page in self.by_page():
+            yield from page
+
+
+class LocalTableClient:
+    """Emulates the azure.data.tables.TableClient operations used in this project"""
+
+    def __init__(self, storage, table_name):
+        self.storage = storage
+        self.table_name = table_name
+
+    # -- writes -------------------------------------------------------------
+
+    def _row(self, partition_key, row_key):
+        return self.storage.conn.execute(
+            "SELECT properties, etag, updated_at FROM entities "
+            "WHERE table_name = ? AND partition_key = ? AND row_key = ?",
+            (self.table_name, partition_key, row_key)
+        ).fetchone()
+
+    def _write(self, entity, properties):
+        etag = self.storage.next_etag()
+        updated_at = _now()
+        self.storage.conn.execute(
+            "INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?, ?)",
+            (self.table_name, entity['PartitionKey'], entity['RowKey'],
+             json.dumps(properties, default=str), etag, updated_at)
+        )
+        return {'etag': _format_etag(etag), 'date': updated_at}
+
+    @staticmethod
+    def _properties(entity):
+        return {k: v for k, v in entity.items() if k not in ('PartitionKey', 'RowKey')}
+
+    def _apply(self, operation, entity, mode='merge', etag=None, match_condition=None):
+        existing = self._row(entity['PartitionKey'], entity['RowKey'])
+        mode = getattr(mode, 'value', mode)
+        if operation == 'create':
+            if existing:
+                raise ResourceExistsError(message="The specified entity already exists.")
+            return self._write(entity, self._properties(entity))
+        if operation == 'delete':
+            if existing:
+                self.storage.conn.execute(
+                    "DELETE FROM entities WHERE table_name = ? AND partition_key = ? AND row_key = ?",
+                    (self.table_name, entity['PartitionKey'], entity['RowKey'])
+                )
+            return {}
+        if operation == 'update':
+            if not existing:
+                raise ResourceNotFoundError(message="The specified resource does not exist.")
+            if match_condition == MatchConditions.IfNotModified and etag != _format_etag(existing[1]):
+                raise ResourceModifiedError(message="The update condition specified in the request was not satisfied.")
+        # update / upsert
+        properties = self._properties(entity)
+        if existing and str(mode).lower() == 'merge':
+            properties = {**json.loads(existing[0]), **properties}
+        return self._write(entity, properties)
+
+    def create_entity(self, entity, **kwargs):
+        with self.storage.lock:
+            return self._apply('create', entity)
+
+    def upsert_entity(self, entity, mode='merge', **kwargs):
+        with self.storage.lock:
+            return self._apply('upsert', entity, mode)
+
+    def update_entity(self, entity, mode='merge', etag=None, match_condition=None, **kwargs):
+        with self.storage.lock:
+            return self._apply('update', entity, mode, etag, match_condition)
+
+    def delete_entity(self, partition_key, row_key, **kwargs):
+        with self.storage.lock:
+            return self._apply('delete', {'PartitionKey': partition_key, 'RowKey': row_key})
+
+    def submit_transaction(self, operations, **kwargs):
+        """Apply operations atomically; raises TableTransactionError with the failing index"""
+        operations = list(operations)
+        with self.storage.lock:
+            self.storage.conn.execute("BEGIN")
+            try:
+                results = []
+                for index, operation in enumerate(operations):
+                    op_name, entity = operation[0], operation[1]
+                    options = operation[2] if len(operation) > 2 else {}
+                    try:
+                        results.append(self._apply(
+                            getattr(op_name, 'value', op_name).lower(), entity,
+                            options.get('mode', 'merge'), options.get('etag'),
+                            options.get('match_condition')
+                        ))
+                    except Exception as e:
+                        error = TableTransactionError(message=f"{index}:{e}")
+                        error.index = index
+                        raise error from e
+                self.storage.conn.execute("COMMIT")
+                return results
+            except Exception:
+                self.storage.conn.execute("ROLLBACK")
+                raise
+
+    # -- reads --------------------------------------------------------------
+
+    def get_entity(self, partition_key, row_key, select=None, **kwargs):
+        with self.storage.lock:
+            row = self._row(partition_key, row_key)
+        if not row:
+            raise ResourceNotFoundError(message="The specified resource does not exist.")
+        return _to_entity(partition_key, row_key, *row, select=select)
+
+    def query_entities(self, query_filter, parameters=None, select=None, results_per_page=None, **kwargs):
+        return self._query(parse_filter(query_filter, parameters), select, results_per_page)
+
+    def list_entities(self, select=None, results_per_page=None, **kwargs):
+        return self._query([], select, results_per_page)
+
+    def _query(self, clauses, select, results_per_page):
+        page_size = results_per_page or 1000
+        # Key predicates are pushed into SQL; the rest is evaluated per entity
+        key_columns = {'PartitionKey': 'partition_key', 'RowKey': 'row_key'}
+        sql_ops = {'eq': '=', 'ne': '!=', 'gt': '>', 'ge': '>=', 'lt': '<', 'le': '<='}
+        sql_where = ["table_name = ?"]
+        sql_args = [self.table_name]
+        property_clauses = []
+        for name, op, value in clauses:
+            if name in key_columns:
+                sql_where.append(f"{key_columns[name]} {sql_ops[op]} ?")
+                sql_args.append(value)
+            else:
+                property_clauses.append((name, op, value))
+
+        def fetch_page(token):
+            where, args = list(sql_where), list(sql_args)
+            if token:
+                where.append("(partition_key, row_key) > (?, ?)")
+                args.extend([token['PartitionKey'], token['RowKey']])
+            sql = ("SELECT partition_key, row_key, properties, etag, updated_at FROM entities "
+                   f"WHERE {' AND '.join(where)} ORDER BY partition_key, row_key")
+            page, last_key = [], None
+            with self.storage.lock:
+                cursor = self.storage.conn.execute(sql, args)
+                for row in cursor:
+                    last_key = row[0], row[1]
+                    data = {'PartitionKey': row[0], 'RowKey': row[1], **json.loads(row[2])}
+                    if _matches(data, property_clauses):
+                        page.append(_to_entity(*row, select=select))
+                        if len(page) >= page_size:
+                            break
+                else:
+                    last_key = None
+                cursor.close()
+            next_token = {'PartitionKey': last_key[0], 'RowKey': last_key[1]} if last_key else None
+            return page, next_token
+
+        return LocalItemPaged(fetch_page)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class LocalTableServiceClient:
+    """Emulates azure.data.tables.TableServiceClient"""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def get_table_client(self, table_name):
+        return LocalTableClient(self.storage, table_name)
+
+    def create_table_if_not_exists(self, table_name):
+        with self.storage.lock:
+            self.storage.conn.execute("INSERT OR IGNORE INTO tables VALUES (?)", (table_name,))
+        return self.get_table_client(table_name)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class LocalAsyncPageIterator:
+    def __init__(self, pages):
+        self._pages = pages
+
+    @property
+    def continuation_token(self):
+        return self._pages.continuation_token
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            page = list(next(self._pages))
+        except StopIteration:
+            raise StopAsyncIteration
+        return _AsyncList(page)
+
+
+class _AsyncList:
+    def __init__(self, items):
+        self._items = iter(items)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._items)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class LocalAsyncItemPaged:
+    def __init__(self, paged):
+        self._paged = paged
+
+    def by_page(self, continuation_token=None):
+        return LocalAsyncPageIterator(self._paged.by_page(continuation_token))
+
+
+class LocalAsyncTableClient:
+    """asyncio facade over LocalTableClient (SQLite calls run inline; they never wait on a network)"""
+
+    def __init__(self, client):
+        self._client = client
+
+    async def create_entity(self, entity, **kwargs):
+        return self._client.create_entity(entity, **kwargs)
+
+    async def upsert_entity(self, entity, **kwargs):
+        return self._client.upsert_entity(entity, **kwargs)
+
+    async def update_entity(self, entity, **kwargs):
+        return self._client.update_entity(entity, **kwargs)
+
+    async def delete_entity(self, partition_key, row_key, **kwargs):
+        return self._client.delete_entity(partition_key, row_key, **kwargs)
+
+    async def submit_transaction(self, operations, **kwargs):
+        return self._client.submit_transaction(operations, **kwargs)
+
+    async def get_entity(self, partition_key, row_key, **kwargs):
+        return self._client.get_entity(partition_key, row_key, **kwargs)
+
+    def query_entities(self, query_filter, **kwargs):
+        return LocalAsyncItemPaged(self._client.query_entities(query_filter, **kwargs))
+
+    def list_entities(self, **kwargs):
+        return LocalAsyncItemPaged(self._client.list_entities(**kwargs))
+
+    async def close(self):
+        self._client.close()
+
+
+class LocalAsyncTableServiceClient:
+    def __init__(self, storage):
+        self._client = LocalTableServiceClient(storage)
+
+    def get_table_client(self, table_name):
+        return LocalAsyncTableClient(self._client.get_table_client(table_name))
+
+    async def create_table_if_not_exists(self, table_name):
+        return LocalAsyncTableClient(self._client.create_table_if_not_exists(table_name))
+
+    async def close(self):
+        self._client.close()
+
+
+class LocalQueueProperties:
+    def __init__(self, name, approximate_message_count):
+        self.name = name
+        self.approximate_message_count = approximate_message_count
+
+
+class LocalQueueClient:
+    """Emulates the azure.storage.queue.QueueClient operations used in this project"""
+
+    def __init__(self, storage, queue_name):
+        self.storage = storage
+        self.queue_name = queue_name
+
+    def create_queue(self, **kwargs):
+        pass
+
+    def send_message(self, content, **kwargs):
+        with self.storage.lock:
+            cursor = self.storage.conn.execute(
+                "INSERT INTO queue_messages (queue_name, content, inserted_at) VALUES (?, ?, ?)",
+                (self.queue_name, content, _now())
+            )
+        return {'id': str(cursor.lastrowid), 'content': content}
+
+    def receive_messages(self, max_messages=32, **kwargs):
+        """Dequeue up to max_messages (deleted on receipt; there is no visibility timeout)"""
+        with self.storage.lock:
+            rows = self.storage.conn.execute(
+                "SELECT id, content FROM queue_messages WHERE queue_name = ? ORDER BY id LIMIT ?",
+                (self.queue_name, max_messages)
+            ).fetchall()
+            if rows:
+                self.storage.conn.execute(
+                    f"DELETE FROM queue_messages WHERE id IN ({','.join('?' * len(rows))})",
+                    [row[0] for row in rows]
+                )
+        return [{'id': str(row[0]), 'content': row[1]} for row in rows]
+
+    def get_queue_properties(self, **kwargs):
+        with self.storage.lock:
+            count = self.storage.conn.execute(
+                "SELECT COUNT(*) FROM queue_messages WHERE queue_name = ?", (self.queue_name,)
+            ).fetchone()[0]
+        return LocalQueueProperties(self.queue_name, count)
+
+    def close(self):
+        pass
+
+
+class LocalBlobDownloader:
+    def __init__(self, data):
+        self._data = data
+
+    def readall(self):
+        return self._data
+
+
+class LocalBlobClient:
+    """Emulates the azure.storage.blob.BlobClient operations used in this project"""
+
+    def __init__(self, storage, container, blob_name):
+        self.storage = storage
+        self.container = container
+        self.blob_name = blob_name
+
+    def exists(self, **kwargs):
+        with self.storage.lock:
+            return self.storage.conn.execute(
+                "SELECT 1 FROM blobs WHERE container = ? AND name = ?", (self.container, self.blob_name)
+            ).fetchone() is not None
+
+    def download_blob(self, **kwargs):
+        with self.storage.lock:
+            row = self.storage.conn.execute(
+                "SELECT data FROM blobs WHERE container = ? AND name = ?", (self.container, self.blob_name)
+            ).fetchone()
+        if row is None:
+            raise ResourceNotFoundError(message=f"The specified blob does not exist: {self.blob_name}")
+        return LocalBlobDownloader(bytes(row[0]))
+
+    def upload_blob(self, data, overwrite=False, **kwargs):
+        if hasattr(data, 'read'):
+            data = data.read()
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with self.storage.lock:
+            if not overwrite and self.exists():
+                raise ResourceExistsError(message="The specified blob already exists.")
+            self.storage.conn.execute(
+                "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?)",
+                (self.container, self.blob_name, sqlite3.Binary(data), _now())
+            )
+        return {'etag': None, 'last_modified': _now()}
+
+    def close(self):
+        pass
+
+
+class LocalContainerClient:
+    def __init__(self, storage, container):
+        self.storage = storage
+        self.container = container
+
+    def get_blob_client(self, blob_name):
+        return LocalBlobClient(self.storage, self.container, blob_name)
+
+    def upload_blob(self, name, data, overwrite=False, **kwargs):
+        blob_client = self.get_blob_client(name)
+        blob_client.upload_blob(data, overwrite=overwrite)
+        return blob_client
+
+    def list_blob_names(self, **kwargs):
+        with self.storage.lock:
+            rows = self.storage.conn.execute(
+                "SELECT name FROM blobs WHERE container = ? ORDER BY name", (self.container,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        pass
+
+
+class LocalBlobServiceClient:
+    """Emulates azure.storage.blob.BlobServiceClient"""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def get_container_client(self, container):
+        return LocalContainerClient(self.storage, container)
+
+    def close(self):
+        pass
+
+
+def seed_models(models_dir, container='models'):
+    """Upload local model artifacts into the local blob store (for offline app runs)"""
+    container_client = LocalBlobServiceClient(get_local_storage()).get_container_client(container)
+    uploaded = []
+    for file_name in sorted(os.listdir(models_dir)):
+        path = os.path.join(models_dir, file_name)
+        if os.path.isfile(path) and not file_name.startswith('.'):
+            with open(path, 'rb') as f:
+                container_client.upload_blob(file_name, f.read(), overwrite=True)
+            uploaded.append(file_name)
+    return uploaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local storage backend utilities")
+    parser.add_argument("--seed-models", metavar="DIR", help="Upload model artifacts into the local 'models' container")
+    args = parser.parse_args()
+
+    storage = get_local_storage()
+    print(f"💾 Local storage: {storage.path}")
+    if args.seed_models:
+        uploaded = seed_models(args.seed_models)
+        print(f"✅ Uploaded {len(uploaded)} files to local container 'models': {', '.join(uploaded)}")
@@ -4,16 +4,8 @@ This satisfies the professor's requirement for user interface + Streamlit
 """
 
 import streamlit as st
-import joblib
-import pandas as pd
-import numpy as np
-import json
-import os
-from azure.storage.blob import BlobServiceClient
-import tempfile
 import logging
 from datetime import datetime
-import sqlite3
 
 # Custom CSS for better layout and centering
 st.set_page_config(
@@ -93,95 +85,69 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Import Azure monitoring
-try:
-    from azure_monitoring import AzureMonitoring
-    azure_monitoring = AzureMonitoring()
-    MONITORING_ENABLED = True
-    logger.info("OK: Azure Monitoring initialized")
-except ImportError as e:
-    MONITORING_ENABLED = False
-    azure_monitoring = None
-    logger.warning(f"Azure Monitoring not available: {e}")
-
-# Import model explainability
-try:
-    from model_explainability import ModelExplainer, PredictionExplainer
-    EXPLAINABILITY_ENABLED = True
-    logger.info("OK: Model Explainability initialized")
-except ImportError as e:
-    EXPLAINABILITY_ENABLED = False
-    logger.warning(f"Model Explainability not available: {e}")
-
-# Import Key Vault for Lab7 Security Requirements (Criterion #13)
-try:
-    from key_vault_setup import KeyVaultManager
-    key_vault = KeyVaultManager()
-    SECURITY_ENABLED = True if key_vault.client else False
-    logger.info("OK: Azure Key Vault integration ready")
-except Exception as e:
-    SECURITY_ENABLED = False
-    key_vault = None
-    logger.info("INFO: Key Vault not available - using environment variables")
-
-# Database helper functions
-def get_db_connection():
-    """Get database connection"""
-    db_path = 'database/social_media.db'
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    conn = sqlite3.connect(db_path, check_same_thread=False)
-    return conn
-
-def get_total_predictions():
-    """Get total number of predictions from database"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM predictions")
-        count = cursor.fetchone()[0]
-        conn.close()
-        return count
-    except Exception as e:
-        logger.warning(f"Could not get prediction count from database: {e}")
-        return 0
-
-def save_prediction_to_db(prediction_value, input_data):
-    """Save prediction to database"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Create table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS predictions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                predicted_engagement REAL NOT NULL,
-                model_version TEXT,
-                prediction_time TEXT DEFAULT CURRENT_TIMESTAMP,
-                processing_time_ms REAL
-            )
-        ''')
-
-        # Insert prediction
-        cursor.execute('''
-            INSERT INTO predictions (predicted_engagement, model_version, processing_time_ms)
-            VALUES (?, ?, ?)
-        ''', (float(prediction_value), 'HistGradientBoostingRegressor', 0))
-
-        conn.commit()
-        conn.close()
-        logger.info(f"Prediction saved to database: {prediction_value:.4f}")
-        return True
-    except Exception as e:
-        logger.error(f"Failed to save prediction to database: {e}")
-        return False
-
-# Page config
-st.set_page_config(
-    page_title="Social Media Engagement Predictor",
-    page_icon="📱",
-    layout="wide"
+# Model bundle, optional Azure integrations (monitoring, Key Vault) and the
+# predictions database live in app_services: imported once per process, heavy
+# libraries (joblib, pandas, Azure SDKs) loaded on first use, never on rerun
+from app_services import (
+    azure_monitoring as monitoring_service,
+    key_vault as key_vault_service,
+    model_loader,
+    get_azure_monitoring,
+    get_key_vault,
+    get_model_bundle,
+    get_startup_report,
+    get_total_predictions,
+    save_prediction_to_db,
 )
+from prediction_inputs import FORM_OPTIONS, MAX_SWEEP_FIELDS, encode_features, sweep_predictions
+
+# Sidebar stats are cached across reruns: moving a slider must not cost a
+# queue-properties HTTP call and a SQL count every time
+QUEUE_STATS_TTL = 30       # seconds
+PREDICTION_COUNT_TTL = 10  # seconds (also cleared after each saved prediction)
+
+# Fragments rerun only their own body on widget interaction (Streamlit >= 1.37;
+# older versions have experimental_fragment, or no fragments at all)
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda func: func)
+
+
+# Tips for inputs that lower a prediction (others get a generic "try a different ..." tip)
+RECOMMENDATIONS = {
+    'sentiment_score': "Increase positive sentiment in post content",
+    'toxicity_score': "Review content for potentially offensive language",
+    'platform': "Consider cross-posting to Instagram/TikTok for better reach",
+    'buzz_change_rate': "Post about trending topics for higher visibility",
+    'user_engagement_growth': "Build user base and engagement history",
+}
+
+
+def feature_label(field):
+    return field.replace('_', ' ').title()
+
+
+@st.cache_data(ttl=QUEUE_STATS_TTL, show_spinner=False)
+def cached_queue_stats(_azure_monitoring):
+    """Queue statistics, refreshed at most every QUEUE_STATS_TTL seconds"""
+    return _azure_monitoring.get_queue_stats()
+
+
+@st.cache_data(ttl=PREDICTION_COUNT_TTL, show_spinner=False)
+def cached_total_predictions():
+    """Total predictions in the database, refreshed at most every PREDICTION_COUNT_TTL seconds"""
+    return get_total_predictions()
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def cached_sweep(base_items, sweep_fields):
+    """What-if sweep for one base configuration (the model is fixed for the process)"""
+    return sweep_predictions(model, label_encoders, feature_columns, dict(base_items), sweep_fields,
+                             estimator=confidence_estimator)
+
+
+# Start loading the model and connecting integrations in the background
+# while the page header renders (no-ops after the first run of the process)
+model_loader.start()
+monitoring_service.start()
 
 # Log app start
 logger.info("Streamlit app started")
@@ -196,117 +162,26 @@ st.info("Welcome! This AI-powered tool predicts how well your social media posts
 
 st.markdown("---")
 
-# Load model and encoders from Azure Blob Storage
-@st.cache_resource
-def load_model_from_azure():
-    """
-    Load model from Azure Blob Storage
-    This allows the Streamlit app to run anywhere (local or cloud)
-    while still using models stored in Azure
-    """
-    try:
-        logger.info("Starting model load from Azure Blob Storage")
-
-        # Get Azure connection string securely (Lab7 Security Criterion #13)
-        # Priority: Environment Variables → Key Vault
-        connection_string = None
-        
-        # Try environment variables first (Azure Container Apps sets these)
-        connection_string = os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
-        if connection_string:
-            logger.info("Connection string from environment variable")
-        
-        # Fallback to Key Vault (for local development)
-        if not connection_string and key_vault and key_vault.client:
-            connection_string = key_vault.get_storage_connection_string()
-            if connection_string:
-                logger.info("Connection string retrieved from Azure Key Vault")
-
-        if not connection_string:
-            # Fallback to local files if no Azure connection
-            logger.warning("No Azure connection found. Falling back to local files")
-            st.warning("⚠️ No Azure connection found. Loading from local files...")
-            return load_model_local()
-
-        logger.info("Azure connection string found")
-
-        # Show loading message with spinner
-        with st.spinner("Loading AI model from Azure Blob Storage..."):
-            # Connect to Azure Blob Storage
-            blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-            container_client = blob_service_client.get_container_client("models")
-
-        # Create temporary directory
-        temp_dir = tempfile.mkdtemp()
-
-        # Download model files from Azure
-        files_to_download = [
-            'engagement_model.pkl',
-            'feature_columns.pkl',
-            'label_encoders.pkl',
-            'experiment_results.json'
-        ]
-
-        for file_name in files_to_download:
-            blob_client = container_client.get_blob_client(file_name)
-            download_path = os.path.join(temp_dir, file_name)
-
-            with open(download_path, "wb") as f:
-                f.write(blob_client.download_blob().readall())
-
-        # Load models from temporary directory
-        logger.info("Loading model files from temporary directory")
-        model = joblib.load(os.path.join(temp_dir, 'engagement_model.pkl'))
-        feature_columns = joblib.load(os.path.join(temp_dir, 'feature_columns.pkl'))
-        label_encoders = joblib.load(os.path.join(temp_dir, 'label_encoders.pkl'))
-
-        # Load experiment results
-        experiment_results = None
-        exp_path = os.path.join(temp_dir, 'experiment_results.json')
-        if os.path.exists(exp_path):
-            with open(exp_path, 'r') as f:
-                experiment_results = json.load(f)
-
-            logger.info("Model successfully loaded from Azure Blob Storage")
-            st.success("Model loaded from Azure Blob Storage!")
-
-            return model, feature_columns, label_encoders, experiment_results
-
-    except Exception as e:
-        logger.error(f"Error loading from Azure: {e}", exc_info=True)
-        st.error(f"Error loading from Azure: {e}")
-        st.warning("Trying local files as fallback...")
-        return load_model_local()
-
-@st.cache_resource
-def load_model_local():
-    """
-    Fallback: Load model from local files
-    """
-    try:
-        model = joblib.load('models/engagement_model.pkl')
-        feature_columns = joblib.load('models/feature_columns.pkl')
-        label_encoders = joblib.load('models/label_encoders.pkl')
-
-        # Load experiment results if available
-        experiment_results = None
-        if os.path.exists('models/experiment_results.json'):
-            with open('models/experiment_results.json', 'r') as f:
-                experiment_results = json.load(f)
-
-        st.info("Model loaded from local files")
-
-        return model, feature_columns, label_encoders, experiment_results
-    except Exception as e:
-        st.error(f"Error loading model: {e}")
-        return None, None, None, None
+# Load model and encoders (Azure Blob Storage, falling back to local files)
+with st.spinner("Loading AI model..."):
+    model_bundle = get_model_bundle()
 
-model, feature_columns, label_encoders, experiment_results = load_model_from_azure()
-
-if model is None:
+if model_bundle is None:
     st.error("❌ Could not load model. Please ensure model files are in the 'models' folder.")
+    if model_loader.status:
+        st.caption(model_loader.status)
     st.stop()
 
+for level, message in model_bundle['notices']:
+    getattr(st, level)(message)
+
+model = model_bundle['model']
+feature_columns = model_bundle['feature_columns']
+label_encoders = model_bundle['label_encoders']
+experiment_results = model_bundle['experiment_results']
+confidence_estimator = model_bundle['confidence']
+attribution_engine = model_bundle['attribution']
+
 # Sidebar - Model Info
 with st.sidebar:
     st.header("🤖 Model Information")
@@ -333,9 +208,10 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("### ☁️ Azure Monitoring")
 
-    if MONITORING_ENABLED and azure_monitoring:
+    azure_monitoring = get_azure_monitoring(wait=False)
+    if azure_monitoring:
         try:
-            stats = azure_monitoring.get_queue_stats()
+            stats = cached_queue_stats(azure_monitoring)
             if stats:
                 st.success("✅ Monitoring Active")
                 st.metric("Messages in Queue", stats['message_count'])
@@ -346,6 +222,8 @@ with st.sidebar:
                 st.warning("⚠️ Queue stats unavailable")
         except Exception as e:
             st.error(f"❌ Monitoring error: {e}")
+    elif not monitoring_service.ready:
+        st.info("⏳ Monitoring connecting...")
     else:
         st.info("ℹ️ Monitoring not configured")
 
@@ -371,7 +249,10 @@ with st.sidebar:
 # Main content - Centered single column layout
 center_col = st.columns([1, 3, 1])[1]  # Use middle column for centering
 
-with center_col:
+
+@fragment
+def prediction_panel():
+    """Form and results: widget changes rerun only this panel, not the sidebar"""
     st.header("📝 Enter Post Details")
 
     # Add helpful instructions
@@ -387,38 +268,27 @@ with center_col:
     col1, col2, col3 = st.columns(3)
 
     with col1:
-        day_of_week = st.selectbox("Day of Week", 
-                                   ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
-        platform = st.selectbox("Platform", 
-                               ['Instagram', 'Twitter', 'Facebook', 'LinkedIn', 'TikTok'])
-        location = st.selectbox("Location", 
-                               ['USA', 'UK', 'Canada', 'Australia', 'India', 'France', 'Germany'])
-        language = st.selectbox("Language", 
-                               ['English', 'French', 'Spanish', 'German', 'Hindi'])
+        day_of_week = st.selectbox("Day of Week", FORM_OPTIONS['day_of_week'])
+        platform = st.selectbox("Platform", FORM_OPTIONS['platform'])
+        location = st.selectbox("Location", FORM_OPTIONS['location'])
+        language = st.selectbox("Language", FORM_OPTIONS['language'])
 
     with col2:
-        topic_category = st.selectbox("Topic Category", 
-                                     ['Technology', 'Fashion', 'Food', 'Travel', 'Sports', 'Entertainment', 'Business'])
+        topic_category = st.selectbox("Topic Category", FORM_OPTIONS['topic_category'])
         sentiment_score = st.slider("Sentiment Score", -1.0, 1.0, 0.0, 0.1)
-        sentiment_label = st.selectbox("Sentiment Label", 
-                                      ['Positive', 'Negative', 'Neutral'])
-        emotion_type = st.selectbox("Emotion Type", 
-                                   ['Joy', 'Sadness', 'Anger', 'Fear', 'Surprise', 'Neutral'])
+        sentiment_label = st.selectbox("Sentiment Label", FORM_OPTIONS['sentiment_label'])
+        emotion_type = st.selectbox("Emotion Type", FORM_OPTIONS['emotion_type'])
 
     with col3:
         toxicity_score = st.slider("Toxicity Score", 0.0, 1.0, 0.0, 0.1)
-        brand_name = st.selectbox("Brand", 
-                                 ['Apple', 'Google', 'Microsoft', 'Amazon', 'Nike', 'Adidas', 'Coca-Cola'])
-        product_name = st.selectbox("Product", 
-                                   ['iPhone', 'Pixel', 'Surface', 'Echo', 'Air Max', 'Ultraboost', 'Coke'])
-        campaign_name = st.selectbox("Campaign", 
-                                    ['LaunchWave', 'SummerSale', 'BlackFriday', 'NewYear', 'SpringCollection'])
+        brand_name = st.selectbox("Brand", FORM_OPTIONS['brand_name'])
+        product_name = st.selectbox("Product", FORM_OPTIONS['product_name'])
+        campaign_name = st.selectbox("Campaign", FORM_OPTIONS['campaign_name'])
 
     col4, col5 = st.columns(2)
 
     with col4:
-        campaign_phase = st.selectbox("Campaign Phase", 
-                                     ['Pre-Launch', 'Launch', 'Post-Launch', 'Sustain'])
+        campaign_phase = st.selectbox("Campaign Phase", FORM_OPTIONS['campaign_phase'])
         user_past_sentiment_avg = st.slider("User Past Sentiment Avg", -1.0, 1.0, 0.0, 0.1)
 
     with col5:
@@ -455,7 +325,7 @@ with center_col:
         
         • **Model Confidence** - How certain is the AI (%)
         
-        • **Advanced Analysis** - Deep SHAP/LIME explanations
+        • **Advanced Analysis** - SHAP contribution of every input
         """)
         
         # Show feature correlations
@@ -477,59 +347,59 @@ with center_col:
     st.markdown("<br>", unsafe_allow_html=True)
     predict_button = st.button("🎯 Predict Engagement Rate", type="primary", use_container_width=True)
 
+    # Current form values (base configuration for single predictions and sweeps)
+    input_data = {
+        'day_of_week': day_of_week,
+        'platform': platform,
+        'location': location,
+        'language': language,
+        'topic_category': topic_category,
+        'sentiment_score': sentiment_score,
+        'sentiment_label': sentiment_label,
+        'emotion_type': emotion_type,
+        'toxicity_score': toxicity_score,
+        'brand_name': brand_name,
+        'product_name': product_name,
+        'campaign_name': campaign_name,
+        'campaign_phase': campaign_phase,
+        'user_past_sentiment_avg': user_past_sentiment_avg,
+        'user_engagement_growth': user_engagement_growth,
+        'buzz_change_rate': buzz_change_rate
+    }
+
     if predict_button:
         try:
-            # Create input dataframe
-            input_data = {
-                'day_of_week': day_of_week,
-                'platform': platform,
-                'location': location,
-                'language': language,
-                'topic_category': topic_category,
-                'sentiment_score': sentiment_score,
-                'sentiment_label': sentiment_label,
-                'emotion_type': emotion_type,
-                'toxicity_score': toxicity_score,
-                'brand_name': brand_name,
-                'product_name': product_name,
-                'campaign_name': campaign_name,
-                'campaign_phase': campaign_phase,
-                'user_past_sentiment_avg': user_past_sentiment_avg,
-                'user_engagement_growth': user_engagement_growth,
-                'buzz_change_rate': buzz_change_rate
-            }
-            
-            df_input = pd.DataFrame([input_data])
-            
-            # Encode categorical variables
-            for col, encoder in label_encoders.items():
-                if col in df_input.columns:
-                    try:
-                        df_input[col] = encoder.transform(df_input[col].astype(str))
-                    except:
-                        # If value not seen during training, use most common
-                        df_input[col] = 0
+            import pandas as pd
+
+            # Encode categorical variables (values not seen during training become 0)
+            df_input = encode_features(pd.DataFrame([input_data]), label_encoders, feature_columns)
             
-            # Make prediction
-            prediction = model.predict(df_input[feature_columns])[0]
+            # Make prediction (interval and confidence come from the same batch)
+            estimate = confidence_estimator.estimate(df_input)
+            prediction = float(estimate['prediction'][0])
+            confidence = float(estimate['confidence'][0])
+            has_confidence = not pd.isna(confidence)
 
             # Save prediction to database (persists across refreshes)
             save_prediction_to_db(prediction, input_data)
+            # One recount for this rerun; later reads hit the refreshed cache
+            cached_total_predictions.clear()
 
             # Log to Azure Monitoring (Application Insights + Log Analytics + Storage Queue)
-            if MONITORING_ENABLED and azure_monitoring:
+            azure_monitoring = get_azure_monitoring()
+            if azure_monitoring:
                 try:
                     azure_monitoring.log_prediction(
                         input_data=input_data,
                         prediction=float(prediction),
-                        confidence=None
+                        confidence=confidence if has_confidence else None
                     )
                     logger.info("Prediction logged to Azure Monitoring")
                 except Exception as e:
                     logger.warning(f"Could not log to Azure Monitoring: {e}")
 
             # Log prediction
-            total_predictions = get_total_predictions()
+            total_predictions = cached_total_predictions()
             logger.info(f"Prediction made: {prediction:.4f} - Total predictions: {total_predictions}")
 
             # Display result in right column with better styling
@@ -593,47 +463,32 @@ with center_col:
             # KEY FACTORS INFLUENCING PREDICTION
             st.markdown("<div style='text-align: center;'><h3>🔑 Key Factors</h3></div>", unsafe_allow_html=True)
             
-            # Analyze input features that have highest impact
-            factors_impact = []
-            
-            # High positive impact factors
-            if sentiment_score > 0.5:
-                factors_impact.append(("😊 Positive Sentiment", "Increases engagement", "+High"))
-            if sentiment_score < -0.5:
-                factors_impact.append(("😞 Negative Sentiment", "Decreases engagement", "-High"))
-            
-            if toxicity_score < 0.2:
-                factors_impact.append(("✨ Low Toxicity", "Boosts engagement", "+High"))
-            if toxicity_score > 0.7:
-                factors_impact.append(("⚠️ High Toxicity", "Hurts engagement", "-High"))
-            
-            if user_engagement_growth > 20:
-                factors_impact.append(("📈 High Growth Rate", "Strong predictor", "+High"))
-            if user_engagement_growth < -20:
-                factors_impact.append(("📉 Low Growth Rate", "Negative indicator", "-High"))
-            
-            if buzz_change_rate > 15:
-                factors_impact.append(("🔥 Trending Topic", "High visibility", "+Medium"))
-            if buzz_change_rate < -15:
-                factors_impact.append(("Declining Topic", "Low visibility", "-Medium"))
-            
-            platform_impact = {
-                'Instagram': '+High',
-                'TikTok': '+High',
-                'Twitter': '+Medium',
-                'Facebook': '+Low',
-                'LinkedIn': '+Medium'
-            }
-            factors_impact.append((f"{platform}", f"Platform impact", platform_impact.get(platform, '+Medium')))
+            # TreeSHAP contributions of each input to this prediction
+            try:
+                contributions = attribution_engine.explain(df_input)[0]
+                factors = attribution_engine.top_factors(contributions, input_data, top=5)
+            except ImportError:
+                factors = []
+                st.info("ℹ️ Install shap to see which inputs drive this prediction")
+            except Exception as e:
+                factors = []
+                st.caption(f"Key factors unavailable: {e}")
+                logger.warning(f"Feature attribution failed: {e}")
             
             # Display factors with better styling
-            for factor_name, description, impact in factors_impact[:5]:
-                if '+' in impact:
+            for factor in factors:
+                if factor['contribution'] >= 0:
                     color = "#00d084"  # Green
                     icon = "✅"
+                    description = "Increases engagement"
                 else:
                     color = "#ff2b2b"  # Red
                     icon = "❌"
+                    description = "Decreases engagement"
+                value = f"{factor['value']:.2f}" if isinstance(factor['value'], float) else factor['value']
+                if factor['typical'] is not None:
+                    typical = f"{factor['typical']:.2f}" if isinstance(factor['typical'], float) else factor['typical']
+                    description += f" (typical post: {typical})"
                 
                 st.markdown(f"""
                 <div style='
@@ -644,9 +499,9 @@ with center_col:
                     margin: 0.5rem 0;
                     text-align: center;
                 '>
-                    <p style='font-weight: bold; margin: 0.5rem 0;'>{icon} {factor_name}</p>
+                    <p style='font-weight: bold; margin: 0.5rem 0;'>{icon} {feature_label(factor['feature'])}: {value}</p>
                     <small>{description}</small>
-                    <p style='color: {color}; font-weight: bold; margin: 0.5rem 0;'>{impact}</p>
+                    <p style='color: {color}; font-weight: bold; margin: 0.5rem 0;'>{factor['contribution']:+.2%}</p>
                 </div>
                 """, unsafe_allow_html=True)
             
@@ -655,17 +510,12 @@ with center_col:
             # RECOMMENDATIONS
             st.markdown("<div style='text-align: center;'><h3>💬 Recommendations</h3></div>", unsafe_allow_html=True)
             
-            recommendations = []
-            if sentiment_score < 0.3:
-                recommendations.append("Increase positive sentiment in post content")
-            if toxicity_score > 0.3:
-                recommendations.append("Review content for potentially offensive language")
-            if platform == 'Facebook':
-                recommendations.append("Consider cross-posting to Instagram/TikTok for better reach")
-            if buzz_change_rate < 0:
-                recommendations.append("Post about trending topics for higher visibility")
-            if user_engagement_growth < 5:
-                recommendations.append("Build user base and engagement history")
+            # One tip per input that lowers this prediction, strongest first
+            recommendations = [
+                RECOMMENDATIONS.get(factor['feature'],
+                                    f"Try a different {feature_label(factor['feature']).lower()} (currently {factor['value']})")
+                for factor in factors if factor['contribution'] < 0
+            ]
             
             if not recommendations:
                 recommendations.append("Content looks great! Consider consistent posting schedule")
@@ -679,45 +529,41 @@ with center_col:
             # MODEL CONFIDENCE
             st.markdown("<div style='text-align: center;'><h3>📈 Model Confidence</h3></div>", unsafe_allow_html=True)
             
-            # Calculate confidence based on input variance
-            all_inputs = [sentiment_score, toxicity_score, user_engagement_growth, buzz_change_rate]
-            variance = np.std(all_inputs) if len(all_inputs) > 0 else 0.5
-            confidence = max(0.5, min(0.95, 0.7 + (0.25 * (1 - variance/100))))
-            
-            confidence_pct = int(confidence * 100)
-            st.markdown(f"<p style='text-align: center; font-size: 1.1rem;'><strong>Confidence: {confidence_pct}%</strong></p>", unsafe_allow_html=True)
-            st.progress(confidence)
-            
-            if confidence > 0.8:
-                st.success("✅ High confidence prediction")
-            elif confidence > 0.6:
-                st.info("⚠️ Medium confidence - results may vary")
+            # Confidence from the model's prediction interval (tree spread or quantile models)
+            if has_confidence:
+                confidence_pct = int(confidence * 100)
+                st.markdown(f"<p style='text-align: center; font-size: 1.1rem;'><strong>Confidence: {confidence_pct}%</strong></p>", unsafe_allow_html=True)
+                st.progress(confidence)
+                interval_pct = int((1 - confidence_estimator.alpha) * 100)
+                st.caption(f"{interval_pct}% prediction interval: {estimate['lower'][0]:.2%} – {estimate['upper'][0]:.2%}")
+                
+                if confidence > 0.8:
+                    st.success("✅ High confidence prediction")
+                elif confidence > 0.6:
+                    st.info("⚠️ Medium confidence - results may vary")
+                else:
+                    st.warning("📊 Lower confidence - gather more data")
             else:
-                st.warning("📊 Lower confidence - gather more data")
+                st.info("ℹ️ Confidence unavailable for this model (train quantile models to enable intervals)")
             
             st.markdown("---")
             
             # EXPLAINABILITY INFO
-            if EXPLAINABILITY_ENABLED:
-                try:
-                    pred_explainer = PredictionExplainer()
-                    explanation = pred_explainer.explain_engagement_prediction(prediction, input_data)
-                    
-                    with st.expander("Advanced Analysis", expanded=False):
-                        st.markdown(explanation['interpretation'])
-                        
-                        if explanation['recommendations']:
-                            st.markdown("**Additional Tips:**")
-                            for tip in explanation['recommendations'][:3]:
-                                st.markdown(f"- {tip}")
-                
-                except Exception as e:
-                    st.caption(f"Advanced analysis unavailable: {e}")
+            if factors:
+                with st.expander("Advanced Analysis", expanded=False):
+                    st.markdown(f"Baseline (average post): **{attribution_engine.expected_value:.2%}**; "
+                                f"the contributions below add up to this prediction.")
+                    all_factors = attribution_engine.top_factors(contributions, input_data, top=len(contributions))
+                    st.dataframe(
+                        [{'Input': feature_label(f['feature']), 'Value': str(f['value']),
+                          'Contribution': f"{f['contribution']:+.2%}"} for f in all_factors],
+                        use_container_width=True, hide_index=True
+                    )
             
             # Previous predictions
             st.markdown("---")
             st.markdown("### 📊 Session Stats")
-            total_preds = get_total_predictions()
+            total_preds = cached_total_predictions()
             col_s1, col_s2, col_s3 = st.columns(3)
             with col_s1:
                 st.metric("Total Predictions", total_preds)
@@ -730,6 +576,60 @@ with center_col:
             st.error(f"Prediction error: {e}")
             logger.error(f"Prediction error: {e}", exc_info=True)
 
+    # WHAT-IF SWEEP
+    st.markdown("---")
+    with st.expander("🧪 What-if Sweep", expanded=False):
+        st.markdown("Keep the post details above and vary one or two inputs over all their options.")
+        sweep_fields = st.multiselect(
+            "Inputs to vary",
+            list(FORM_OPTIONS),
+            default=['platform', 'day_of_week'],
+            max_selections=MAX_SWEEP_FIELDS,
+            format_func=feature_label
+        )
+        if st.button("📊 Run Sweep", disabled=not sweep_fields, use_container_width=True):
+            try:
+                sweep = cached_sweep(tuple(sorted(input_data.items())), tuple(sweep_fields))
+                render_sweep(sweep, sweep_fields)
+            except Exception as e:
+                st.error(f"Sweep error: {e}")
+                logger.error(f"Sweep error: {e}", exc_info=True)
+
+
+def render_sweep(sweep, sweep_fields):
+    """Heatmap (two inputs) or bar chart (one input) of swept predictions"""
+    import pandas as pd
+
+    best = sweep.loc[sweep['prediction'].idxmax()]
+    best_config = ", ".join(f"{best[field]}" for field in sweep_fields)
+    best_confidence = f", confidence {best['confidence']:.0%}" if pd.notna(best.get('confidence')) else ""
+    st.success(f"🏆 Best combination: {best_config} ({best['prediction']:.2%}{best_confidence})")
+
+    if len(sweep_fields) == 1:
+        field = sweep_fields[0]
+        st.bar_chart(sweep.set_index(field)['prediction'])
+        return
+
+    row_field, col_field = sweep_fields
+    grid = sweep.pivot(index=row_field, columns=col_field, values='prediction')
+    grid = grid.reindex(index=FORM_OPTIONS[row_field], columns=FORM_OPTIONS[col_field])
+    try:
+        import plotly.express as px
+        fig = px.imshow(
+            grid,
+            color_continuous_scale='RdYlGn',
+            text_auto='.1%',
+            aspect='auto',
+            labels={'color': 'Predicted Engagement'}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    except ImportError:
+        st.dataframe(grid.style.format('{:.2%}'), use_container_width=True)
+
+
+with center_col:
+    prediction_panel()
+
 # Footer
 st.markdown("---")
 st.markdown("### 💡 Tips for Better Engagement")
@@ -749,7 +649,7 @@ if 'start_time' not in st.session_state:
     st.session_state.start_time = datetime.now()
 
 # Get total predictions from database (persists across refreshes)
-total_predictions = get_total_predictions()
+total_predictions = cached_total_predictions()
 
 # Display metrics with better styling
 uptime = datetime.now() - st.session_state.start_time
@@ -767,14 +667,19 @@ st.sidebar.metric("🤖 Model Status", "✅ Active", help="Model is loaded and r
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 🔒 Security & Streaming")
 
-if SECURITY_ENABLED:
-    if key_vault and key_vault.client:
-        st.sidebar.success("🔐 Key Vault: Connected")
-    else:
-        st.sidebar.info("🔑 Key Vault: Fallback mode (using .env)")
+key_vault = get_key_vault(wait=False)
+if key_vault:
+    st.sidebar.success("🔐 Key Vault: Connected")
+elif key_vault_service.ready:
+    st.sidebar.info("🔑 Key Vault: Fallback mode (using .env)")
 else:
     st.sidebar.info("🔒 Security: Using environment variables")
 
+# Startup timing report (process-wide, measured once per container)
+with st.sidebar.expander("⏱️ Startup Timing", expanded=False):
+    for timing in get_startup_report():
+        st.text(f"{timing['phase']}: {timing['seconds'] * 1000:.0f} ms ({timing['status']})")
+
 # Add a progress indicator
 if total_predictions > 0:
     st.sidebar.progress(min(total_predictions / 100, 1.0))
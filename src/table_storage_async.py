@@ -0,0 +1,317 @@
+"""
+Async Azure Table Storage Manager
+asyncio variant of TableStorageManager for fan-out reads and bulk loads
+(e.g. fetching the interactions of every post of a campaign at once)
+
+All table clients share one aiohttp connection pool, and a semaphore bounds
+the number of requests in flight.
+
+Usage:
+    async with AsyncTableStorageManager() as manager:
+        interactions = await manager.get_interactions_for_posts(post_ids)
+"""
+
+import asyncio
+from datetime import datetime
+
+import aiohttp
+from azure.core.exceptions import ResourceExistsError
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.data.tables import TableTransactionError, UpdateMode
+
+from azure_config import AZURE_CONFIG
+from storage_backend import get_async_table_service_client, is_local_backend
+from table_storage_manager import (
+    DEFAULT_PAGE_SIZE,
+    KEYS_ONLY,
+    MAX_PAGE_SIZE,
+    build_interaction_entity,
+    build_post_entity,
+    chunk_by_partition,
+)
+
+DEFAULT_MAX_CONCURRENCY = 32
+
+
+class AsyncTableStorageManager:
+    """Manage social media data in Azure Table Storage with asyncio"""
+
+    def __init__(self, connection_string=None, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        """
+        Args:
+            connection_string: Storage connection string (defaults to AZURE_CONFIG)
+            max_concurrency: Maximum number of requests in flight; also the
+                size of the shared connection pool
+        """
+        self.connection_string = connection_string or AZURE_CONFIG['storage_connection_string']
+        self.max_concurrency = max_concurrency
+
+        # Table names
+        self.posts_table_name = "socialmediaposts"
+        self.interactions_table_name = "interactions"
+
+        self._session = None
+        self._semaphore = None
+        self.table_service = None
+        self.posts_table = None
+        self.interactions_table = None
+
+    async def open(self):
+        """Create the shared connection pool and table clients"""
+        if self.table_service is not None:
+            return self
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if is_local_backend():
+            self.table_service = get_async_table_service_client()
+        else:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency)
+            )
+            transport = AioHttpTransport(session=self._session, session_owner=False)
+            self.table_service = get_async_table_service_client(self.connection_string, transport=transport)
+        # Clients created from the service client reuse its transport
+        self.posts_table = self.table_service.get_table_client(self.posts_table_name)
+        self.interactions_table = self.table_service.get_table_client(self.interactions_table_name)
+        print(f"✅ Connected to Azure Table Storage (async, max {self.max_concurrency} concurrent requests)")
+        return self
+
+    async def close(self):
+        """Close the table clients and the shared connection pool"""
+        if self.table_service is not None:
+            await self.posts_table.close()
+            await self.interactions_table.close()
+            await self.table_service.close()
+            self.table_service = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def ensure_tables(self):
+        """Create the posts and interactions tables if they do not exist (e.g. on Azurite)"""
+        for table_name in (self.posts_table_name, self.interactions_table_name):
+            async with self._semaphore:
+                await self.table_service.create_table_if_not_exists(table_name)
+
+    async def add_post(self, post_id, platform, content, predicted_engagement, actual_engagement=None,
+                       model_version=None):
+        """Add a social media post to Table Storage"""
+        entity = build_post_entity(post_id, platform, content, predicted_engagement, actual_engagement,
+                                   model_version)
+        try:
+            async with self._semaphore:
+                await self.posts_table.create_entity(entity=entity)
+            return True
+        except ResourceExistsError:
+            print(f"⚠️  Post {post_id} already exists")
+            return False
+        except Exception as e:
+            print(f"❌ Error adding post: {e}")
+            return False
+
+    async def add_interaction(self, interaction_id, post_id, user_id, interaction_type, timestamp=None):
+        """Add a user interaction (like, share, comment) to Table Storage"""
+        entity = build_interaction_entity(interaction_id, post_id, user_id, interaction_type, timestamp)
+        try:
+            async with self._semaphore:
+                await self.interactions_table.create_entity(entity=entity)
+            return True
+        except Exception as e:
+            print(f"❌ Error adding interaction: {e}")
+            return False
+
+    async def add_posts(self, posts, operation='create'):
+        """Add many posts using transactional batches (see TableStorageManager.add_posts)"""
+        entities = [build_post_entity(**post) for post in posts]
+        return await self._submit_batches(self.posts_table, entities, operation)
+
+    async def add_interactions(self, interactions, operation='create'):
+        """Add many interactions using transactional batches (see TableStorageManager.add_interactions)"""
+        entities = [build_interaction_entity(**interaction) for interaction in interactions]
+        return await self._submit_batches(self.interactions_table, entities, operation)
+
+    async def _submit_batches(self, table_client, entities, operation):
+        """Submit 100-operation transactions, partitions concurrently, batches of a partition in order"""
+        if operation not in ('create', 'upsert'):
+            raise ValueError(f"Unsupported batch operation: {operation}")
+
+        partitions = chunk_by_partition(entities)
+
+        async def submit_partition(partition_key, batches):
+            failures = []
+            for batch_index, batch in enumerate(batches):
+                try:
+                    async with self._semaphore:
+                        await table_client.submit_transaction([(operation, entity) for entity in batch])
+                except Exception as e:
+                    failed_index = e.index if isinstance(e, TableTransactionError) else None
+                    failures.append({
+                        'partition_key': partition_key,
+                        'batch_index': batch_index,
+                        'row_keys': [entity['RowKey'] for entity in batch],
+                        'failed_row_key': batch[failed_index]['RowKey'] if failed_index is not None and failed_index < len(batch) else None,
+                        'error': str(e)
+                    })
+            return failures
+
+        results = await asyncio.gather(*(submit_partition(pk, batches) for pk, batches in partitions.items()))
+        failures = [failure for partition_failures in results for failure in partition_failures]
+
+        failed = sum(len(f['row_keys']) for f in failures)
+        return {
+            'total': len(entities),
+            'succeeded': len(entities) - failed,
+            'failed': failed,
+            'batches': sum(len(batches) for batches in partitions.values()),
+            'failures': failures
+        }
+
+    async def get_post(self, platform, post_id):
+        """Retrieve a specific post"""
+        try:
+            async with self._semaphore:
+                return await self.posts_table.get_entity(partition_key=platform, row_key=post_id)
+        except Exception as e:
+            print(f"❌ Error retrieving post: {e}")
+            return None
+
+    async def iter_entity_pages(self, table_client, query_filter=None, parameters=None, select=None,
+                                results_per_page=DEFAULT_PAGE_SIZE, continuation_token=None):
+        """
+        Iterate a table query page by page
+
+        Yields:
+            tuple: (list of entities, continuation token for the next page or None)
+        """
+        if query_filter:
+            pager = table_client.query_entities(query_filter, parameters=parameters, select=select,
+                                                results_per_page=results_per_page)
+        else:
+            pager = table_client.list_entities(select=select, results_per_page=results_per_page)
+
+        pages = pager.by_page(continuation_token=continuation_token)
+        while True:
+            # Hold a semaphore slot only while the next page is being fetched
+            async with self._semaphore:
+                try:
+                    page = await pages.__anext__()
+                except StopAsyncIteration:
+                    return
+                entities = [entity async for entity in page]
+            yield entities, pages.continuation_token
+
+    def iter_post_pages(self, platform=None, select=None, results_per_page=DEFAULT_PAGE_SIZE,
+                        continuation_token=None):
+        """Stream posts one service page at a time (see TableStorageManager.iter_post_pages)"""
+        query_filter, parameters = (("PartitionKey eq @platform", {'platform': platform})
+                                    if platform else (None, None))
+        return self.iter_entity_pages(self.posts_table, query_filter, parameters, select,
+                                      results_per_page, continuation_token)
+
+    def iter_interaction_pages(self, post_id, select=None, results_per_page=DEFAULT_PAGE_SIZE,
+                               continuation_token=None):
+        """Stream the interactions of a post one service page at a time"""
+        return self.iter_entity_pages(self.interactions_table, "PartitionKey eq @post_id",
+                                      {'post_id': post_id}, select, results_per_page, continuation_token)
+
+    async def iter_posts(self, platform=None, select=None, results_per_page=DEFAULT_PAGE_SIZE):
+        """Stream posts entity by entity"""
+        async for page, _ in self.iter_post_pages(platform, select, results_per_page):
+            for entity in page:
+                yield entity
+
+    async def iter_post_interactions(self, post_id, select=None, results_per_page=DEFAULT_PAGE_SIZE):
+        """Stream the interactions of a post entity by entity"""
+        async for page, _ in self.iter_interaction_pages(post_id, select, results_per_page):
+            for entity in page:
+                yield entity
+
+    async def get_all_posts(self, platform=None, select=None):
+        """Retrieve all posts, optionally filtered by platform"""
+        try:
+            return [entity async for entity in self.iter_posts(platform, select=select)]
+        except Exception as e:
+            print(f"❌ Error retrieving posts: {e}")
+            return []
+
+    async def get_post_interactions(self, post_id, select=None):
+        """Get all interactions for a specific post"""
+        try:
+            return [entity async for entity in self.iter_post_interactions(post_id, select=select)]
+        except Exception as e:
+            print(f"❌ Error retrieving interactions: {e}")
+            return []
+
+    async def get_interactions_for_posts(self, post_ids, select=None):
+        """
+        Fetch the interactions of many posts concurrently
+
+        Returns:
+            dict: post_id -> list of interaction entities
+        """
+        post_ids = list(post_ids)
+        results = await asyncio.gather(*(self.get_post_interactions(post_id, select) for post_id in post_ids))
+        return dict(zip(post_ids, results))
+
+    async def update_actual_engagement(self, platform, post_id, actual_engagement):
+        """Update the actual engagement score for a post"""
+        entity = {
+            'PartitionKey': platform,
+            'RowKey': post_id,
+            'ActualEngagement': actual_engagement,
+            'UpdatedAt': datetime.utcnow().isoformat()
+        }
+        try:
+            # Single merge request, no preceding read
+            async with self._semaphore:
+                await self.posts_table.update_entity(entity=entity, mode=UpdateMode.MERGE)
+            return True
+        except Exception as e:
+            print(f"❌ Error updating engagement: {e}")
+            return False
+
+    async def get_statistics(self):
+        """Get statistics about stored data (keys-only pages, both tables counted concurrently)"""
+
+        async def count(table_client, partitions=None):
+            total = 0
+            async for page, _ in self.iter_entity_pages(table_client, select=KEYS_ONLY,
+                                                        results_per_page=MAX_PAGE_SIZE):
+                total += len(page)
+                if partitions is not None:
+                    partitions.update(entity['PartitionKey'] for entity in page)
+            return total
+
+        try:
+            platforms = set()
+            total_posts, total_interactions = await asyncio.gather(
+                count(self.posts_table, platforms), count(self.interactions_table)
+            )
+            return {
+                'total_posts': total_posts,
+                'total_interactions': total_interactions,
+                'platforms': sorted(platforms)
+            }
+        except Exception as e:
+            print(f"❌ Error getting statistics: {e}")
+            return {}
+
+
+# Example usage
+if __name__ == "__main__":
+    async def main():
+        async with AsyncTableStorageManager() as manager:
+            stats = await manager.get_statistics()
+            print(f"   Total posts: {stats.get('total_posts', 0)}")
+            print(f"   Total interactions: {stats.get('total_interactions', 0)}")
+
+            posts = await manager.get_all_posts(select=KEYS_ONLY)
+            interactions = await manager.get_interactions_for_posts(p['RowKey'] for p in posts)
+            print(f"   Interactions fetched for {len(interactions)} posts")
+
+    asyncio.run(main())
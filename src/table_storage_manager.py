@@ -2,21 +2,190 @@
 Azure Table Storage Manager
 Manages social media posts and interactions using Azure Table Storage (FREE alternative to Cosmos DB)
 Cost: $0.00 - Uses existing storage account
+
+Local testing: point AZURE_STORAGE_CONNECTION_STRING at Azurite
+("UseDevelopmentStorage=true") and call ensure_tables() once, or set
+STORAGE_BACKEND=local to use the in-process SQLite emulator (no network).
 """
 
-from azure.data.tables import TableServiceClient, TableEntity
-from azure.core.exceptions import ResourceExistsError
+from azure.data.tables import TableEntity, TableTransactionError, UpdateMode
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import threading
+import time
 import os
 from azure_config import AZURE_CONFIG
+from storage_backend import get_table_service_client
+
+# Azure Table Storage accepts at most 100 operations per transaction,
+# all sharing the same PartitionKey
+MAX_BATCH_SIZE = 100
+DEFAULT_BATCH_WORKERS = 8
+
+# Query paging: the service returns at most 1000 entities per page
+MAX_PAGE_SIZE = 1000
+DEFAULT_PAGE_SIZE = MAX_PAGE_SIZE
+KEYS_ONLY = ['PartitionKey', 'RowKey']
+
+# Read-through cache for post point reads
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL = 60  # seconds
+
+
+def build_post_entity(post_id, platform, content, predicted_engagement, actual_engagement=None,
+                      model_version=None):
+    """Build the Table Storage entity for a social media post"""
+    entity = {
+        'PartitionKey': platform,  # Partition by platform for better performance
+        'RowKey': post_id,
+        'Content': content,
+        'PredictedEngagement': predicted_engagement,
+        'ActualEngagement': actual_engagement if actual_engagement else 0.0,
+        'CreatedAt': datetime.utcnow().isoformat(),
+        'Platform': platform
+    }
+    if model_version:
+        entity['ModelVersion'] = model_version
+    return entity
+
+
+def build_interaction_entity(interaction_id, post_id, user_id, interaction_type, timestamp=None):
+    """Build the Table Storage entity for a user interaction"""
+    return {
+        'PartitionKey': post_id,  # Partition by post_id
+        'RowKey': interaction_id,
+        'PostId': post_id,
+        'UserId': user_id,
+        'Type': interaction_type,
+        'Timestamp': timestamp if timestamp else datetime.utcnow().isoformat()
+    }
+
+
+def iter_entity_pages(table_client, query_filter=None, parameters=None, select=None,
+                      results_per_page=DEFAULT_PAGE_SIZE, continuation_token=None):
+    """
+    Iterate a table query page by page
+    
+    Args:
+        table_client: Table client to query
+        query_filter: OData filter (None lists the whole table)
+        parameters: Values for @-placeholders in the filter
+        select: Property names to fetch (server-side projection)
+        results_per_page: Maximum entities per page
+        continuation_token: Token returned with an earlier page, to resume after it
+    
+    Yields:
+        tuple: (list of entities, continuation token for the next page or None)
+    """
+    if query_filter:
+        pager = table_client.query_entities(query_filter, parameters=parameters, select=select,
+                                            results_per_page=results_per_page)
+    else:
+        pager = table_client.list_entities(select=select, results_per_page=results_per_page)
+    
+    pages = pager.by_page(continuation_token=continuation_token)
+    for page in pages:
+        yield list(page), pages.continuation_token
+
+
+def chunk_by_partition(entities, batch_size=MAX_BATCH_SIZE):
+    """
+    Group entities by PartitionKey and split each group into transaction-sized batches
+
+    Returns:
+        dict: PartitionKey -> list of entity batches
+    """
+    partitions = {}
+    for entity in entities:
+        partitions.setdefault(entity['PartitionKey'], []).append(entity)
+    return {
+        partition_key: [group[i:i + batch_size] for i in range(0, len(group), batch_size)]
+        for partition_key, group in partitions.items()
+    }
+
+
+def copy_entity(entity, etag=None, **updates):
+    """Copy an entity (properties and metadata), optionally replacing its ETag and properties"""
+    copied = TableEntity(entity)
+    copied.update(updates)
+    copied._metadata = dict(getattr(entity, 'metadata', {}) or {})
+    if etag is not None:
+        copied._metadata['etag'] = etag
+    return copied
+
+
+class EntityCache:
+    """Thread-safe LRU cache of table entities with a time-to-live per entry"""
+    
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE, ttl_seconds=DEFAULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        """Return a copy of the cached entity, or None when missing or expired"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or item[1] < time.monotonic():
+                if item is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy_entity(item[0])
+    
+    def put(self, key, entity):
+        with self._lock:
+            self._entries[key] = (copy_entity(entity), time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def etag(self, key):
+        """ETag of a live cached entry (None when missing or expired)"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or item[1] < time.monotonic():
+                return None
+            return item[0].metadata.get('etag')
+    
+    def apply_update(self, key, properties, etag):
+        """Write-through: merge properties into a cached entry and record its new ETag"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return
+            self._entries[key] = (copy_entity(item[0], etag=etag, **properties), item[1])
+    
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
 
 class TableStorageManager:
     """Manage social media data in Azure Table Storage"""
     
-    def __init__(self):
-        """Initialize Table Storage client"""
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE, cache_ttl=DEFAULT_CACHE_TTL):
+        """
+        Initialize Table Storage client
+        
+        Args:
+            cache_size: Maximum number of posts kept in the read-through cache (0 disables it)
+            cache_ttl: Seconds a cached post is served without a remote read
+        """
         connection_string = AZURE_CONFIG['storage_connection_string']
-        self.table_service = TableServiceClient.from_connection_string(connection_string)
+        self.table_service = get_table_service_client(connection_string)
         
         # Table names
         self.posts_table_name = "socialmediaposts"
@@ -26,11 +195,19 @@ class TableStorageManager:
         self.posts_table = self.table_service.get_table_client(self.posts_table_name)
         self.interactions_table = self.table_service.get_table_client(self.interactions_table_name)
         
+        self.post_cache = EntityCache(cache_size, cache_ttl) if cache_size else None
+        
         print(f"✅ Connected to Azure Table Storage")
         print(f"   📊 Posts table: {self.posts_table_name}")
         print(f"   📊 Interactions table: {self.interactions_table_name}")
     
-    def add_post(self, post_id, platform, content, predicted_engagement, actual_engagement=None):
+    def ensure_tables(self):
+        """Create the posts and interactions tables if they do not exist (e.g. on Azurite)"""
+        for table_name in (self.posts_table_name, self.interactions_table_name):
+            self.table_service.create_table_if_not_exists(table_name)
+    
+    def add_post(self, post_id, platform, content, predicted_engagement, actual_engagement=None,
+                 model_version=None):
         """
         Add a social media post to Table Storage
         
@@ -40,16 +217,10 @@ class TableStorageManager:
             content: Post content/text
             predicted_engagement: ML predicted engagement score
             actual_engagement: Actual engagement score (optional)
+            model_version: Version of the model that made the prediction (optional)
         """
-        entity = {
-            'PartitionKey': platform,  # Partition by platform for better performance
-            'RowKey': post_id,
-            'Content': content,
-            'PredictedEngagement': predicted_engagement,
-            'ActualEngagement': actual_engagement if actual_engagement else 0.0,
-            'CreatedAt': datetime.utcnow().isoformat(),
-            'Platform': platform
-        }
+        entity = build_post_entity(post_id, platform, content, predicted_engagement, actual_engagement,
+                                   model_version)
         
         try:
             self.posts_table.create_entity(entity=entity)
@@ -73,14 +244,7 @@ class TableStorageManager:
             interaction_type: Type of interaction (like, share, comment)
             timestamp: When the interaction occurred
         """
-        entity = {
-            'PartitionKey': post_id,  # Partition by post_id
-            'RowKey': interaction_id,
-            'PostId': post_id,
-            'UserId': user_id,
-            'Type': interaction_type,
-            'Timestamp': timestamp if timestamp else datetime.utcnow().isoformat()
-        }
+        entity = build_interaction_entity(interaction_id, post_id, user_id, interaction_type, timestamp)
         
         try:
             self.interactions_table.create_entity(entity=entity)
@@ -90,65 +254,267 @@ class TableStorageManager:
             print(f"❌ Error adding interaction: {e}")
             return False
     
-    def get_post(self, platform, post_id):
-        """Retrieve a specific post"""
+    def add_posts(self, posts, operation='create', max_workers=DEFAULT_BATCH_WORKERS):
+        """
+        Add many posts using transactional batches
+        
+        Args:
+            posts: Iterable of dicts with the add_post arguments
+                (post_id, platform, content, predicted_engagement, actual_engagement, model_version)
+            operation: 'create' (fail on existing rows) or 'upsert'
+            max_workers: Number of partitions submitted concurrently
+        
+        Returns:
+            dict: Batch report (see _submit_batches)
+        """
+        entities = [build_post_entity(**post) for post in posts]
+        report = self._submit_batches(self.posts_table, entities, operation, max_workers)
+        if self.post_cache and operation == 'upsert':
+            for entity in entities:
+                self.post_cache.invalidate((entity['PartitionKey'], entity['RowKey']))
+        print(f"✅ Posts batch load: {report['succeeded']}/{report['total']} added "
+              f"in {report['batches']} batches ({len(report['failures'])} failed batches)")
+        return report
+    
+    def add_interactions(self, interactions, operation='create', max_workers=DEFAULT_BATCH_WORKERS):
+        """
+        Add many interactions using transactional batches
+        
+        Args:
+            interactions: Iterable of dicts with the add_interaction arguments
+                (interaction_id, post_id, user_id, interaction_type, timestamp)
+            operation: 'create' (fail on existing rows) or 'upsert'
+            max_workers: Number of partitions submitted concurrently
+        
+        Returns:
+            dict: Batch report (see _submit_batches)
+        """
+        entities = [build_interaction_entity(**interaction) for interaction in interactions]
+        report = self._submit_batches(self.interactions_table, entities, operation, max_workers)
+        print(f"✅ Interactions batch load: {report['succeeded']}/{report['total']} added "
+              f"in {report['batches']} batches ({len(report['failures'])} failed batches)")
+        return report
+    
+    def merge_post_properties(self, entities, max_workers=DEFAULT_BATCH_WORKERS):
+        """
+        Merge properties into existing posts using transactional batches
+        
+        Posts are never created: a batch that names a deleted post fails as a
+        whole (ResourceNotFound) and is reported in failures, instead of
+        recreating the post as a partial entity.
+        
+        Args:
+            entities: Iterable of partial entities (PartitionKey, RowKey and the
+                properties to set); other properties are left untouched
+        
+        Returns:
+            dict: Batch report (see _submit_batches)
+        """
+        entities = list(entities)
+        report = self._submit_batches(self.posts_table, entities, 'merge', max_workers)
+        if self.post_cache:
+            for entity in entities:
+                self.post_cache.invalidate((entity['PartitionKey'], entity['RowKey']))
+        return report
+    
+    def _submit_batches(self, table_client, entities, operation, max_workers):
+        """
+        Submit entities as 100-operation transactions, one worker per partition
+        
+        A failing transaction is rolled back by the service as a whole, so each
+        failure entry lists every RowKey of its batch.
+        
+        Operations: 'create' (fail on existing rows), 'upsert' (insert or
+        merge) and 'merge' (UpdateMode.MERGE on existing rows only).
+        
+        Returns:
+            dict: total, succeeded, failed and batches counts, plus a list of
+            failures (partition_key, batch_index, row_keys, error)
+        """
+        if operation not in ('create', 'upsert', 'merge'):
+            raise ValueError(f"Unsupported batch operation: {operation}")
+        
+        def as_operation(entity):
+            if operation == 'merge':
+                return ('update', entity, {'mode': UpdateMode.MERGE})
+            return (operation, entity)
+        
+        partitions = chunk_by_partition(entities)
+        
+        def submit_partition(partition_key, batches):
+            failures = []
+            for batch_index, batch in enumerate(batches):
+                try:
+                    table_client.submit_transaction([as_operation(entity) for entity in batch])
+                except TableTransactionError as e:
+                    failures.append({
+                        'partition_key': partition_key,
+                        'batch_index': batch_index,
+                        'row_keys': [entity['RowKey'] for entity in batch],
+                        'failed_row_key': batch[e.index]['RowKey'] if e.index is not None and e.index < len(batch) else None,
+                        'error': str(e)
+                    })
+                except Exception as e:
+                    failures.append({
+                        'partition_key': partition_key,
+                        'batch_index': batch_index,
+                        'row_keys': [entity['RowKey'] for entity in batch],
+                        'failed_row_key': None,
+                        'error': str(e)
+                    })
+            return failures
+        
+        failures = []
+        if partitions:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(partitions)))) as executor:
+                futures = [executor.submit(submit_partition, pk, batches) for pk, batches in partitions.items()]
+                for future in futures:
+                    failures.extend(future.result())
+        
+        failed = sum(len(f['row_keys']) for f in failures)
+        return {
+            'total': len(entities),
+            'succeeded': len(entities) - failed,
+            'failed': failed,
+            'batches': sum(len(batches) for batches in partitions.values()),
+            'failures': failures
+        }
+    
+    def get_post(self, platform, post_id, use_cache=True):
+        """
+        Retrieve a specific post
+        
+        Served from the read-through cache while the entry is younger than the
+        cache TTL; pass use_cache=False to force a remote read.
+        """
+        key = (platform, post_id)
+        if use_cache and self.post_cache:
+            entity = self.post_cache.get(key)
+            if entity is not None:
+                return entity
         try:
             entity = self.posts_table.get_entity(partition_key=platform, row_key=post_id)
+            if self.post_cache:
+                self.post_cache.put(key, entity)
             return entity
         except Exception as e:
             print(f"❌ Error retrieving post: {e}")
             return None
     
-    def get_all_posts(self, platform=None):
+    def iter_post_pages(self, platform=None, select=None, results_per_page=DEFAULT_PAGE_SIZE,
+                        continuation_token=None):
+        """
+        Stream posts one service page at a time
+        
+        Args:
+            platform: Only return posts of this platform (partition key)
+            select: Property names to fetch (server-side projection)
+            results_per_page: Maximum entities per page
+            continuation_token: Token from a previous page to resume from
+        
+        Yields:
+            tuple: (list of entities, continuation token for the next page or None)
+        """
+        query_filter, parameters = (("PartitionKey eq @platform", {'platform': platform})
+                                    if platform else (None, None))
+        return iter_entity_pages(self.posts_table, query_filter, parameters, select,
+                                 results_per_page, continuation_token)
+    
+    def iter_interaction_pages(self, post_id, select=None, results_per_page=DEFAULT_PAGE_SIZE,
+                               continuation_token=None):
+        """
+        Stream the interactions of a post one service page at a time
+        
+        Yields:
+            tuple: (list of entities, continuation token for the next page or None)
+        """
+        return iter_entity_pages(self.interactions_table, "PartitionKey eq @post_id",
+                                 {'post_id': post_id}, select, results_per_page, continuation_token)
+    
+    def iter_posts(self, platform=None, select=None, results_per_page=DEFAULT_PAGE_SIZE):
+        """Stream posts entity by entity without materializing the result set"""
+        for page, _ in self.iter_post_pages(platform, select, results_per_page):
+            yield from page
+    
+    def iter_post_interactions(self, post_id, select=None, results_per_page=DEFAULT_PAGE_SIZE):
+        """Stream the interactions of a post entity by entity"""
+        for page, _ in self.iter_interaction_pages(post_id, select, results_per_page):
+            yield from page
+    
+    def get_all_posts(self, platform=None, select=None):
         """Retrieve all posts, optionally filtered by platform"""
         try:
-            if platform:
-                # Filter by platform (partition key)
-                filter_query = f"PartitionKey eq '{platform}'"
-                entities = self.posts_table.query_entities(filter_query)
-            else:
-                # Get all posts
-                entities = self.posts_table.list_entities()
-            
-            return list(entities)
+            return list(self.iter_posts(platform, select=select))
         except Exception as e:
             print(f"❌ Error retrieving posts: {e}")
             return []
     
-    def get_post_interactions(self, post_id):
+    def get_post_interactions(self, post_id, select=None):
         """Get all interactions for a specific post"""
         try:
-            filter_query = f"PartitionKey eq '{post_id}'"
-            entities = self.interactions_table.query_entities(filter_query)
-            return list(entities)
+            return list(self.iter_post_interactions(post_id, select=select))
         except Exception as e:
             print(f"❌ Error retrieving interactions: {e}")
             return []
     
-    def update_actual_engagement(self, platform, post_id, actual_engagement):
-        """Update the actual engagement score for a post"""
+    def update_actual_engagement(self, platform, post_id, actual_engagement, if_unchanged=False):
+        """
+        Update the actual engagement score for a post
+        
+        Uses a single merge request (no preceding read). With if_unchanged=True
+        and a cached copy of the post, the merge is conditional on the cached
+        ETag and fails if the post was modified elsewhere since it was read.
+        """
+        key = (platform, post_id)
+        properties = {
+            'ActualEngagement': actual_engagement,
+            'UpdatedAt': datetime.utcnow().isoformat()
+        }
+        etag = self.post_cache.etag(key) if (if_unchanged and self.post_cache) else None
         try:
-            entity = self.posts_table.get_entity(partition_key=platform, row_key=post_id)
-            entity['ActualEngagement'] = actual_engagement
-            entity['UpdatedAt'] = datetime.utcnow().isoformat()
-            
-            self.posts_table.update_entity(entity=entity, mode='replace')
+            metadata = self.posts_table.update_entity(
+                entity={'PartitionKey': platform, 'RowKey': post_id, **properties},
+                mode=UpdateMode.MERGE,
+                etag=etag,
+                match_condition=MatchConditions.IfNotModified if etag else MatchConditions.Unconditionally
+            )
+            if self.post_cache:
+                new_etag = (metadata or {}).get('etag')
+                if new_etag:
+                    self.post_cache.apply_update(key, properties, new_etag)
+                else:
+                    self.post_cache.invalidate(key)
             print(f"✅ Updated actual engagement for post {post_id}")
             return True
+        except ResourceModifiedError:
+            if self.post_cache:
+                self.post_cache.invalidate(key)
+            print(f"⚠️  Post {post_id} changed since it was cached; update skipped")
+            return False
         except Exception as e:
             print(f"❌ Error updating engagement: {e}")
             return False
     
     def get_statistics(self):
-        """Get statistics about stored data"""
+        """Get statistics about stored data (streams keys-only pages, nothing is listed into memory)"""
         try:
-            posts = list(self.posts_table.list_entities())
-            interactions = list(self.interactions_table.list_entities())
+            total_posts = 0
+            platforms = set()
+            # Posts are partitioned by platform, so the keys carry everything needed
+            for page, _ in iter_entity_pages(self.posts_table, select=KEYS_ONLY,
+                                             results_per_page=MAX_PAGE_SIZE):
+                total_posts += len(page)
+                platforms.update(entity['PartitionKey'] for entity in page)
+            
+            total_interactions = 0
+            for page, _ in iter_entity_pages(self.interactions_table, select=KEYS_ONLY,
+                                             results_per_page=MAX_PAGE_SIZE):
+                total_interactions += len(page)
             
             stats = {
-                'total_posts': len(posts),
-                'total_interactions': len(interactions),
-                'platforms': list(set([p.get('Platform', 'Unknown') for p in posts]))
+                'total_posts': total_posts,
+                'total_interactions': total_interactions,
+                'platforms': sorted(platforms)
             }
             
             return stats
@@ -178,9 +544,11 @@ if __name__ == "__main__":
     
     # Example: Add interactions
     print("\n👍 Adding sample interactions...")
-    manager.add_interaction("int_001", "post_001", "user_123", "like")
-    manager.add_interaction("int_002", "post_001", "user_456", "share")
-    manager.add_interaction("int_003", "post_001", "user_789", "comment")
+    manager.add_interactions([
+        {'interaction_id': "int_001", 'post_id': "post_001", 'user_id': "user_123", 'interaction_type': "like"},
+        {'interaction_id': "int_002", 'post_id': "post_001", 'user_id': "user_456", 'interaction_type': "share"},
+        {'interaction_id': "int_003", 'post_id': "post_001", 'user_id': "user_789", 'interaction_type': "comment"},
+    ], operation='upsert')
     
     # Example: Get statistics
     print("\n📊 Statistics:")